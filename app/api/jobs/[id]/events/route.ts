@@ -0,0 +1,46 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { Job, describeJob, getJobQueue } from '../../../../lib/job-queue';
+
+export const dynamic = 'force-dynamic';
+
+// Server-Sent Events stream of a transform job: one `data:` event with the job's status
+// and progress on connect and on every change, closed once the job is done or failed
+export async function GET(
+  request: NextRequest,
+  { params }: { params: Promise<{ id: string }> }
+) {
+  const { id } = await params;
+  const queue = getJobQueue();
+  const job = queue.get(id);
+  if (!job) {
+    return NextResponse.json({ error: 'Unknown job' }, { status: 404 });
+  }
+
+  const encoder = new TextEncoder();
+  let unsubscribe = () => {};
+  const stream = new ReadableStream({
+    start(controller) {
+      const send = (job: Job) => {
+        controller.enqueue(encoder.encode(`data: ${JSON.stringify(describeJob(job))}\n\n`));
+        if (job.status === 'done' || job.status === 'failed') {
+          unsubscribe();
+          controller.close();
+        }
+      };
+      unsubscribe = queue.subscribe(id, send);
+      request.signal.addEventListener('abort', () => unsubscribe());
+      send(job);
+    },
+    cancel() {
+      unsubscribe();
+    },
+  });
+
+  return new Response(stream, {
+    headers: {
+      'Content-Type': 'text/event-stream',
+      'Cache-Control': 'no-cache, no-transform',
+      Connection: 'keep-alive',
+    },
+  });
+}
@@ -0,0 +1,15 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { describeJob, getJobQueue } from '../../../lib/job-queue';
+
+// Status of a transform job queued by POST /api/transform; poll until it is done or failed
+export async function GET(
+  request: NextRequest,
+  { params }: { params: Promise<{ id: string }> }
+) {
+  const { id } = await params;
+  const job = getJobQueue().get(id);
+  if (!job) {
+    return NextResponse.json({ error: 'Unknown job' }, { status: 404 });
+  }
+  return NextResponse.json(describeJob(job));
+}
@@ -0,0 +1,58 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { getSegmentedRender } from '../../../lib/segment-render';
+
+// Open-ended ranges ("bytes=123-", what players send when seeking) are answered up to
+// the end of the segment they start in, so a seek never waits for more than that
+function parseRange(header: string | null, size: number, segmentEnd: (offset: number) => number): [number, number] | null {
+  const match = header?.match(/^bytes=(\d*)-(\d*)$/);
+  if (!match || (!match[1] && !match[2])) return null;
+  if (!match[1]) {
+    // Suffix range: the last n bytes
+    return [Math.max(size - Number(match[2]), 0), size - 1];
+  }
+  const start = Number(match[1]);
+  const end = match[2] ? Math.min(Number(match[2]), size - 1) : segmentEnd(start);
+  return [start, end];
+}
+
+// WAV bytes of a segmented render started by POST /api/transform with `seekable`,
+// rendering the requested range first
+export async function GET(
+  request: NextRequest,
+  { params }: { params: Promise<{ id: string }> }
+) {
+  const { id } = await params;
+  const render = getSegmentedRender(id);
+  if (!render) {
+    return NextResponse.json({ error: 'Unknown render' }, { status: 404 });
+  }
+
+  const range = request.headers.get('range');
+  const headers = {
+    'Accept-Ranges': 'bytes',
+    'Content-Type': 'audio/wav',
+    'Cache-Control': 'no-store',
+  };
+  const bounds = range
+    ? parseRange(range, render.size, offset => Math.min(render.segmentEnd(Math.max(render.segmentAt(offset), 0)), render.size - 1))
+    : [0, render.size - 1] as [number, number];
+  if (!bounds || bounds[0] > bounds[1] || bounds[0] >= render.size) {
+    return new NextResponse(null, { status: 416, headers: { ...headers, 'Content-Range': `bytes */${render.size}` } });
+  }
+
+  try {
+    const [start, end] = bounds;
+    const body = await render.read(start, end);
+    return new NextResponse(body, {
+      status: range ? 206 : 200,
+      headers: {
+        ...headers,
+        'Content-Length': String(body.length),
+        ...(range ? { 'Content-Range': `bytes ${start}-${end}/${render.size}` } : {}),
+      },
+    });
+  } catch (error) {
+    console.error(`Segmented render ${id} failed:`, error);
+    return NextResponse.json({ error: 'Rendering failed', details: String(error) }, { status: 500 });
+  }
+}
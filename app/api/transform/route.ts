@@ -1,68 +1,42 @@
 import { NextRequest, NextResponse } from 'next/server';
 import { writeFile, mkdir } from 'fs/promises';
 import path from 'path';
-import { exec } from 'child_process';
-import { promisify } from 'util';
 import fs from 'fs';
+import { Job, describeJob, getJobQueue } from '../../lib/job-queue';
+import { GenreOutput } from '../../lib/render-job';
+import { getResultCache, hashUpload, resultKey } from '../../lib/result-cache';
+import { createSegmentedRender } from '../../lib/segment-render';
 
-const execPromise = promisify(exec);
+// Uploads larger than this are rendered in blocks so worker memory stays bounded
+const STREAM_THRESHOLD_BYTES = Number(process.env.GENRE_AI_STREAM_THRESHOLD_MB ?? 64) * 1024 * 1024;
 
-// Function to process audio using Spleeter through the batch script
-async function transformAudio(
-  inputFilePath: string,
-  outputFilePath: string,
-  targetGenre: string
-): Promise<boolean> {
-  console.log(`Transforming audio to ${targetGenre} genre using Spleeter`);
-  
-  try {
-    // Path to the scripts
-    const scriptPath = path.join(process.cwd(), 'ml_scripts', 'spleeter_transform.py');
-    const batchPath = path.join(process.cwd(), 'ml_scripts', 'run_spleeter.bat');
-    
-    // Check if scripts exist
-    if (!fs.existsSync(scriptPath)) {
-      throw new Error(`Spleeter script not found: ${scriptPath}`);
-    }
-    if (!fs.existsSync(batchPath)) {
-      throw new Error(`Batch script not found: ${batchPath}`);
-    }
-    
-    // Command to run the batch script which activates conda and runs the Python script
-    const cmd = `"${batchPath}" "${scriptPath}" "${inputFilePath}" "${outputFilePath}" "${targetGenre}"`;
-    console.log(`Executing: ${cmd}`);
-    
-    // Run the command with a 5-minute timeout
-    const { stdout, stderr } = await execPromise(cmd, { timeout: 300000 });
-    console.log('------ START PYTHON OUTPUT ------');
-    console.log(stdout);
-    console.log('------ END PYTHON OUTPUT ------');
-    
-    if (stderr && stderr.trim().length > 0) {
-      console.log('------ START PYTHON ERRORS ------');
-      console.error(stderr);
-      console.log('------ END PYTHON ERRORS ------');
-    }
-    
-    // Verify the output file exists
-    if (!fs.existsSync(outputFilePath)) {
-      throw new Error('Output file was not created');
-    }
-    
-    return true;
-  } catch (error) {
-    console.error('Spleeter processing error:', error);
-    console.log('Falling back to simple file copy');
-    
-    // If all else fails, just copy the file
-    fs.copyFileSync(inputFilePath, outputFilePath);
-    
-    return false;
-  }
+// Container for rendered files (e.g. "m4a", "mp3", "opus"); defaults to the upload's own.
+// The Python side encodes whatever the output extension names, at GENRE_AI_OUTPUT_BITRATE.
+const OUTPUT_FORMAT = process.env.GENRE_AI_OUTPUT_FORMAT?.replace(/^\./, '');
+
+// Target genres from repeated `genre` fields and/or a comma-separated `genres` field
+function parseGenres(formData: FormData): string[] {
+  const values = [
+    ...formData.getAll('genre'),
+    ...String(formData.get('genres') ?? '').split(','),
+  ].map(value => String(value).trim()).filter(Boolean);
+  return Array.from(new Set(values));
 }
 
-// Increase timeout for API route (30 minutes)
-export const maxDuration = 1800;
+// A finished job (served from the result cache) in full, otherwise where to follow it
+function jobResponse(job: Job) {
+  const statusUrl = `/api/jobs/${job.id}`;
+  if (job.status === 'done') {
+    return { ...describeJob(job), statusUrl };
+  }
+  return {
+    success: true,
+    jobId: job.id,
+    status: job.status,
+    position: getJobQueue().position(job.id),
+    statusUrl,
+  };
+}
 
 export async function POST(request: NextRequest) {
   console.log('Transform API endpoint hit');
@@ -70,11 +44,15 @@ export async function POST(request: NextRequest) {
   try {
     const formData = await request.formData();
     const audioFile = formData.get('audioFile') as File;
-    const genre = formData.get('genre') as string;
+    const genres = parseGenres(formData);
+    // Render a short excerpt first; the full render is queued right behind it
+    const preview = ['1', 'true'].includes(String(formData.get('preview') ?? '').toLowerCase());
+    // Render a single genre on demand, segment by segment, so it can be played and seeked at once
+    const seekable = ['1', 'true'].includes(String(formData.get('seekable') ?? '').toLowerCase()) && genres.length === 1;
     
-    console.log('Processing file:', audioFile?.name, 'for genre:', genre);
+    console.log('Processing file:', audioFile?.name, 'for genres:', genres.join(', '));
     
-    if (!audioFile || !genre) {
+    if (!audioFile || genres.length === 0) {
       return NextResponse.json({ error: 'Missing required fields' }, { status: 400 });
     }
     
@@ -94,129 +72,64 @@ export async function POST(request: NextRequest) {
       console.error('Error creating directories:', dirError);
     }
     
-    // Save the original file
     const buffer = Buffer.from(await audioFile.arrayBuffer());
     const originalFilename = audioFile.name.replace(/\s+/g, '_');
     const timestamp = Date.now();
     const originalFilePath = path.join(uploadsDir, `${timestamp}_${originalFilename}`);
     
-    await writeFile(originalFilePath, buffer);
-    console.log('Original file saved at:', originalFilePath);
-    
-    // Generate transformed filename
+    // Generate one transformed filename per genre, or reuse an earlier render of the same bytes
     const fileExt = path.extname(originalFilename);
-    const transformedFilename = `${path.basename(originalFilename, fileExt)}_${genre}${fileExt}`;
-    const transformedFilePath = path.join(transformedDir, `${timestamp}_${transformedFilename}`);
-    
-    // IMPORTANT: Apply actual audio transformation here!
-    // First check if we have ML scripts
-    const scriptPath = path.join(process.cwd(), 'ml_scripts', 'run_spleeter.bat');
-    const pythonScriptPath = path.join(process.cwd(), 'ml_scripts', 'spleeter_transform.py');
-    
-    let transformed = false;
-    
-    // Try ML transformation if scripts exist
-    if (fs.existsSync(scriptPath) && fs.existsSync(pythonScriptPath)) {
-      try {
-        console.log('Starting ML transformation using Spleeter...');
-        console.log(`Running: ${scriptPath} ${pythonScriptPath} "${originalFilePath}" "${transformedFilePath}" "${genre}"`);
-        
-        // Add artificial delay to simulate processing (remove in production)
-        // await new Promise(resolve => setTimeout(resolve, 3000));
-        
-        const { stdout, stderr } = await execPromise(
-          `"${scriptPath}" "${pythonScriptPath}" "${originalFilePath}" "${transformedFilePath}" "${genre}"`
-        );
-        
-        console.log('Transformation stdout:', stdout);
-        if (stderr) console.error('Transformation stderr:', stderr);
-        
-        // Verify the transformed file was created and is different from original
-        if (fs.existsSync(transformedFilePath)) {
-          const originalStats = fs.statSync(originalFilePath);
-          const transformedStats = fs.statSync(transformedFilePath);
-          
-          // Check if file sizes are different (as a basic check)
-          if (originalStats.size !== transformedStats.size) {
-            console.log('Transformation successful! File sizes differ.');
-            transformed = true;
-          } else {
-            console.log('Warning: Transformed file has same size as original.');
-            // We'll still consider it transformed if the ML script ran successfully
-            transformed = true;
-          }
-        }
-      } catch (execError) {
-        console.error('Error executing ML script:', execError);
+    const outputExt = OUTPUT_FORMAT ? `.${OUTPUT_FORMAT}` : fileExt;
+    const uploadHash = hashUpload(buffer);
+    const planOutputs = (suffix: string): GenreOutput[] => genres.map(genre => {
+      const cacheKey = resultKey(uploadHash, `${genre}${suffix}`, outputExt);
+      const cached = getResultCache().lookup(cacheKey);
+      if (cached) {
+        console.log(`Serving cached ${genre}${suffix} render: ${cached}`);
+        return { genre, filename: cached, filePath: path.join(transformedDir, cached), transformed: true, cacheKey, source: 'cache' };
       }
+      const filename = `${timestamp}_${path.basename(originalFilename, fileExt)}_${genre.replace(/\s+/g, '_')}${suffix}${outputExt}`;
+      return { genre, filename, filePath: path.join(transformedDir, filename), transformed: false, cacheKey };
+    });
+    const outputs = planOutputs('');
+    const previewOutputs = preview ? planOutputs('_preview') : [];
+    
+    // Save the original file when something still has to be rendered from it
+    if ([...outputs, ...previewOutputs].some(output => !output.transformed)) {
+      await writeFile(originalFilePath, buffer);
+      console.log('Original file saved at:', originalFilePath);
     }
     
-    // If ML transformation failed or scripts don't exist, apply basic audio effects
-    if (!transformed) {
-      console.log('ML transformation failed, applying basic audio effects...');
-      
-      // Apply simple audio effects using ffmpeg if available
+    if (seekable && !outputs[0].transformed) {
       try {
-        // Check if ffmpeg is available
-        await execPromise('ffmpeg -version');
-        
-        // Apply basic effects based on genre
-        let ffmpegCommand = '';
-        
-        switch (genre.toLowerCase()) {
-          case 'rock':
-            // Add distortion and compression
-            ffmpegCommand = `ffmpeg -i "${originalFilePath}" -af "volume=1.5,bass=g=5,treble=g=2,acompressor=threshold=0.1:ratio=3:attack=0.1:release=0.2" "${transformedFilePath}"`;
-            break;
-          case 'jazz':
-            // Add warmth and resonance
-            ffmpegCommand = `ffmpeg -i "${originalFilePath}" -af "volume=1.2,bass=g=3,treble=g=-1,acompressor=threshold=0.3:ratio=2" "${transformedFilePath}"`;
-            break;
-          case 'electronic':
-            // Add echo and high-pass filter
-            ffmpegCommand = `ffmpeg -i "${originalFilePath}" -af "volume=1.3,aecho=0.8:0.7:40:0.5,highpass=f=200,treble=g=4" "${transformedFilePath}"`;
-            break;
-          case 'classical':
-            // Add reverb and slight compression
-            ffmpegCommand = `ffmpeg -i "${originalFilePath}" -af "volume=1.1,aecho=0.9:0.9:1000:0.3,acompressor=threshold=0.5:ratio=2" "${transformedFilePath}"`;
-            break;
-          default:
-            // Basic enhancement
-            ffmpegCommand = `ffmpeg -i "${originalFilePath}" -af "volume=1.2,bass=g=2,treble=g=2" "${transformedFilePath}"`;
-        }
-        
-        console.log('Running ffmpeg command:', ffmpegCommand);
-        
-        // Add artificial delay to simulate processing (remove in production)
-        await new Promise(resolve => setTimeout(resolve, 2000));
-        
-        const { stdout, stderr } = await execPromise(ffmpegCommand);
-        
-        console.log('ffmpeg stdout:', stdout);
-        if (stderr) console.log('ffmpeg stderr:', stderr); // ffmpeg outputs to stderr even on success
-        
-        transformed = fs.existsSync(transformedFilePath);
-      } catch (ffmpegError) {
-        console.error('Error using ffmpeg:', ffmpegError);
-        
-        // Last resort: simple file copy with a delay to show something is happening
-        console.log('Falling back to basic file copy with a delay');
-        await new Promise(resolve => setTimeout(resolve, 2000)); // Add 2 second delay
-        await writeFile(transformedFilePath, buffer);
+        const render = await createSegmentedRender(originalFilePath, genres[0]);
+        const url = `/api/render/${render.id}`;
+        return NextResponse.json({
+          success: true,
+          status: 'rendering',
+          message: 'Rendering as you listen',
+          transformedFilePath: url,
+          render: { id: render.id, url, duration: render.duration },
+        });
+      } catch (error) {
+        console.error('Could not start a seekable render, queueing a full render instead:', error);
       }
     }
     
-    // Return the path to the transformed file
-    const clientTransformedPath = `/transformed/${timestamp}_${transformedFilename}`;
-    console.log('Transformation complete, returning path:', clientTransformedPath);
+    // Render in the background; the client follows the jobs at /api/jobs/<jobId>
+    const previewJob = preview
+      ? getJobQueue().enqueue({ inputFile: originalFilePath, outputs: previewOutputs, stream: false, preview: true })
+      : undefined;
+    const job = getJobQueue().enqueue({
+      inputFile: originalFilePath,
+      outputs,
+      stream: buffer.length > STREAM_THRESHOLD_BYTES,
+    });
     
     return NextResponse.json({
-      success: true,
-      message: transformed ? 
-        'Audio transformed successfully' : 
-        'Audio processed with basic effects',
-      transformedFilePath: clientTransformedPath
-    });
+      ...jobResponse(job),
+      preview: previewJob && jobResponse(previewJob),
+    }, { status: job.status === 'done' ? 200 : 202 });
   } catch (error) {
     console.error('API error:', error);
     return NextResponse.json({ 
@@ -1,31 +1,21 @@
 'use client';
 
 import React from 'react';
+import { formatEta, stageLabel } from '../lib/job-progress';
 
 interface ProgressIndicatorProps {
   processing: boolean;
+  // Percent complete, 0 to 100
   progress: number;
+  // Pipeline stage reported by the server, e.g. "separate"
+  stage?: string;
+  // Estimated seconds left
+  eta?: number | null;
 }
 
-export default function ProgressIndicator({ processing, progress }: ProgressIndicatorProps) {
+export default function ProgressIndicator({ processing, progress, stage, eta }: ProgressIndicatorProps) {
   if (!processing) return null;
   
-  // Define processing stages for Spleeter
-  const stages = [
-    "Uploading file...",
-    "Initializing Spleeter...",
-    "Separating stems...",
-    "Applying genre effects...",
-    "Mixing stems...",
-    "Finalizing output..."
-  ];
-  
-  // Calculate current stage based on progress
-  const currentStage = Math.min(
-    Math.floor(progress / (100 / stages.length)),
-    stages.length - 1
-  );
-  
   return (
     <div className="progress-overlay">
       <div className="progress-card">
@@ -40,13 +30,13 @@ export default function ProgressIndicator({ processing, progress }: ProgressIndi
         
         <div style={{ marginBottom: '8px' }}>
           <p style={{ margin: '0', fontWeight: 'bold' }}>
-            {stages[currentStage]}
+            {stage ? stageLabel(stage) : 'Uploading file...'}
           </p>
         </div>
         
         <div style={{ display: 'flex', justifyContent: 'space-between', fontSize: '14px', color: '#aaa' }}>
           <span>{Math.round(progress)}% complete</span>
-          <span>Please wait...</span>
+          <span>{stage ? formatEta(eta) : 'Please wait...'}</span>
         </div>
       </div>
     </div>
@@ -0,0 +1,36 @@
+// Progress of a transform job, relayed from the [PROGRESS] lines of ml_scripts/progress.py.
+// Safe to import from client components.
+
+export interface JobProgress {
+  // Stage the render is in, e.g. "separate", or "queued" while it waits for a worker
+  stage: string;
+  // Share of the estimated work done, 0 to 1
+  fraction: number;
+  // Estimated seconds left, when known
+  eta: number | null;
+}
+
+const STAGE_LABELS: Record<string, string> = {
+  queued: 'Waiting for a free worker...',
+  decode: 'Decoding audio...',
+  analysis: 'Analyzing audio characteristics...',
+  separate: 'Separating audio stems...',
+  effects: 'Applying genre effects...',
+  mix: 'Mixing stems...',
+  normalize: 'Finalizing transformation...',
+  encode: 'Encoding output...',
+  stream: 'Rendering audio in blocks...',
+  done: 'Done',
+};
+
+export function stageLabel(stage: string): string {
+  return STAGE_LABELS[stage] ?? 'Processing audio...';
+}
+
+// "about 1 min 20 s left"
+export function formatEta(eta: number | null | undefined): string {
+  if (eta == null) return 'Estimating time left...';
+  const seconds = Math.max(1, Math.round(eta));
+  const minutes = Math.floor(seconds / 60);
+  return minutes > 0 ? `about ${minutes} min ${seconds % 60} s left` : `about ${seconds} s left`;
+}
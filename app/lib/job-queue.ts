@@ -0,0 +1,248 @@
+import { randomUUID } from 'crypto';
+import { EventEmitter } from 'events';
+import fs from 'fs';
+import { mkdir, rename, writeFile } from 'fs/promises';
+import path from 'path';
+import { JobProgress } from './job-progress';
+import { RenderRequest, renderJob } from './render-job';
+import { TraceSpan, WORKER_COUNT } from './transform-worker';
+
+// Transform jobs are queued here instead of being rendered inside the HTTP request.
+// At most WORKER_COUNT jobs render at once, one per transform worker; the rest wait
+// in order. The queue is saved to a JSON file after every change, so jobs that were
+// queued or running when the server stopped are rendered after it starts again.
+// subscribe() follows a job's status and render progress as they change.
+// schedule() runs other worker renders (segments of seekable renders) in the same
+// slots, so they wait their turn with jobs instead of adding renders of their own.
+
+export type JobStatus = 'queued' | 'running' | 'done' | 'failed';
+
+export interface Job extends RenderRequest {
+  id: string;
+  status: JobStatus;
+  createdAt: number;
+  startedAt?: number;
+  finishedAt?: number;
+  message?: string;
+  error?: string;
+  trace?: TraceSpan[];
+  progress?: JobProgress;
+}
+
+// Work run in a queue slot without being a saved job
+interface Task {
+  createdAt: number;
+  preview: boolean;
+  start: () => Promise<void>;
+}
+
+// A scheduled task's outcome; hurry() moves it up to preview priority if it hasn't started
+export interface ScheduledTask<T> {
+  done: Promise<T>;
+  hurry: () => void;
+}
+
+// Previews first, then oldest first
+function startsBefore(a: { preview?: boolean; createdAt: number }, b: { preview?: boolean; createdAt: number }): number {
+  return Number(!a.preview) - Number(!b.preview) || a.createdAt - b.createdAt;
+}
+
+const STORE_PATH = process.env.GENRE_AI_JOB_STORE ?? path.join(process.cwd(), '.cache', 'jobs.json');
+
+// Finished jobs are forgotten after this long
+const JOB_RETENTION_MS = Number(process.env.GENRE_AI_JOB_RETENTION_HOURS ?? 24) * 3600 * 1000;
+
+class JobQueue {
+  private jobs = new Map<string, Job>();
+  private tasks: Task[] = [];
+  private running = 0;
+  private saving: Promise<void> = Promise.resolve();
+  private events = new EventEmitter().setMaxListeners(0);
+
+  constructor(private storePath: string, private concurrency: number) {
+    this.load();
+    this.pump();
+  }
+
+  // Jobs whose outputs are all served from the result cache are done right away
+  enqueue(request: RenderRequest): Job {
+    const job: Job = { ...request, id: randomUUID(), status: 'queued', createdAt: Date.now() };
+    this.jobs.set(job.id, job);
+    if (job.outputs.every(output => output.transformed)) {
+      job.status = 'done';
+      job.startedAt = job.finishedAt = job.createdAt;
+      job.message = 'Audio transformed successfully';
+      console.log(`Job ${job.id} served from the result cache`);
+      this.save();
+      return job;
+    }
+    console.log(`Queued job ${job.id} (${this.queued().length} waiting, ${this.running} running)`);
+    this.save();
+    this.pump();
+    return job;
+  }
+
+  // Run work in the next free slot, in turn with queued jobs; preview work goes ahead of everything else
+  schedule<T>(work: () => Promise<T>, preview = false): ScheduledTask<T> {
+    let task!: Task;
+    const done = new Promise<T>((resolve, reject) => {
+      task = { createdAt: Date.now(), preview, start: () => Promise.resolve().then(work).then(resolve, reject) };
+    });
+    this.tasks.push(task);
+    this.pump();
+    return {
+      done,
+      hurry: () => {
+        task.preview = true;
+      },
+    };
+  }
+
+  // Call listener with the job whenever its status, queue position or progress changes
+  subscribe(id: string, listener: (job: Job) => void): () => void {
+    this.events.on(id, listener);
+    return () => this.events.off(id, listener);
+  }
+
+  private notify(job: Job) {
+    this.events.emit(job.id, job);
+  }
+
+  get(id: string): Job | undefined {
+    return this.jobs.get(id);
+  }
+
+  // Number of jobs that start before this one; 0 once it is running
+  position(id: string): number {
+    const index = this.queued().findIndex(job => job.id === id);
+    return index < 0 ? 0 : index + 1;
+  }
+
+  // Waiting jobs in the order they start: previews first, then oldest first
+  private queued(): Job[] {
+    return Array.from(this.jobs.values())
+      .filter(job => job.status === 'queued')
+      .sort(startsBefore);
+  }
+
+  private pump() {
+    while (this.running < this.concurrency) {
+      const [next] = this.queued();
+      const task = this.tasks.sort(startsBefore)[0];
+      if (!next && !task) return;
+      this.running++;
+      let started: Promise<void>;
+      if (task && (!next || startsBefore(task, next) < 0)) {
+        this.tasks.shift();
+        started = task.start();
+      } else {
+        started = this.run(next);
+      }
+      started.finally(() => {
+        this.running--;
+        this.pump();
+      });
+    }
+  }
+
+  private async run(job: Job) {
+    job.status = 'running';
+    job.startedAt = Date.now();
+    this.save();
+    this.notify(job);
+    // Everyone still waiting moved up one place
+    this.queued().forEach(waiting => this.notify(waiting));
+    try {
+      const outcome = await renderJob(job, progress => {
+        job.progress = progress;
+        this.notify(job);
+      });
+      job.message = outcome.message;
+      job.trace = outcome.trace;
+      job.status = 'done';
+    } catch (error) {
+      console.error(`Job ${job.id} failed:`, error);
+      job.error = String(error);
+      job.status = 'failed';
+    }
+    job.finishedAt = Date.now();
+    console.log(`Job ${job.id} ${job.status} in ${((job.finishedAt - job.startedAt) / 1000).toFixed(1)}s`);
+    this.save();
+    this.notify(job);
+  }
+
+  private load() {
+    if (!fs.existsSync(this.storePath)) return;
+    let saved: Job[];
+    try {
+      saved = JSON.parse(fs.readFileSync(this.storePath, 'utf8'));
+    } catch (error) {
+      console.error('Could not read the job store, starting empty:', error);
+      return;
+    }
+    const cutoff = Date.now() - JOB_RETENTION_MS;
+    for (const job of saved) {
+      if (job.finishedAt !== undefined && job.finishedAt < cutoff) continue;
+      // A job that was rendering when the server stopped is started over
+      if (job.status === 'running') {
+        job.status = 'queued';
+        delete job.startedAt;
+        delete job.progress;
+      }
+      this.jobs.set(job.id, job);
+    }
+    console.log(`Loaded ${this.jobs.size} jobs (${this.queued().length} queued) from ${this.storePath}`);
+  }
+
+  // Writes go one after another, each replacing the file whole
+  private save() {
+    const snapshot = JSON.stringify(Array.from(this.jobs.values()));
+    this.saving = this.saving
+      .then(async () => {
+        await mkdir(path.dirname(this.storePath), { recursive: true });
+        const temporary = `${this.storePath}.tmp`;
+        await writeFile(temporary, snapshot);
+        await rename(temporary, this.storePath);
+      })
+      .catch(error => console.error('Could not save the job store:', error));
+  }
+}
+
+// Survive module reloads in `next dev` so jobs aren't run twice
+const globalForQueue = globalThis as unknown as { jobQueue?: JobQueue };
+
+export function getJobQueue(): JobQueue {
+  if (!globalForQueue.jobQueue) {
+    globalForQueue.jobQueue = new JobQueue(STORE_PATH, WORKER_COUNT);
+  }
+  return globalForQueue.jobQueue;
+}
+
+// What clients see of a job: public URLs instead of server paths
+export function describeJob(job: Job) {
+  const finished = job.status === 'done' || job.status === 'failed';
+  const results = job.outputs.map(output => ({
+    genre: output.genre,
+    transformed: output.transformed,
+    elapsed: output.elapsed,
+    cached: output.source === 'cache',
+    transformedFilePath: `/transformed/${output.filename}`,
+  }));
+  return {
+    jobId: job.id,
+    status: job.status,
+    position: getJobQueue().position(job.id),
+    createdAt: job.createdAt,
+    startedAt: job.startedAt,
+    finishedAt: job.finishedAt,
+    success: job.status === 'done',
+    message: job.message,
+    error: job.error,
+    transformedFilePath: job.status === 'done' ? results[0].transformedFilePath : undefined,
+    progress: finished
+      ? { stage: 'done', fraction: 1, eta: 0 }
+      : job.progress ?? { stage: job.status, fraction: 0, eta: null },
+    results,
+    trace: job.trace,
+  };
+}
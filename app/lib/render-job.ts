@@ -0,0 +1,200 @@
+import { copyFile } from 'fs/promises';
+import { exec } from 'child_process';
+import { promisify } from 'util';
+import fs from 'fs';
+import path from 'path';
+import { JobProgress } from './job-progress';
+import { getResultCache } from './result-cache';
+import { TraceSpan, formatTrace, runBatchTransform, runTransform } from './transform-worker';
+
+const execPromise = promisify(exec);
+
+// One rendered file of a job
+export interface GenreOutput {
+  genre: string;
+  filename: string;
+  filePath: string;
+  transformed: boolean;
+  elapsed?: number;
+  // Result cache key; set when the render may be reused
+  cacheKey?: string;
+  // Where the file came from: an earlier render, the transform worker or the ffmpeg fallback
+  source?: 'cache' | 'worker' | 'basic';
+}
+
+// What a job renders; stored with the job so it can be picked up again after a restart
+export interface RenderRequest {
+  inputFile: string;
+  outputs: GenreOutput[];
+  // Render in bounded-memory blocks; meant for long uploads
+  stream: boolean;
+  // Render only a short excerpt ahead of the full track
+  preview?: boolean;
+}
+
+export interface RenderOutcome {
+  message: string;
+  trace?: TraceSpan[];
+}
+
+function logTrace(trace?: TraceSpan[]) {
+  for (const line of formatTrace(trace ?? [])) {
+    console.log(`  ${line}`);
+  }
+}
+
+// Apply basic genre effects with ffmpeg when ML transformation is unavailable
+async function applyBasicEffects(
+  originalFilePath: string,
+  transformedFilePath: string,
+  genre: string
+): Promise<boolean> {
+  // Apply simple audio effects using ffmpeg if available
+  try {
+    // Check if ffmpeg is available
+    await execPromise('ffmpeg -version');
+
+    // Apply basic effects based on genre
+    let ffmpegCommand = '';
+
+    switch (genre.toLowerCase()) {
+      case 'rock':
+        // Add distortion and compression
+        ffmpegCommand = `ffmpeg -i "${originalFilePath}" -af "volume=1.5,bass=g=5,treble=g=2,acompressor=threshold=0.1:ratio=3:attack=0.1:release=0.2" "${transformedFilePath}"`;
+        break;
+      case 'jazz':
+        // Add warmth and resonance
+        ffmpegCommand = `ffmpeg -i "${originalFilePath}" -af "volume=1.2,bass=g=3,treble=g=-1,acompressor=threshold=0.3:ratio=2" "${transformedFilePath}"`;
+        break;
+      case 'electronic':
+        // Add echo and high-pass filter
+        ffmpegCommand = `ffmpeg -i "${originalFilePath}" -af "volume=1.3,aecho=0.8:0.7:40:0.5,highpass=f=200,treble=g=4" "${transformedFilePath}"`;
+        break;
+      case 'classical':
+        // Add reverb and slight compression
+        ffmpegCommand = `ffmpeg -i "${originalFilePath}" -af "volume=1.1,aecho=0.9:0.9:1000:0.3,acompressor=threshold=0.5:ratio=2" "${transformedFilePath}"`;
+        break;
+      default:
+        // Basic enhancement
+        ffmpegCommand = `ffmpeg -i "${originalFilePath}" -af "volume=1.2,bass=g=2,treble=g=2" "${transformedFilePath}"`;
+    }
+
+    console.log('Running ffmpeg command:', ffmpegCommand);
+
+    const { stdout, stderr } = await execPromise(ffmpegCommand);
+
+    console.log('ffmpeg stdout:', stdout);
+    if (stderr) console.log('ffmpeg stderr:', stderr); // ffmpeg outputs to stderr even on success
+
+    return fs.existsSync(transformedFilePath);
+  } catch (ffmpegError) {
+    console.error('Error using ffmpeg:', ffmpegError);
+
+    // Last resort: simple file copy
+    console.log('Falling back to basic file copy');
+    await copyFile(originalFilePath, transformedFilePath);
+    return false;
+  }
+}
+
+// Render every output of a job that isn't transformed yet (e.g. served from the result
+// cache) through the transform workers, falling back to basic effects for any genre the
+// ML transformation did not produce. Updates outputs in place.
+export async function renderJob(
+  request: RenderRequest,
+  onProgress?: (progress: JobProgress) => void
+): Promise<RenderOutcome> {
+  const { inputFile, stream, preview } = request;
+  const outputs = request.outputs.filter(output => !output.transformed);
+  let trace: TraceSpan[] | undefined;
+  // Outputs the worker rendered in full; fallback renders are served but never cached
+  const cacheable = new Set<GenreOutput>();
+
+  const workerScriptPath = path.join(process.cwd(), 'ml_scripts', 'transform_worker.py');
+  const pythonScriptPath = path.join(process.cwd(), 'ml_scripts', 'spleeter_transform.py');
+
+  // Try ML transformation if scripts exist
+  if (fs.existsSync(workerScriptPath) && fs.existsSync(pythonScriptPath)) {
+    try {
+      console.log('Starting ML transformation using Spleeter...');
+
+      // The workers keep Spleeter loaded between uploads, so no per-request interpreter start
+      if (outputs.length === 1) {
+        const [output] = outputs;
+        console.log(`Queueing worker job: "${inputFile}" -> "${output.filePath}" (${output.genre})`);
+        const result = await runTransform({
+          inputFile,
+          outputFile: output.filePath,
+          targetGenre: output.genre,
+          stream,
+          preview,
+        }, onProgress);
+
+        console.log(`Transformation finished in ${result.elapsed}s (success: ${result.success})`);
+        logTrace(result.trace);
+        if (result.error) console.error('Transformation error:', result.error);
+        output.elapsed = result.elapsed;
+        trace = result.trace;
+        if (result.success && !result.fallback) cacheable.add(output);
+      } else {
+        // One decode and separation shared by every genre
+        console.log(`Queueing batch worker job: "${inputFile}" -> ${outputs.map(output => output.genre).join(', ')}`);
+        const result = await runBatchTransform({
+          inputFile,
+          outputFiles: Object.fromEntries(outputs.map(output => [output.genre, output.filePath])),
+          stream,
+          preview,
+        }, onProgress);
+
+        console.log(`Batch transformation finished in ${result.elapsed}s (success: ${result.success})`);
+        logTrace(result.trace);
+        if (result.error) console.error('Transformation error:', result.error);
+        trace = result.trace;
+        for (const output of outputs) {
+          const genreResult = result.results?.[output.genre];
+          output.elapsed = genreResult?.elapsed;
+          console.log(`  ${output.genre}: ${output.elapsed}s${genreResult?.fallback ? ' (fallback)' : ''}`);
+          if (genreResult?.success && !genreResult.fallback) cacheable.add(output);
+        }
+      }
+
+      // Verify the transformed files were created
+      for (const output of outputs) {
+        if (fs.existsSync(output.filePath)) {
+          const originalStats = fs.statSync(inputFile);
+          const transformedStats = fs.statSync(output.filePath);
+
+          // Check if file sizes are different (as a basic check)
+          if (originalStats.size !== transformedStats.size) {
+            console.log(`Transformation to ${output.genre} successful! File sizes differ.`);
+          } else {
+            console.log(`Warning: ${output.genre} file has same size as original.`);
+          }
+          // We'll still consider it transformed if the ML script ran successfully
+          output.transformed = true;
+          output.source = 'worker';
+          if (output.cacheKey && cacheable.has(output)) {
+            getResultCache().store(output.cacheKey, output.filePath);
+          } else if (output.cacheKey) {
+            console.log(`Not caching ${output.genre}: the worker fell back or reported failure`);
+          }
+        }
+      }
+    } catch (execError) {
+      console.error('Error running transform worker:', execError);
+    }
+  }
+
+  // If ML transformation failed or scripts don't exist, apply basic audio effects
+  for (const output of outputs.filter(output => !output.transformed)) {
+    console.log(`ML transformation to ${output.genre} failed, applying basic audio effects...`);
+    output.transformed = await applyBasicEffects(inputFile, output.filePath, output.genre);
+    output.source = 'basic';
+  }
+
+  const allTransformed = request.outputs.every(output => output.transformed);
+  return {
+    message: allTransformed ? 'Audio transformed successfully' : 'Audio processed with basic effects',
+    trace,
+  };
+}
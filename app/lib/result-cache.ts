@@ -0,0 +1,121 @@
+import { createHash } from 'crypto';
+import fs from 'fs';
+import { mkdir, rename, writeFile } from 'fs/promises';
+import path from 'path';
+
+// Renders are reused for uploads with the same bytes, target genre and output format
+// for as long as the effect code (every ml_scripts/*.py) and encoder settings stay the
+// same. The index is a JSON file; once the indexed files in public/transformed add up
+// to more than the size limit, the least recently used ones are deleted.
+
+interface CacheEntry {
+  filename: string;
+  size: number;
+  lastUsed: number;
+}
+
+const INDEX_PATH = process.env.GENRE_AI_RESULT_CACHE_INDEX ?? path.join(process.cwd(), '.cache', 'results.json');
+const MAX_BYTES = Number(process.env.GENRE_AI_RESULT_CACHE_MB ?? 2048) * 1024 * 1024;
+const TRANSFORMED_DIR = path.join(process.cwd(), 'public', 'transformed');
+
+export function hashUpload(buffer: Buffer): string {
+  return createHash('sha256').update(buffer).digest('hex');
+}
+
+let fingerprint: string | undefined;
+
+// Changes whenever a script that shapes the output does
+function effectFingerprint(): string {
+  if (fingerprint === undefined) {
+    const hash = createHash('sha256');
+    const scriptsDir = path.join(process.cwd(), 'ml_scripts');
+    for (const name of fs.readdirSync(scriptsDir).filter(name => name.endsWith('.py')).sort()) {
+      hash.update(name).update(fs.readFileSync(path.join(scriptsDir, name)));
+    }
+    hash.update(process.env.GENRE_AI_OUTPUT_BITRATE ?? '');
+    fingerprint = hash.digest('hex');
+  }
+  return fingerprint;
+}
+
+export function resultKey(uploadHash: string, genre: string, outputExt: string): string {
+  return createHash('sha256')
+    .update([uploadHash, genre.toLowerCase(), outputExt.toLowerCase(), effectFingerprint()].join('\0'))
+    .digest('hex');
+}
+
+class ResultCache {
+  private entries = new Map<string, CacheEntry>();
+  private saving: Promise<void> = Promise.resolve();
+
+  constructor(private indexPath: string, private maxBytes: number, private directory: string) {
+    this.load();
+  }
+
+  // File name of the cached render for key, if it is still on disk
+  lookup(key: string): string | undefined {
+    const entry = this.entries.get(key);
+    if (!entry) return undefined;
+    if (!fs.existsSync(path.join(this.directory, entry.filename))) {
+      this.entries.delete(key);
+      this.save();
+      return undefined;
+    }
+    entry.lastUsed = Date.now();
+    this.save();
+    return entry.filename;
+  }
+
+  store(key: string, filePath: string) {
+    const filename = path.basename(filePath);
+    this.entries.set(key, { filename, size: fs.statSync(filePath).size, lastUsed: Date.now() });
+    this.evict();
+    this.save();
+  }
+
+  private evict() {
+    let total = 0;
+    for (const entry of this.entries.values()) total += entry.size;
+    const oldestFirst = Array.from(this.entries).sort(([, a], [, b]) => a.lastUsed - b.lastUsed);
+    // The newest entry stays even if it alone is over the limit
+    for (const [key, entry] of oldestFirst.slice(0, -1)) {
+      if (total <= this.maxBytes) break;
+      fs.rmSync(path.join(this.directory, entry.filename), { force: true });
+      this.entries.delete(key);
+      total -= entry.size;
+      console.log(`Evicted cached render ${entry.filename}`);
+    }
+  }
+
+  private load() {
+    if (!fs.existsSync(this.indexPath)) return;
+    try {
+      this.entries = new Map(Object.entries(JSON.parse(fs.readFileSync(this.indexPath, 'utf8'))));
+    } catch (error) {
+      console.error('Could not read the result cache index, starting empty:', error);
+    }
+  }
+
+  // Writes go one after another, each replacing the file whole
+  private save() {
+    const snapshot = JSON.stringify(Object.fromEntries(this.entries));
+    this.saving = this.saving
+      .then(async () => {
+        await mkdir(path.dirname(this.indexPath), { recursive: true });
+        const temporary = `${this.indexPath}.tmp`;
+        await writeFile(temporary, snapshot);
+        await rename(temporary, this.indexPath);
+      })
+      .catch(error => console.error('Could not save the result cache index:', error));
+  }
+}
+
+// Survive module reloads in `next dev` so there is one index writer
+const globalForCache = globalThis as unknown as { resultCache?: ResultCache };
+
+export function getResultCache(): ResultCache {
+  if (!globalForCache.resultCache) {
+    globalForCache.resultCache = new ResultCache(INDEX_PATH, MAX_BYTES, TRANSFORMED_DIR);
+  }
+  return globalForCache.resultCache;
+}
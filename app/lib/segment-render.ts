@@ -0,0 +1,215 @@
+import { randomUUID } from 'crypto';
+import fs from 'fs';
+import { mkdir, open } from 'fs/promises';
+import path from 'path';
+import { ScheduledTask, getJobQueue } from './job-queue';
+import { SegmentLayout, runLayout, runTransform } from './transform-worker';
+
+// Seekable renders. A segmented render produces its output as fixed-length segments
+// (ml_scripts/segments.py), each one raw PCM on disk, and serves them as one WAV file:
+// the header is known from the layout up front and every byte after it belongs to
+// exactly one segment. A byte range is answered by rendering the segments it covers
+// first; the rest of the track is then rendered onwards from there, so seeking into
+// an unrendered region costs about one segment's processing time. Segments render
+// through the job queue like any other work: the ones a read is waiting for at
+// preview priority, the ones rendered ahead in turn with queued jobs.
+
+const SEGMENTS_DIR = process.env.GENRE_AI_SEGMENTS_DIR ?? path.join(process.cwd(), '.cache', 'segments');
+
+// Older renders and their segments are dropped beyond this many
+const MAX_RENDERS = Number(process.env.GENRE_AI_SEGMENTED_RENDERS ?? 16);
+
+export const WAV_HEADER_BYTES = 44;
+
+// Canonical 44-byte header of a PCM WAV file
+export function wavHeader(layout: SegmentLayout): Buffer {
+  const blockAlign = layout.channels * layout.sample_width;
+  const dataBytes = layout.frames * blockAlign;
+  const header = Buffer.alloc(WAV_HEADER_BYTES);
+  header.write('RIFF', 0, 'ascii');
+  header.writeUInt32LE(36 + dataBytes, 4);
+  header.write('WAVE', 8, 'ascii');
+  header.write('fmt ', 12, 'ascii');
+  header.writeUInt32LE(16, 16);
+  header.writeUInt16LE(1, 20);
+  header.writeUInt16LE(layout.channels, 22);
+  header.writeUInt32LE(layout.sr, 24);
+  header.writeUInt32LE(layout.sr * blockAlign, 28);
+  header.writeUInt16LE(blockAlign, 32);
+  header.writeUInt16LE(layout.sample_width * 8, 34);
+  header.write('data', 36, 'ascii');
+  header.writeUInt32LE(dataBytes, 40);
+  return header;
+}
+
+export class SegmentedRender {
+  readonly createdAt = Date.now();
+  private rendered = new Set<number>();
+  private rendering = new Map<number, ScheduledTask<void>>();
+  private header: Buffer;
+  // Where background rendering carries on from
+  private next = 0;
+  private background = false;
+  private discarded = false;
+
+  constructor(
+    readonly id: string,
+    readonly inputFile: string,
+    readonly genre: string,
+    readonly script: string,
+    readonly layout: SegmentLayout,
+    private directory: string
+  ) {
+    this.header = wavHeader(layout);
+  }
+
+  get size(): number {
+    return WAV_HEADER_BYTES + this.layout.frames * this.frameBytes;
+  }
+
+  get duration(): number {
+    return this.layout.frames / this.layout.sr;
+  }
+
+  get done(): boolean {
+    return this.rendered.size === this.layout.segments;
+  }
+
+  private get frameBytes(): number {
+    return this.layout.channels * this.layout.sample_width;
+  }
+
+  private segmentFile(index: number): string {
+    return path.join(this.directory, `${index}.pcm`);
+  }
+
+  // Segment holding byte offset of the WAV file, or -1 for the header
+  segmentAt(offset: number): number {
+    if (offset < WAV_HEADER_BYTES) return -1;
+    const frame = Math.floor((offset - WAV_HEADER_BYTES) / this.frameBytes);
+    return Math.min(Math.floor(frame / this.layout.segment_frames), this.layout.segments - 1);
+  }
+
+  // Last byte offset of segment index in the WAV file
+  segmentEnd(index: number): number {
+    const frames = Math.min((index + 1) * this.layout.segment_frames, this.layout.frames);
+    return WAV_HEADER_BYTES + frames * this.frameBytes - 1;
+  }
+
+  // Render segment index unless it is on disk already; concurrent calls share one render,
+  // which a read that is waiting for it moves up to preview priority
+  private ensure(index: number, waiting = false): Promise<void> {
+    if (this.rendered.has(index)) return Promise.resolve();
+    let pending = this.rendering.get(index);
+    if (!pending) {
+      pending = getJobQueue().schedule(async () => {
+        const result = await runTransform({
+          inputFile: this.inputFile,
+          outputFile: this.segmentFile(index),
+          targetGenre: this.genre,
+          script: this.script,
+          segment: index,
+        });
+        if (!result.success) {
+          throw new Error(result.error ?? `Segment ${index} failed to render`);
+        }
+        this.rendered.add(index);
+      }, waiting);
+      pending.done.finally(() => this.rendering.delete(index)).catch(() => {});
+      this.rendering.set(index, pending);
+    } else if (waiting) {
+      pending.hurry();
+    }
+    return pending.done;
+  }
+
+  // Bytes start..end (inclusive) of the WAV file, rendering the segments they cover first
+  async read(start: number, end: number): Promise<Buffer> {
+    const parts: Buffer[] = [];
+    if (start < WAV_HEADER_BYTES) {
+      parts.push(this.header.subarray(start, Math.min(end + 1, WAV_HEADER_BYTES)));
+    }
+    const first = Math.max(this.segmentAt(start), 0);
+    const last = this.segmentAt(end);
+    for (let index = first; index <= last; index++) {
+      await this.ensure(index, true);
+      const segmentStart = WAV_HEADER_BYTES + index * this.layout.segment_frames * this.frameBytes;
+      const from = Math.max(start, segmentStart);
+      const to = Math.min(end, this.segmentEnd(index));
+      const handle = await open(this.segmentFile(index), 'r');
+      try {
+        const buffer = Buffer.alloc(to - from + 1);
+        await handle.read(buffer, 0, buffer.length, from - segmentStart);
+        parts.push(buffer);
+      } finally {
+        await handle.close();
+      }
+    }
+    if (last >= 0) {
+      this.next = last + 1;
+      this.renderAhead();
+    }
+    return Buffer.concat(parts);
+  }
+
+  // Render the remaining segments one at a time, onwards from the last one read
+  private renderAhead() {
+    if (this.background) return;
+    this.background = true;
+    (async () => {
+      while (!this.done && !this.discarded) {
+        const segments = this.layout.segments;
+        const offsets = Array.from({ length: segments }, (_, step) => (this.next + step) % segments);
+        const index = offsets.find(candidate => !this.rendered.has(candidate))!;
+        await this.ensure(index);
+        if (index >= this.next) this.next = index + 1;
+      }
+      if (this.done) console.log(`Segmented render ${this.id} finished`);
+    })()
+      .catch(error => console.error(`Segmented render ${this.id} stopped:`, error))
+      .finally(() => {
+        this.background = false;
+      });
+  }
+
+  discard() {
+    this.discarded = true;
+    fs.rmSync(this.directory, { recursive: true, force: true });
+  }
+}
+
+// Survive module reloads in `next dev` so renders aren't lost or duplicated
+const globalForRenders = globalThis as unknown as { segmentedRenders?: Map<string, SegmentedRender> };
+
+function renders(): Map<string, SegmentedRender> {
+  if (!globalForRenders.segmentedRenders) {
+    globalForRenders.segmentedRenders = new Map();
+  }
+  return globalForRenders.segmentedRenders;
+}
+
+export function getSegmentedRender(id: string): SegmentedRender | undefined {
+  return renders().get(id);
+}
+
+// Start a segmented render of inputFile; nothing is rendered until it is read
+export async function createSegmentedRender(inputFile: string, genre: string, script = 'spleeter'): Promise<SegmentedRender> {
+  const result = await runLayout(inputFile);
+  if (!result.success || !result.layout) {
+    throw new Error(result.error ?? 'Could not lay out a segmented render');
+  }
+  const id = randomUUID();
+  const directory = path.join(SEGMENTS_DIR, id);
+  await mkdir(directory, { recursive: true });
+  const render = new SegmentedRender(id, inputFile, genre, script, result.layout, directory);
+
+  const all = renders();
+  all.set(render.id, render);
+  const oldestFirst = Array.from(all.values()).sort((a, b) => a.createdAt - b.createdAt);
+  for (const stale of oldestFirst.slice(0, Math.max(0, all.size - MAX_RENDERS))) {
+    stale.discard();
+    all.delete(stale.id);
+  }
+  console.log(`Segmented render ${render.id}: ${result.layout.segments} segments of ${inputFile}`);
+  return render;
+}
@@ -0,0 +1,289 @@
+import { spawn, ChildProcess } from 'child_process';
+import path from 'path';
+import readline from 'readline';
+import { JobProgress } from './job-progress';
+
+// Keeps a fixed pool of long-lived Python transform workers (ml_scripts/transform_worker.py)
+// so uploads don't pay the interpreter, TensorFlow and Spleeter cold start.
+// Each worker renders one job at a time; the pool size bounds CPU and memory use.
+
+export interface TransformJob {
+  inputFile: string;
+  outputFile: string;
+  targetGenre: string;
+  script?: string;
+  // Render in bounded-memory blocks; meant for long uploads
+  stream?: boolean;
+  // Render only a short representative excerpt
+  preview?: boolean;
+  // Render only this segment of a segmented render, as raw PCM (see segment-render.ts)
+  segment?: number;
+}
+
+// Several genres rendered from one decode and separation
+export interface BatchTransformJob {
+  inputFile: string;
+  // target genre -> output path
+  outputFiles: Record<string, string>;
+  script?: string;
+  stream?: boolean;
+  preview?: boolean;
+}
+
+// Asks for the shape of a segmented render of inputFile
+export interface LayoutJob {
+  inputFile: string;
+  layout: true;
+}
+
+// Shape of a segmented render, as computed by ml_scripts/segments.py
+export interface SegmentLayout {
+  sr: number;
+  channels: number;
+  sample_width: number;
+  frames: number;
+  segment_frames: number;
+  segments: number;
+}
+
+type WorkerJob = TransformJob | BatchTransformJob | LayoutJob;
+
+export interface GenreResult {
+  success: boolean;
+  elapsed: number;
+  // The output came from a degraded fallback path (simple effects or a copy of the input)
+  fallback?: boolean;
+}
+
+// One timed stage of a job, as written by ml_scripts/tracing.py
+export interface TraceSpan {
+  trace: string | null;
+  span: string;
+  parent: string | null;
+  ms: number;
+  rss_mb: number | null;
+  // null where the worker's platform can't report them (Windows)
+  peak_rss_mb: number | null;
+  peak_growth_mb: number | null;
+  error?: string;
+  // Stage attributes such as samples, genre, stem or file
+  [attribute: string]: unknown;
+}
+
+export interface TransformResult {
+  id: string;
+  success: boolean;
+  elapsed?: number;
+  error?: string;
+  // Per-genre outcome of a batch job
+  results?: Record<string, GenreResult>;
+  // Some output came from a degraded fallback path
+  fallback?: boolean;
+  // The job's stages in the order they finished
+  trace?: TraceSpan[];
+  // Answer to a layout job
+  layout?: SegmentLayout;
+}
+
+// One line per stage, e.g. "separate 812ms peak 702.9MB (+188.0MB)"
+export function formatTrace(trace: TraceSpan[]): string[] {
+  return trace.map(span => {
+    const label = [span.span, span.stem ?? span.genre].filter(Boolean).join(' ');
+    const failed = span.error ? ` failed (${span.error})` : '';
+    const peak = span.peak_rss_mb === null ? '' : ` peak ${span.peak_rss_mb}MB (+${span.peak_growth_mb}MB)`;
+    return `${label} ${Math.round(span.ms)}ms${peak}${failed}`;
+  });
+}
+
+interface PendingJob {
+  resolve: (result: TransformResult) => void;
+  reject: (error: Error) => void;
+  onProgress?: (progress: JobProgress) => void;
+  timer: NodeJS.Timeout;
+  expire: () => void;
+}
+
+const PROGRESS_PREFIX = '[PROGRESS] ';
+
+// A job is killed after this long without a progress event, the same limit the
+// per-request exec used to have. Each event restarts the clock, so a long render
+// only times out if one of its stages stalls.
+const JOB_TIMEOUT_MS = 300000;
+// One stage can take most of a long render (separating an hour of audio is a single
+// stage), so the clock also allows this many times the job's estimated time left
+const ETA_SLACK = 3;
+
+// Number of worker processes, and so of renders running at once
+export const WORKER_COUNT = Math.max(1, Number(process.env.GENRE_AI_WORKERS ?? 2));
+
+class TransformWorker {
+  private child: ChildProcess | null = null;
+  private pending = new Map<string, PendingJob>();
+  private nextId = 0;
+
+  constructor(private name: string) {}
+
+  // Jobs sent to this worker that have not replied yet
+  get load(): number {
+    return this.pending.size;
+  }
+
+  private start(): ChildProcess {
+    const scriptsDir = path.join(process.cwd(), 'ml_scripts');
+    const workerPath = path.join(scriptsDir, 'transform_worker.py');
+
+    // On Windows go through the batch script so the conda environment is activated
+    const child = process.platform === 'win32'
+      ? spawn(`"${path.join(scriptsDir, 'run_spleeter.bat')}"`, [`"${workerPath}"`], { shell: true })
+      : spawn(process.env.PYTHON_BIN || 'python3', [workerPath]);
+
+    console.log(`Started transform worker ${this.name} (pid ${child.pid})`);
+
+    readline.createInterface({ input: child.stdout! }).on('line', (line) => this.handleLine(line));
+    readline.createInterface({ input: child.stderr! }).on('line', (line) => this.handleLog(line));
+
+    child.on('exit', (code) => {
+      console.log(`Transform worker ${this.name} exited with code ${code}`);
+      this.child = null;
+      this.failAll(new Error(`Transform worker ${this.name} exited with code ${code}`));
+    });
+
+    this.child = child;
+    return child;
+  }
+
+  private handleLine(line: string) {
+    // The batch script echoes plain text; only JSON lines belong to the protocol
+    if (!line.startsWith('{')) {
+      this.handleLog(line);
+      return;
+    }
+
+    let message: any;
+    try {
+      message = JSON.parse(line);
+    } catch (error) {
+      console.error('Unparseable worker output:', line);
+      return;
+    }
+
+    if (message.event === 'ready') {
+      console.log(`Transform worker ${this.name} ready`);
+      return;
+    }
+
+    const job = this.pending.get(message.id);
+    if (!job) return;
+    clearTimeout(job.timer);
+    this.pending.delete(message.id);
+    job.resolve(message as TransformResult);
+  }
+
+  // Log lines, except progress events, which go to the job they belong to
+  private handleLog(line: string) {
+    if (!line.startsWith(PROGRESS_PREFIX)) {
+      console.log(line);
+      return;
+    }
+    let event: any;
+    try {
+      event = JSON.parse(line.slice(PROGRESS_PREFIX.length));
+    } catch (error) {
+      console.error('Unparseable progress event:', line);
+      return;
+    }
+    const job = this.pending.get(event.trace);
+    if (!job) return;
+    this.restartTimer(job, event.eta);
+    job.onProgress?.({ stage: event.stage, fraction: event.fraction, eta: event.eta });
+  }
+
+  // The job is still making progress: give it another full timeout, or longer if it expects to need it
+  private restartTimer(job: PendingJob, eta: number | null) {
+    clearTimeout(job.timer);
+    job.timer = setTimeout(job.expire, Math.max(JOB_TIMEOUT_MS, (eta ?? 0) * 1000 * ETA_SLACK));
+  }
+
+  private failAll(error: Error) {
+    for (const [id, job] of this.pending) {
+      clearTimeout(job.timer);
+      job.reject(error);
+      this.pending.delete(id);
+    }
+  }
+
+  run(job: WorkerJob, onProgress?: (progress: JobProgress) => void): Promise<TransformResult> {
+    const child = this.child ?? this.start();
+    const id = `${this.name}-${++this.nextId}`;
+    const target = 'layout' in job
+      ? { layout: true }
+      : 'outputFiles' in job
+        ? { output_files: job.outputFiles, script: job.script ?? 'spleeter', stream: job.stream ?? false, preview: job.preview ?? false }
+        : {
+          output_file: job.outputFile,
+          target_genre: job.targetGenre,
+          script: job.script ?? 'spleeter',
+          stream: job.stream ?? false,
+          preview: job.preview ?? false,
+          segment: job.segment,
+        };
+
+    return new Promise((resolve, reject) => {
+      const expire = () => {
+        this.pending.delete(id);
+        reject(new Error(`Transform job ${id} timed out`));
+        // A stuck job blocks the queue behind it, so start over with a fresh worker
+        child.kill();
+      };
+
+      this.pending.set(id, { resolve, reject, onProgress, timer: setTimeout(expire, JOB_TIMEOUT_MS), expire });
+      child.stdin!.write(JSON.stringify({
+        id,
+        input_file: job.inputFile,
+        ...target,
+      }) + '\n');
+    });
+  }
+}
+
+class TransformWorkerPool {
+  private workers: TransformWorker[];
+
+  constructor(size: number) {
+    this.workers = Array.from({ length: size }, (_, index) => new TransformWorker(String(index + 1)));
+  }
+
+  // Jobs go to the least loaded worker; processes start on first use
+  run(job: WorkerJob, onProgress?: (progress: JobProgress) => void): Promise<TransformResult> {
+    const worker = this.workers.reduce((best, worker) => (worker.load < best.load ? worker : best));
+    return worker.run(job, onProgress);
+  }
+}
+
+// Survive module reloads in `next dev` so we don't leak worker processes
+const globalForWorker = globalThis as unknown as { transformWorkerPool?: TransformWorkerPool };
+
+export function getTransformWorker(): TransformWorkerPool {
+  if (!globalForWorker.transformWorkerPool) {
+    globalForWorker.transformWorkerPool = new TransformWorkerPool(WORKER_COUNT);
+  }
+  return globalForWorker.transformWorkerPool;
+}
+
+export function runTransform(
+  job: TransformJob,
+  onProgress?: (progress: JobProgress) => void
+): Promise<TransformResult> {
+  return getTransformWorker().run(job, onProgress);
+}
+
+export function runBatchTransform(
+  job: BatchTransformJob,
+  onProgress?: (progress: JobProgress) => void
+): Promise<TransformResult> {
+  return getTransformWorker().run(job, onProgress);
+}
+
+export function runLayout(inputFile: string): Promise<TransformResult> {
+  return getTransformWorker().run({ inputFile, layout: true });
+}
@@ -6,11 +6,29 @@ import ModernAudioPlayer from '@/app/components/ModernAudioPlayer';
 import SimpleAudioTest from './components/SimpleAudioTest';
 import FileUpload from './components/FileUpload';
 import SuccessNotification from './components/SuccessNotification';
+import { JobProgress } from './lib/job-progress';
+
+// Follow a transform job's event stream, reporting its progress, until it finishes;
+// returns the final status. EventSource reconnects by itself if the stream drops.
+function waitForJob(jobId: string, onProgress: (progress: JobProgress) => void): Promise<any> {
+  return new Promise((resolve) => {
+    const events = new EventSource(`/api/jobs/${jobId}/events`);
+    events.onmessage = (message) => {
+      const job = JSON.parse(message.data);
+      onProgress(job.progress);
+      if (job.status === 'done' || job.status === 'failed') {
+        events.close();
+        resolve(job);
+      }
+    };
+  });
+}
 
 export default function Home() {
   const [file, setFile] = useState<File | null>(null);
   const [genre, setGenre] = useState<string>('rock');
   const [isProcessing, setIsProcessing] = useState<boolean>(false);
+  const [jobProgress, setJobProgress] = useState<JobProgress | null>(null);
   const [transformedAudioUrl, setTransformedAudioUrl] = useState<string>('');
   const [originalAudio, setOriginalAudio] = useState<string | null>(null);
   const [error, setError] = useState<string | null>(null);
@@ -324,6 +342,7 @@ export default function Home() {
     console.log('Selected genre:', genre);
     
     setIsProcessing(true);
+    setJobProgress(null);
     setError(null);
     
     // Clean up existing transformed audio processing
@@ -358,6 +377,11 @@ export default function Home() {
     // Make sure genre is a string
     formData.append('genre', genreValue);
     
+    // Ask for a render that plays and seeks right away; failing that, a short excerpt
+    // to listen to while the full track renders
+    formData.append('seekable', '1');
+    formData.append('preview', '1');
+    
     // Log what's in the form data
     console.log('Form data entries:');
     for (const pair of formData.entries()) {
@@ -388,7 +412,22 @@ export default function Home() {
         throw new Error(`Server error: ${response.status} - ${errorData.error || errorText || 'Unknown error'}`);
       }
       
-      const data = await response.json();
+      // The server queues the render and answers with a job to follow
+      const queued = await response.json();
+      console.log('Transformation queued:', queued);
+      // Play the preview excerpt as soon as it is ready, then swap in the full render
+      if (queued.preview && queued.status !== 'done') {
+        const preview = queued.preview.status === 'done'
+          ? queued.preview
+          : await waitForJob(queued.preview.jobId, setJobProgress);
+        if (preview.success && preview.transformedFilePath) {
+          setTransformedAudioUrl(preview.transformedFilePath);
+          setTransformationDetails("Preview ready - rendering the full track...");
+          setIsProcessing(false);
+        }
+      }
+      // Renders served from the result cache come back finished, seekable ones ready to play
+      const data = queued.status === 'done' || queued.render ? queued : await waitForJob(queued.jobId, setJobProgress);
       console.log('Transformation result:', data);
       
       // Handle the successful transformation - more robust checking
@@ -400,7 +439,7 @@ export default function Home() {
         console.log('Transformation complete, audio URL:', data.transformedFilePath);
       } else {
         console.error('Unexpected API response:', data);
-        throw new Error(data.message || 'Unexpected response from server');
+        throw new Error(data.error || data.message || 'Unexpected response from server');
       }
     } catch (error) {
       console.error('Error transforming audio:', error);
@@ -868,7 +907,7 @@ export default function Home() {
         </div>
       )}
 
-      {isProcessing && <LoadingOverlay />}
+      {isProcessing && <LoadingOverlay progress={jobProgress} />}
 
       {showNotification && (
         <SuccessNotification 
@@ -0,0 +1,81 @@
+"""
+Decode throughput: audio_codec.decode against librosa.load.
+
+Usage: python benchmarks/bench_decode.py [--repeat N] [files...]
+
+Without files, every audio file in uploads/, transformed/ and
+public/transformed/ is decoded. Two cases are timed per file: the native-rate
+mono decode the effect scripts use, and the 44.1 kHz stereo decode that feeds
+the separator. Speed is seconds of audio decoded per second of wall time.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "ml_scripts"))
+import librosa
+from audio_codec import decode
+
+AUDIO_DIRS = ["uploads", "transformed", os.path.join("public", "transformed")]
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".mp3", ".m4a", ".aac", ".opus")
+
+CASES = {
+    "native mono": (lambda path: librosa.load(path, sr=None),
+                    lambda path: decode(path, mono=True)),
+    "44.1k stereo": (lambda path: librosa.load(path, sr=44100, mono=False),
+                     lambda path: decode(path, sr=44100)),
+}
+
+def find_audio_files():
+    files = []
+    for directory in AUDIO_DIRS:
+        files += sorted(path for path in glob.glob(os.path.join(ROOT, directory, "*"))
+                        if path.lower().endswith(AUDIO_EXTENSIONS))
+    return files
+
+def best_time(load, path, repeat):
+    """Fastest of repeat runs, with the loaded (audio, sr)"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        audio, sr = load(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, audio, sr
+
+def bench_file(path, repeat):
+    print(os.path.relpath(path, ROOT))
+    for case, loaders in CASES.items():
+        results = []
+        for name, load in zip(("librosa", "decode"), loaders):
+            try:
+                elapsed, audio, sr = best_time(load, path, repeat)
+            except Exception as e:
+                results.append(None)
+                reason = (str(e).splitlines() or [""])[0][:60]
+                print(f"  {case:<13} {name:<8} unavailable ({type(e).__name__}: {reason})")
+                continue
+            seconds = max(audio.shape) / sr
+            results.append(elapsed)
+            print(f"  {case:<13} {name:<8} {elapsed * 1000:8.1f} ms  {seconds / elapsed:8.1f}x realtime  {audio.dtype}")
+        if None not in results:
+            print(f"  {case:<13} speedup  {results[0] / results[1]:8.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark audio decoding")
+    parser.add_argument("files", nargs="*", help="audio files (default: uploads and rendered outputs)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the best is kept")
+    args = parser.parse_args()
+
+    files = args.files or find_audio_files()
+    if not files:
+        print("No audio files found")
+        return
+    for path in files:
+        bench_file(path, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+Effect and genre-preset benchmarks.
+
+Usage: python benchmarks/bench_effects.py [--durations 30,180,600] [--layouts mono,stereo]
+                                          [--filter TEXT] [--repeat N]
+                                          [--output results.json] [--baseline baseline.json]
+                                          [--threshold 0.2]
+
+Renders synthetic program material (a chord progression with bass and lead
+over a drum pattern) at each duration, mono and stereo, and times:
+
+  - every apply_* effect of spleeter_transform, process_audio and
+    simple_transform, and every apply_*_style of magenta_transform and
+    magenta_inspired, each in isolation (stereo runs the effect per channel);
+  - every genre end to end: the stem chains and mix, the whole-file
+    simple_transform and stem-free fallbacks, and the magenta-style file
+    transforms. The full Spleeter transform is included when Spleeter is
+    installed; otherwise only its post-separation stage is timed.
+
+Each measurement runs in a forked child after a warm-up in the parent
+(numba compilation, filter designs and reverb spectra are cached by then), so
+peak RSS is the memory the case itself needed. Results are written as JSON
+with wall time, peak RSS and samples per second. With --baseline, cases
+slower or hungrier than the baseline by more than --threshold are reported
+as regressions and the exit status is 1.
+"""
+import argparse
+import contextlib
+import datetime
+import importlib
+import importlib.util
+import inspect
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "ml_scripts"))
+import numpy as np
+import soundfile as sf
+
+SR = 44100
+DEFAULT_DURATIONS = (30, 180, 600)
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "results", "effects.json")
+RESULTS_VERSION = 1
+
+STEM_MODULES = ("spleeter_transform", "process_audio", "simple_transform")
+STYLE_MODULES = {"magenta_transform": "transform_with_magenta",
+                 "magenta_inspired": "transform_with_genre_effects"}
+FILE_GENRES = ("rock", "electronic", "hip hop", "jazz", "classical", "country", "metal", "r&b", "reggae", "pop")
+STYLE_GENRES = ("jazz", "rock", "electronic", "classical", "pop")
+
+# Arguments (after the audio) each stem-module effect is benchmarked with
+EFFECT_ARGS = {
+    "apply_compression": (0.7,),
+    "apply_distortion": (0.5,),
+    "apply_filter": ("lowpass", 1000),
+    "apply_delay": (0.15, 0.3),
+    "apply_reverb": (0.5, 0.4),
+    "apply_bass_boost": (1.4,),
+    "apply_eq_boost": (2000, 1.2),
+    "apply_lfo": (0.2, 8),
+}
+# File-level entry points timed end to end rather than in isolation
+FILE_EFFECTS = ("apply_simple_effects",)
+
+def program_material(seconds, channels=1, sr=SR):
+    """Synthetic stems (vocals, drums, bass, other) of a looping 8 s song at 120 bpm
+
+    Every stem is (n_samples,) for channels=1, otherwise (n_samples, 2).
+    """
+    rng = np.random.default_rng(0)
+    loop = 8 * sr
+    t = np.arange(loop) / sr
+    chords = [(220.0, 277.2, 329.6), (196.0, 246.9, 293.7), (174.6, 220.0, 261.6), (196.0, 246.9, 329.6)]
+    chord = np.minimum((t // 2).astype(int), 3)
+    attack = np.minimum((t % 2) * 20, 1) * np.exp(-(t % 2) * 0.8)
+
+    other = np.zeros(loop)
+    for voice in range(3):
+        freq = np.array([c[voice] for c in chords])[chord]
+        for harmonic, level in ((1, 0.15), (2, 0.06), (3, 0.03)):
+            other += level * np.sin(2 * np.pi * freq * harmonic * t + voice) * attack
+    bass = 0.3 * np.sin(2 * np.pi * np.array([c[0] for c in chords])[chord] / 2 * t) * attack
+    melody = np.array([440.0, 493.9, 523.3, 587.3, 659.3, 587.3, 523.3, 493.9])[(t * 2).astype(int) % 8]
+    vocals = 0.2 * np.sin(2 * np.pi * melody * t * (1 + 0.004 * np.sin(2 * np.pi * 5.5 * t)))
+
+    # One bar of drums: kick on 1 and 3, snare on 2 and 4, hats on the eighths
+    bar = 2 * sr
+    drums = np.zeros(bar)
+    tb = np.arange(bar) / sr
+    for beat in range(4):
+        start = beat * bar // 4
+        hit = tb[:bar // 4]
+        if beat % 2 == 0:
+            drums[start:start + bar // 4] += 0.8 * np.sin(2 * np.pi * (50 + 100 * np.exp(-hit * 30)) * hit) * np.exp(-hit * 12)
+        else:
+            drums[start:start + bar // 4] += 0.4 * rng.standard_normal(bar // 4) * np.exp(-hit * 25)
+    for eighth in range(8):
+        start = eighth * bar // 8
+        drums[start:start + bar // 16] += 0.08 * rng.standard_normal(bar // 16) * np.exp(-tb[:bar // 16] * 80)
+    drums = np.tile(drums, 4)
+
+    n = int(seconds * sr)
+    stems = {}
+    for name, stem in (("vocals", vocals), ("drums", drums), ("bass", bass), ("other", other)):
+        stem = np.resize(stem.astype(np.float32), n)
+        if channels == 2:
+            # Slightly different balance per side so the channels aren't identical
+            pan = {"vocals": 0.0, "drums": 0.2, "bass": 0.0, "other": -0.3}[name]
+            stem = np.column_stack([stem * (1 - pan) * 0.8, stem * (1 + pan) * 0.8]).astype(np.float32)
+        stems[name] = stem
+    return stems
+
+def mixdown(stems):
+    return sum(stems.values()).astype(np.float32)
+
+def per_channel(effect, audio, *args):
+    if audio.ndim == 1:
+        return effect(audio, *args)
+    return np.column_stack([effect(audio[:, channel], *args) for channel in range(audio.shape[1])])
+
+def load_modules():
+    """Importable benchmark modules, and the reason each other one was skipped"""
+    modules, skipped = {}, {}
+    for name in STEM_MODULES + tuple(STYLE_MODULES):
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                modules[name] = importlib.import_module(name)
+        except Exception as e:
+            skipped[name] = f"{type(e).__name__}: {e}"
+    return modules, skipped
+
+def build_cases(modules, material, files):
+    """(case id, function) pairs for one piece of material"""
+    cases = []
+    mix = mixdown(material)
+    for name in STEM_MODULES:
+        module = modules.get(name)
+        if module is None:
+            continue
+        for fn_name, fn in inspect.getmembers(module, inspect.isfunction):
+            if not fn_name.startswith("apply_") or fn.__module__ != name or fn_name in FILE_EFFECTS:
+                continue
+            if fn_name not in EFFECT_ARGS:
+                print(f"[BENCH] No benchmark arguments for {name}.{fn_name}, skipping it")
+                continue
+            cases.append((f"{name}.{fn_name}", lambda fn=fn, fn_args=EFFECT_ARGS[fn_name]: per_channel(fn, mix, *fn_args)))
+
+    for name in STYLE_MODULES:
+        module = modules.get(name)
+        if module is None:
+            continue
+        for fn_name, fn in inspect.getmembers(module, inspect.isfunction):
+            # apply_genre_style only dispatches to the others; it is covered end to end
+            if (fn_name.startswith("apply_") and fn_name.endswith("_style") and fn.__module__ == name
+                    and fn_name != "apply_genre_style"):
+                cases.append((f"{name}.{fn_name}", lambda fn=fn: per_channel(fn, mix, SR)))
+
+    # End to end
+    stems_mono = {stem: audio if audio.ndim == 1 else audio.mean(axis=1) for stem, audio in material.items()}
+    for genre in getattr(modules.get("spleeter_transform"), "GENRE_CHAINS", {}):
+        mix_genre_stems = modules["spleeter_transform"].mix_genre_stems
+        cases.append((f"spleeter_transform.mix_genre_stems:{genre}", lambda genre=genre: mix_genre_stems(stems_mono, genre)))
+    if "process_audio" in modules:
+        from stem_pool import process_stems
+        for genre, chains in modules["process_audio"].GENRE_CHAINS.items():
+            cases.append((f"process_audio.GENRE_CHAINS:{genre}",
+                          lambda chains=chains: mixdown(process_stems(stems_mono, chains))))
+
+    input_file, output_file = files
+    spleeter_available = importlib.util.find_spec("spleeter") is not None
+    spleeter_module = modules.get("spleeter_transform")
+    simple_module = modules.get("simple_transform")
+    for genre in FILE_GENRES:
+        if spleeter_module is not None:
+            cases.append((f"spleeter_transform.apply_simple_effects:{genre}",
+                          lambda genre=genre: spleeter_module.apply_simple_effects(input_file, output_file, genre)))
+            if spleeter_available:
+                cases.append((f"spleeter_transform.transform_genre:{genre}",
+                              lambda genre=genre: spleeter_module.transform_genre(input_file, output_file, genre)))
+        if simple_module is not None:
+            cases.append((f"simple_transform.transform_genre:{genre}",
+                          lambda genre=genre: simple_module.transform_genre(input_file, output_file, genre)))
+    for name, entry in STYLE_MODULES.items():
+        if name in modules:
+            transform = getattr(modules[name], entry)
+            for genre in STYLE_GENRES:
+                cases.append((f"{name}.{entry}:{genre}",
+                              lambda transform=transform, genre=genre: transform(input_file, output_file, genre)))
+    return cases
+
+def _current_rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
+
+def _run_case(fn, connection):
+    import stem_pool
+    # Pool threads don't survive the fork; let the child start its own
+    stem_pool._pools.clear()
+    try:
+        before = _current_rss()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        wall = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - before
+        connection.send({"wall_s": wall, "peak_rss_mb": max(peak, 0) / 2 ** 20})
+    except Exception as e:
+        connection.send({"error": f"{type(e).__name__}: {e}"})
+    connection.close()
+
+def measure(fn, repeat):
+    """Best wall time and largest peak RSS over repeat forked runs"""
+    context = multiprocessing.get_context("fork")
+    best = None
+    for _ in range(repeat):
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_run_case, args=(fn, sender))
+        process.start()
+        sender.close()
+        try:
+            result = receiver.recv()
+        except EOFError:
+            result = {"error": "benchmark process died"}
+        process.join()
+        if "error" in result:
+            return result
+        if best is None:
+            best = result
+        else:
+            best = {"wall_s": min(best["wall_s"], result["wall_s"]),
+                    "peak_rss_mb": max(best["peak_rss_mb"], result["peak_rss_mb"])}
+    return best
+
+def warm_up(modules, case_filter):
+    """Run every case once on a second of audio so one-time costs stay out of the numbers"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        material = program_material(1)
+        files = write_input(material, temp_dir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for case, fn in build_cases(modules, material, files):
+                if case_filter in case:
+                    try:
+                        fn()
+                    except Exception:
+                        pass
+
+def write_input(material, directory):
+    input_file = os.path.join(directory, "input.wav")
+    sf.write(input_file, mixdown(material), SR, subtype="FLOAT")
+    return input_file, os.path.join(directory, "output.wav")
+
+def compare(results, baseline, threshold):
+    """Case ids whose time or memory regressed beyond threshold against baseline"""
+    regressions = []
+    for case, result in results.items():
+        previous = baseline.get(case)
+        if previous is None or "error" in result or "error" in previous:
+            continue
+        for metric in ("wall_s", "peak_rss_mb"):
+            # Ignore memory noise on cases that barely allocate
+            floor = 1.0 if metric == "peak_rss_mb" else 0.0
+            if result[metric] > max(previous[metric], floor) * (1 + threshold):
+                regressions.append((case, metric, previous[metric], result[metric]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark effects and genre presets")
+    parser.add_argument("--durations", default=",".join(map(str, DEFAULT_DURATIONS)),
+                        help="comma-separated material lengths in seconds")
+    parser.add_argument("--layouts", default="mono,stereo", help="comma-separated: mono, stereo")
+    parser.add_argument("--filter", default="", help="only run cases whose id contains this text")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case; the fastest is kept")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON results file")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown/growth, as a fraction")
+    args = parser.parse_args()
+
+    modules, skipped = load_modules()
+    for name, reason in skipped.items():
+        print(f"[BENCH] Skipping {name}: {reason}")
+    warm_up(modules, args.filter)
+
+    results = {}
+    for seconds in (float(d) for d in args.durations.split(",")):
+        for layout in args.layouts.split(","):
+            material = program_material(seconds, channels=2 if layout == "stereo" else 1)
+            n_samples = int(seconds * SR)
+            with tempfile.TemporaryDirectory() as temp_dir:
+                files = write_input(material, temp_dir)
+                for case, fn in build_cases(modules, material, files):
+                    # Stem chains always see mono stems, so they have no stereo variant
+                    if layout == "stereo" and ("mix_genre_stems" in case or "GENRE_CHAINS" in case):
+                        continue
+                    case_id = f"{case}/{seconds:g}s/{layout}"
+                    if args.filter not in case_id:
+                        continue
+                    result = measure(fn, args.repeat)
+                    if "error" not in result:
+                        result["samples_per_s"] = n_samples / result["wall_s"]
+                        print(f"{case_id:<70} {result['wall_s']:9.3f} s {result['peak_rss_mb']:9.1f} MB "
+                              f"{result['samples_per_s'] / 1e6:9.2f} Msamples/s")
+                    else:
+                        print(f"{case_id:<70} failed: {result['error']}")
+                    results[case_id] = result
+
+    report = {
+        "version": RESULTS_VERSION,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "numpy": np.__version__,
+                    "platform": platform.platform(), "cpus": os.cpu_count()},
+        "skipped": skipped,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[BENCH] Wrote {len(results)} results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for case, metric, before, after in regressions:
+            print(f"[BENCH] REGRESSION {case} {metric}: {before:.3f} -> {after:.3f} ({after / before - 1:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"[BENCH] No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
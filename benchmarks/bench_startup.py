@@ -0,0 +1,178 @@
+"""
+Start-up benchmarks: time to first sample for every transform entry point.
+
+Usage: python benchmarks/bench_startup.py [--repeat N] [--filter TEXT]
+                                          [--output results.json] [--baseline baseline.json]
+                                          [--threshold 0.2]
+
+Each entry point is started as a fresh interpreter on a short synthetic WAV,
+the way the app used to spawn them, and timed until its decode span
+(see ml_scripts/tracing.py) reports the first audio; the process is then
+stopped. Separately, the module's import time is measured in a fresh
+interpreter, net of a bare interpreter's start-up, and its heaviest
+direct imports are listed from python -X importtime. With --baseline,
+entry points that got slower by more than --threshold (and 50 ms) are
+reported as regressions and the exit status is 1.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(ROOT, "ml_scripts")
+sys.path.append(SCRIPTS_DIR)
+import numpy as np
+import soundfile as sf
+
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "results", "startup.json")
+RESULTS_VERSION = 1
+SR = 44100
+INPUT_SECONDS = 5
+TIMEOUT_S = 120
+# Differences below this are start-up noise
+FLOOR_S = 0.05
+TOP_IMPORTS = 5
+
+# script -> whether importing it is side-effect free (transform_genre.py runs on import)
+ENTRY_POINTS = {
+    "spleeter_transform.py": True,
+    "process_audio.py": True,
+    "simple_transform.py": True,
+    "magenta_inspired.py": True,
+    "magenta_transform.py": True,
+    "transform_genre.py": False,
+}
+
+def write_input(directory):
+    t = np.arange(SR * INPUT_SECONDS) / SR
+    path = os.path.join(directory, "input.wav")
+    sf.write(path, 0.3 * np.sin(2 * np.pi * 220 * t), SR)
+    return path
+
+def child_env():
+    return dict(os.environ, PYTHONUNBUFFERED="1", GENRE_AI_TRACE="1")
+
+def time_to_first_sample(script, input_file, output_file):
+    """Seconds from spawning script until its first decode span ends"""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(SCRIPTS_DIR, script), input_file, output_file, "rock"],
+                               cwd=SCRIPTS_DIR, env=child_env(), stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, text=True)
+    tail = []
+    try:
+        for line in process.stdout:
+            if line.startswith("[TRACE] ") and json.loads(line[len("[TRACE] "):])["span"] == "decode":
+                return time.perf_counter() - start
+            tail = (tail + [line.rstrip()])[-5:]
+            if time.perf_counter() - start > TIMEOUT_S:
+                break
+    finally:
+        process.kill()
+        process.wait()
+    raise RuntimeError("no decode span; last output: " + " | ".join(tail))
+
+def run_python(code, importtime=False):
+    """Wall time of a fresh interpreter running code, and its stderr"""
+    options = ["-X", "importtime"] if importtime else []
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, *options, "-c", code], cwd=SCRIPTS_DIR,
+                               env=child_env(), capture_output=True, text=True, timeout=TIMEOUT_S)
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError((completed.stderr.strip().splitlines() or [""])[-1])
+    return elapsed, completed.stderr
+
+def heaviest_imports(importtime_log):
+    """The entry module's direct imports by cumulative import time, in seconds"""
+    imports = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Each level of nesting indents the name by two more spaces
+        if name.startswith("   ") and not name.startswith("     "):
+            imports.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(imports, key=lambda item: -item[1])[:TOP_IMPORTS]
+
+def bench_entry_point(script, importable, input_file, output_file, bare_s, repeat):
+    result = {"ttfs_s": min(time_to_first_sample(script, input_file, output_file) for _ in range(repeat))}
+    if importable:
+        module = os.path.splitext(script)[0]
+        import_s = min(run_python(f"import {module}")[0] for _ in range(repeat))
+        result["import_s"] = max(import_s - bare_s, 0.0)
+        result["heaviest_imports"] = heaviest_imports(run_python(f"import {module}", importtime=True)[1])
+    return result
+
+def compare(results, baseline, threshold):
+    """(entry point, metric, before, after) for every slowdown beyond threshold"""
+    regressions = []
+    for script, result in results.items():
+        previous = baseline.get(script)
+        if previous is None or "error" in result or "error" in previous:
+            continue
+        for metric in ("ttfs_s", "import_s"):
+            if metric in result and metric in previous:
+                if result[metric] > previous[metric] * (1 + threshold) + FLOOR_S:
+                    regressions.append((script, metric, previous[metric], result[metric]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark transform entry point start-up")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the fastest is kept")
+    parser.add_argument("--filter", default="", help="only run entry points whose name contains this text")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON results file")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, as a fraction")
+    args = parser.parse_args()
+
+    bare_s = min(run_python("pass")[0] for _ in range(args.repeat))
+    print(f"{'interpreter':<24} {bare_s:8.3f} s")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_file = write_input(temp_dir)
+        for script, importable in ENTRY_POINTS.items():
+            if args.filter not in script:
+                continue
+            output_file = os.path.join(temp_dir, "output.wav")
+            try:
+                result = bench_entry_point(script, importable, input_file, output_file, bare_s, args.repeat)
+            except Exception as e:
+                result = {"error": f"{type(e).__name__}: {(str(e).splitlines() or [''])[0][:200]}"}
+                print(f"{script:<24} failed: {result['error']}")
+            else:
+                imports = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in result.get("heaviest_imports", []))
+                import_s = f"{result['import_s']:8.3f} s import" if "import_s" in result else " " * 15
+                print(f"{script:<24} {result['ttfs_s']:8.3f} s to first sample {import_s}  {imports}")
+            results[script] = result
+
+    report = {
+        "version": RESULTS_VERSION,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "interpreter_s": bare_s,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[BENCH] Wrote {len(results)} results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for script, metric, before, after in regressions:
+            print(f"[BENCH] REGRESSION {script} {metric}: {before:.3f} -> {after:.3f} ({after / before - 1:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"[BENCH] No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Audio decoding and encoding.
+
+decode() reads a file straight into a float32 NumPy buffer. Formats libsndfile
+understands (WAV, FLAC, OGG, and MP3 on recent builds) are read in place
+through soundfile; anything else, such as the .m4a uploads, is decoded by an
+ffmpeg subprocess that pipes raw float32 samples to stdout. Unlike
+librosa.load this never goes through audioread, never produces float64 and
+keeps the channel layout unless mono is requested. Resampling uses soxr,
+the resampler librosa uses by default.
+
+open_decoder() gives a soundfile-like handle (samplerate, channels, read())
+over the same two backends, so block-wise readers work with any format, and
+probe() reads a file's rate and length without decoding it.
+
+open_encoder() is the output side: it writes the container the file name asks
+for. Compressed formats (AAC in .m4a, MP3, Opus) are encoded by an ffmpeg
+subprocess fed float32 blocks through a pipe as they are produced, so encoding
+runs alongside the final processing instead of after it; the bitrate comes
+from GENRE_AI_OUTPUT_BITRATE. Every container libsndfile writes (WAV, FLAC,
+OGG, AIFF, AU, CAF, ...) goes through soundfile, and an extension neither
+knows gets WAV data rather than an error.
+"""
+import json
+import os
+import subprocess
+import numpy as np
+import soundfile as sf
+import soxr
+from tracing import span
+
+FFMPEG = 'ffmpeg'
+FFPROBE = 'ffprobe'
+# Bytes pulled from the ffmpeg pipe per read when reading to the end
+PIPE_CHUNK = 1 << 22
+# Frames handed to an encoder per write by encode()
+ENCODE_BLOCK = 1 << 16
+DEFAULT_BITRATE = '192k'
+
+# Extensions that name a libsndfile container under another name
+SOUNDFILE_ALIASES = {'.aif': 'AIFF', '.aifc': 'AIFF', '.snd': 'AU'}
+# Extensions ffmpeg encodes; every other output is written by soundfile
+FFMPEG_CODECS = {
+    '.m4a': ['-c:a', 'aac'],
+    '.aac': ['-c:a', 'aac'],
+    '.mp4': ['-c:a', 'aac'],
+    '.mp3': ['-c:a', 'libmp3lame'],
+    # libopus only takes a few rates; 48 kHz is its native one
+    '.opus': ['-c:a', 'libopus', '-ar', '48000'],
+    '.webm': ['-c:a', 'libopus', '-ar', '48000'],
+}
+
+class FFmpegReader:
+    """Read any format ffmpeg understands as float32 frames, soundfile style"""
+
+    def __init__(self, path, offset=0.0, duration=None):
+        self.samplerate, self.channels = probe_ffmpeg(path)
+        command = [FFMPEG, '-nostdin', '-loglevel', 'error']
+        if offset:
+            command += ['-ss', str(offset)]
+        command += ['-i', path]
+        if duration is not None:
+            command += ['-t', str(duration)]
+        command += ['-map', '0:a:0', '-f', 'f32le', '-acodec', 'pcm_f32le', '-']
+        self.path = path
+        self._process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def read(self, frames=-1, dtype='float32', always_2d=True):
+        """Next frames frames as (n, channels) float32, fewer at the end; -1 reads to the end"""
+        frame_bytes = 4 * self.channels
+        if frames < 0:
+            chunks = iter(lambda: self._process.stdout.read(PIPE_CHUNK), b'')
+            buffer = bytearray(b''.join(chunks))
+            at_end = True
+        else:
+            buffer = bytearray(frames * frame_bytes)
+            view = memoryview(buffer)
+            filled = 0
+            while filled < len(buffer):
+                count = self._process.stdout.readinto(view[filled:])
+                if not count:
+                    break
+                filled += count
+            del view
+            at_end = filled < len(buffer)
+            del buffer[filled - filled % frame_bytes:]
+        if at_end:
+            self._check_exit()
+
+        audio = np.frombuffer(buffer, dtype=np.float32).reshape(-1, self.channels)
+        audio = audio.astype(dtype, copy=False)
+        return audio if always_2d or self.channels > 1 else audio[:, 0]
+
+    def _check_exit(self):
+        if self._process.wait() != 0:
+            message = self._process.stderr.read().decode(errors='replace').strip()
+            raise RuntimeError(f"ffmpeg could not decode {self.path}: {message}")
+
+    def close(self):
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.wait()
+        self._process.stdout.close()
+        self._process.stderr.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def probe_ffmpeg(path):
+    """(sample rate, channels) of the first audio stream, via ffprobe"""
+    result = subprocess.run([FFPROBE, '-v', 'error', '-select_streams', 'a:0',
+                             '-show_entries', 'stream=sample_rate,channels', '-of', 'json', path],
+                            capture_output=True, text=True)
+    streams = json.loads(result.stdout or '{}').get('streams') if result.returncode == 0 else None
+    if not streams:
+        raise RuntimeError(f"ffprobe found no audio stream in {path}: {result.stderr.strip()}")
+    return int(streams[0]['sample_rate']), int(streams[0]['channels'])
+
+def probe(path):
+    """(sample rate, duration in seconds) of path without decoding it"""
+    try:
+        info = sf.info(path)
+        return info.samplerate, info.frames / info.samplerate
+    except RuntimeError:
+        pass
+    result = subprocess.run([FFPROBE, '-v', 'error', '-select_streams', 'a:0',
+                             '-show_entries', 'stream=sample_rate:format=duration', '-of', 'json', path],
+                            capture_output=True, text=True)
+    info = json.loads(result.stdout or '{}') if result.returncode == 0 else {}
+    if not info.get('streams') or 'duration' not in info.get('format', {}):
+        raise RuntimeError(f"ffprobe found no audio stream in {path}: {result.stderr.strip()}")
+    return int(info['streams'][0]['sample_rate']), float(info['format']['duration'])
+
+def open_decoder(path):
+    """Open path for float32 block reads with soundfile, or through ffmpeg if libsndfile can't read it"""
+    try:
+        return sf.SoundFile(path)
+    except RuntimeError:
+        return FFmpegReader(path)
+
+def decode(path, sr=None, mono=False, offset=0.0, duration=None):
+    """Decode path into float32 audio and return (audio, sample rate)
+
+    audio is 1-D when mono is set, otherwise (n_samples, channels). offset
+    and duration (seconds) select a range, which is all that gets decoded.
+    sr resamples to that rate; by default the file's own rate is kept.
+    """
+    with span('decode', file=os.path.basename(path), bytes=os.path.getsize(path)) as record:
+        audio, sr = _decode(path, sr, mono, offset, duration)
+        record.update(samples=len(audio), sr=sr)
+    return audio, sr
+
+def _decode(path, sr, mono, offset, duration):
+    try:
+        handle = sf.SoundFile(path)
+    except RuntimeError:
+        handle = None
+
+    if handle is not None:
+        with handle:
+            native_sr = handle.samplerate
+            start = int(offset * native_sr)
+            if start:
+                handle.seek(min(start, handle.frames))
+            frames = -1 if duration is None else int(duration * native_sr)
+            audio = handle.read(frames, dtype='float32', always_2d=True)
+    else:
+        with FFmpegReader(path, offset, duration) as reader:
+            native_sr = reader.samplerate
+            audio = reader.read()
+
+    if mono:
+        audio = audio.mean(axis=1) if audio.shape[1] > 1 else audio[:, 0]
+    if sr and sr != native_sr and len(audio):
+        audio = soxr.resample(audio, native_sr, sr, quality='HQ')
+    return np.ascontiguousarray(audio, dtype=np.float32), sr or native_sr
+
+class FFmpegWriter:
+    """Encode float32 blocks to a compressed file through an ffmpeg pipe, soundfile style"""
+
+    def __init__(self, path, samplerate, channels=1, bitrate=None):
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in FFMPEG_CODECS:
+            raise ValueError(f"No encoder for {extension or 'extensionless'} output: {path}")
+        bitrate = bitrate or os.environ.get('GENRE_AI_OUTPUT_BITRATE', DEFAULT_BITRATE)
+        command = [FFMPEG, '-nostdin', '-loglevel', 'error', '-y',
+                   '-f', 'f32le', '-ar', str(samplerate), '-ac', str(channels), '-i', '-',
+                   *FFMPEG_CODECS[extension], '-b:a', bitrate, path]
+        self.path = path
+        self.samplerate = samplerate
+        self.channels = channels
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, data):
+        data = np.ascontiguousarray(data, dtype=np.float32)
+        try:
+            self._process.stdin.write(data.tobytes())
+        except BrokenPipeError:
+            self._check_exit()
+            raise
+
+    def close(self):
+        """Flush the encoder and wait for the file to be finished"""
+        if not self._process.stdin.closed:
+            try:
+                self._process.stdin.close()
+            except BrokenPipeError:
+                pass
+        self._check_exit()
+
+    def _check_exit(self):
+        if self._process.wait() != 0:
+            message = self._process.stderr.read().decode(errors='replace').strip()
+            raise RuntimeError(f"ffmpeg could not encode {self.path}: {message}")
+        self._process.stderr.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+            return
+        # Processing failed: stop the encoder and drop the partial file
+        self._process.kill()
+        self._process.wait()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def soundfile_format(path):
+    """libsndfile container for path's extension, or None if soundfile can't write it"""
+    extension = os.path.splitext(path)[1].lower()
+    container = SOUNDFILE_ALIASES.get(extension, extension.lstrip('.').upper())
+    # Headerless formats such as RAW have no default subtype and can't be written blind
+    if container in sf.available_formats() and sf.default_subtype(container):
+        return container
+    return None
+
+def open_encoder(path, sr, channels=1, bitrate=None):
+    """Open path for block writes in the container its extension names, WAV if it names none"""
+    if os.path.splitext(path)[1].lower() in FFMPEG_CODECS:
+        return FFmpegWriter(path, sr, channels, bitrate)
+    container = soundfile_format(path)
+    if container is None:
+        print(f"[PYTHON] No encoder for {os.path.basename(path)}, writing WAV data")
+        container = 'WAV'
+    return sf.SoundFile(path, 'w', samplerate=sr, channels=channels, format=container)
+
+def encode(path, audio, sr, bitrate=None):
+    """Write audio (1-D, or (n_samples, channels)) to path in the container its extension names"""
+    audio = np.asarray(audio)
+    channels = 1 if audio.ndim == 1 else audio.shape[1]
+    with span('encode', file=os.path.basename(path), samples=len(audio)) as record:
+        with open_encoder(path, sr, channels, bitrate) as writer:
+            for start in range(0, len(audio), ENCODE_BLOCK):
+                writer.write(np.asarray(audio[start:start + ENCODE_BLOCK], dtype=np.float32))
+        record['bytes'] = os.path.getsize(path)
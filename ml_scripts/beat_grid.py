@@ -0,0 +1,88 @@
+"""
+Per-track tempo, beat and onset grid, plus sidechain ducking built on it.
+
+compute_beat_grid runs beat tracking and onset detection once and returns
+positions in samples. A grid can be saved as JSON next to the upload
+(<upload>.beats.json); it records a hash of the audio it was computed from,
+so later renders of the same file load it instead of analysing again.
+"""
+import json
+import os
+import tempfile
+import numpy as np
+import librosa
+
+FORMAT_VERSION = 1
+
+class BeatGrid:
+    """Tempo and the beat and onset positions of one track, in samples"""
+
+    def __init__(self, sr, tempo, beats, onsets):
+        self.sr = sr
+        self.tempo = float(tempo)
+        self.beats = np.asarray(beats, dtype=np.int64)
+        self.onsets = np.asarray(onsets, dtype=np.int64)
+
+    def to_dict(self):
+        return {'sr': self.sr, 'tempo': self.tempo, 'beats': self.beats.tolist(), 'onsets': self.onsets.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['sr'], data['tempo'], data['beats'], data['onsets'])
+
+def compute_beat_grid(audio, sr, onset_envelope=None, hop_length=512):
+    """Beat-track and onset-detect audio in one go, reusing onset_envelope if given"""
+    if onset_envelope is None:
+        onset_envelope = librosa.onset.onset_strength(y=audio, sr=sr, hop_length=hop_length)
+    tempo, beat_frames = librosa.beat.beat_track(onset_envelope=onset_envelope, sr=sr, hop_length=hop_length)
+    onset_frames = librosa.onset.onset_detect(onset_envelope=onset_envelope, sr=sr, hop_length=hop_length)
+    return BeatGrid(sr, np.atleast_1d(tempo)[0],
+                    librosa.frames_to_samples(beat_frames, hop_length=hop_length),
+                    librosa.frames_to_samples(onset_frames, hop_length=hop_length))
+
+def beat_grid_path(input_file):
+    """Where the grid of an uploaded file is kept"""
+    return f"{input_file}.beats.json"
+
+def load_beat_grid(path, key):
+    """Return the grid saved at path if it was computed from the audio with this key, else None"""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get('version') != FORMAT_VERSION or data.get('key') != key:
+        return None
+    return BeatGrid.from_dict(data)
+
+def save_beat_grid(grid, path, key):
+    """Atomically write grid to path, tagged with the key of its audio"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix='.beats-', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'version': FORMAT_VERSION, 'key': key, **grid.to_dict()}, f)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+def sidechain_envelope(length, triggers, sr, release_ms=100.0, floor=0.3, power=2.0):
+    """Gain envelope that ducks at every trigger sample and recovers over release_ms
+
+    At a trigger the gain drops to floor ** power and rises back to 1 along
+    (floor + (1 - floor) * t / release) ** power. A new trigger restarts the
+    curve. The whole envelope is one pass of array operations.
+    """
+    release = max(int(sr * release_ms / 1000), 1)
+    triggers = np.asarray(triggers, dtype=np.int64)
+    triggers = triggers[(triggers >= 0) & (triggers < length)]
+
+    # Most recent trigger at or before every sample
+    last = np.full(length, -release - 1, dtype=np.int64)
+    last[triggers] = triggers
+    np.maximum.accumulate(last, out=last)
+
+    since = np.arange(length, dtype=np.int64) - last
+    ramp = np.minimum(since, release) / release
+    return ((floor + (1 - floor) * ramp) ** power).astype(np.float32)
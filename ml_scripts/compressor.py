@@ -0,0 +1,94 @@
+"""
+Feed-forward dynamic range compressor.
+
+The gain computer (threshold, ratio, soft knee, makeup) works on whole arrays
+in dB. The only sample-recursive part is the peak envelope follower with
+separate attack and release times; it runs as a compiled numba kernel when
+numba is available (librosa already depends on it) and otherwise at control
+rate, one step per CONTROL_HOP samples.
+"""
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Fallback envelope resolution in samples when numba is unavailable
+CONTROL_HOP = 32
+
+def _follow_envelope_loop(levels, attack_coef, release_coef, initial):
+    envelope = np.empty_like(levels)
+    current = initial
+    for i in range(len(levels)):
+        level = levels[i]
+        coef = attack_coef if level > current else release_coef
+        current = coef * current + (1.0 - coef) * level
+        envelope[i] = current
+    return envelope
+
+if njit is not None:
+    _follow_envelope_kernel = njit(cache=True, nogil=True)(_follow_envelope_loop)
+else:
+    _follow_envelope_kernel = None
+
+def _smoothing_coef(time_ms, sr):
+    if time_ms <= 0:
+        return 0.0
+    return float(np.exp(-1.0 / (time_ms * 0.001 * sr)))
+
+def follow_envelope(levels, sr, attack_ms, release_ms, initial=0.0):
+    """Peak envelope of levels with one-pole attack/release smoothing"""
+    levels = np.ascontiguousarray(levels, dtype=np.float64)
+    attack_coef = _smoothing_coef(attack_ms, sr)
+    release_coef = _smoothing_coef(release_ms, sr)
+
+    # Instantaneous detector needs no recursion at all
+    if attack_coef == 0.0 and release_coef == 0.0:
+        return levels
+
+    if _follow_envelope_kernel is not None:
+        return _follow_envelope_kernel(levels, attack_coef, release_coef, float(initial))
+
+    # Control-rate fallback: follow the per-hop peaks and hold each value for the hop
+    n_hops = -(-len(levels) // CONTROL_HOP)
+    padded = np.zeros(n_hops * CONTROL_HOP)
+    padded[:len(levels)] = levels
+    peaks = padded.reshape(n_hops, CONTROL_HOP).max(axis=1)
+    envelope = _follow_envelope_loop(peaks, attack_coef ** CONTROL_HOP, release_coef ** CONTROL_HOP, float(initial))
+    return np.repeat(envelope, CONTROL_HOP)[:len(levels)]
+
+def gain_reduction_db(level_db, threshold_db, ratio, knee_db=0.0):
+    """Static compression curve: dB of gain to apply at each input level"""
+    over = level_db - threshold_db
+    compressed = threshold_db + over / ratio
+    if knee_db > 0:
+        in_knee = np.abs(over) <= knee_db / 2
+        knee_curve = level_db + (1.0 / ratio - 1.0) * (over + knee_db / 2) ** 2 / (2 * knee_db)
+        output_db = np.where(over > knee_db / 2, compressed, np.where(in_knee, knee_curve, level_db))
+    else:
+        output_db = np.where(over > 0, compressed, level_db)
+    return output_db - level_db
+
+def compress(audio, sr, threshold=0.3, ratio=4.0, knee_db=0.0, attack_ms=5.0, release_ms=50.0,
+             makeup_db=0.0, lookahead_ms=0.0, state=None):
+    """Compress audio and return a new array; the input is never modified
+
+    threshold is a linear amplitude. With lookahead the gain reacts that many
+    milliseconds before a transient arrives. Pass the same state dict for
+    consecutive blocks of one signal to carry the envelope across them.
+    """
+    audio = np.asarray(audio)
+    initial = state.get('envelope', 0.0) if state is not None else 0.0
+    envelope = follow_envelope(np.abs(audio), sr, attack_ms, release_ms, initial)
+    if state is not None and len(envelope):
+        state['envelope'] = float(envelope[-1])
+
+    level_db = 20 * np.log10(np.maximum(envelope, 1e-10))
+    gain_db = gain_reduction_db(level_db, 20 * np.log10(threshold), ratio, knee_db) + makeup_db
+
+    lookahead = int(lookahead_ms * 0.001 * sr)
+    if 0 < lookahead < len(gain_db):
+        gain_db = np.concatenate([gain_db[lookahead:], np.full(lookahead, gain_db[-1])])
+
+    return (audio * 10 ** (gain_db / 20)).astype(audio.dtype, copy=False)
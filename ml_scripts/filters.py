@@ -0,0 +1,101 @@
+"""
+Second-order-section (SOS) filters.
+
+design_sos returns a memoized SOS design for a lowpass, highpass, bandpass,
+lowshelf, highshelf or peak filter, so every effect that asks for the same
+filter shares one design. Pass filters are Butterworth. Shelves and peaks are
+cascades of RBJ-cookbook biquads that together reach gain_db.
+
+zero_phase filters a whole signal forwards and backwards (offline effects).
+SOSFilter runs a single causal pass and carries its state from one block to
+the next, for effects applied to streamed chunks.
+"""
+from functools import lru_cache
+import numpy as np
+from scipy import signal
+
+KINDS = ('lowpass', 'highpass', 'bandpass', 'lowshelf', 'highshelf', 'peak')
+RBJ_KINDS = ('lowshelf', 'highshelf', 'peak')
+SHELF_GAIN_DB = 6.0
+# Butterworth Q; for shelves it is the cookbook's slope of 1
+DEFAULT_Q = 1 / np.sqrt(2)
+
+@lru_cache(maxsize=256)
+def design_sos(kind, cutoff, sr, order=4, gain_db=SHELF_GAIN_DB, q=DEFAULT_Q):
+    """SOS coefficients for one filter; cutoff is (low, high) for bandpass
+
+    gain_db and q only apply to shelves and peaks. The result is shared, so do not modify it.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown filter type: {kind}")
+    nyquist = sr / 2
+    if kind == 'bandpass':
+        low, high = cutoff
+        sos = signal.butter(order, [low / nyquist, min(high / nyquist, 0.999)], btype='bandpass', output='sos')
+    elif kind in ('lowpass', 'highpass'):
+        sos = signal.butter(order, min(cutoff / nyquist, 0.999), btype=kind, output='sos')
+    else:
+        n_sections = max(order // 2, 1)
+        section = _rbj_biquad(kind, cutoff, sr, gain_db / n_sections, q)
+        sos = np.tile(section, (n_sections, 1))
+    return sos
+
+def _rbj_biquad(kind, cutoff, sr, gain_db, q):
+    """RBJ audio-EQ-cookbook shelf or peaking filter, as one SOS row"""
+    amplitude = 10 ** (gain_db / 40)
+    w0 = 2 * np.pi * min(cutoff, 0.499 * sr) / sr
+    cos_w0 = np.cos(w0)
+    alpha = np.sin(w0) / (2 * q)
+    if kind == 'peak':
+        b = [1 + alpha * amplitude, -2 * cos_w0, 1 - alpha * amplitude]
+        a = [1 + alpha / amplitude, -2 * cos_w0, 1 - alpha / amplitude]
+        return np.array(b + a) / a[0]
+
+    root = 2 * np.sqrt(amplitude) * alpha
+    sign = 1 if kind == 'lowshelf' else -1
+
+    b0 = amplitude * ((amplitude + 1) - sign * (amplitude - 1) * cos_w0 + root)
+    b1 = sign * 2 * amplitude * ((amplitude - 1) - sign * (amplitude + 1) * cos_w0)
+    b2 = amplitude * ((amplitude + 1) - sign * (amplitude - 1) * cos_w0 - root)
+    a0 = (amplitude + 1) + sign * (amplitude - 1) * cos_w0 + root
+    a1 = -sign * 2 * ((amplitude - 1) + sign * (amplitude + 1) * cos_w0)
+    a2 = (amplitude + 1) + sign * (amplitude - 1) * cos_w0 - root
+    return np.array([b0, b1, b2, a0, a1, a2]) / a0
+
+def zero_phase(audio, kind, cutoff, sr, order=4, gain_db=SHELF_GAIN_DB):
+    """Filter audio forwards and backwards, with no phase shift
+
+    The two passes square the magnitude response, so shelves and peaks are
+    designed with half the gain and still boost or cut by gain_db overall.
+    """
+    if kind in RBJ_KINDS:
+        gain_db = gain_db / 2
+    sos = design_sos(kind, _hashable(cutoff), sr, order, gain_db)
+    audio = np.asarray(audio)
+    return signal.sosfiltfilt(sos, audio).astype(_float_dtype(audio), copy=False)
+
+class SOSFilter:
+    """Causal filter that keeps its state between process() calls"""
+
+    def __init__(self, kind, cutoff, sr, order=4, gain_db=SHELF_GAIN_DB):
+        self.sos = design_sos(kind, _hashable(cutoff), sr, order, gain_db)
+        self.reset()
+
+    def reset(self):
+        self.zi = np.zeros((self.sos.shape[0], 2))
+
+    def process(self, block):
+        """Filter the next block; consecutive blocks give the same result as one long call"""
+        block = np.asarray(block)
+        filtered, self.zi = signal.sosfilt(self.sos, block, zi=self.zi)
+        return filtered.astype(_float_dtype(block), copy=False)
+
+def causal(audio, kind, cutoff, sr, order=4, gain_db=SHELF_GAIN_DB):
+    """Single causal pass over a whole signal"""
+    return SOSFilter(kind, cutoff, sr, order, gain_db).process(audio)
+
+def _hashable(cutoff):
+    return tuple(cutoff) if isinstance(cutoff, (list, tuple, np.ndarray)) else cutoff
+
+def _float_dtype(audio):
+    return audio.dtype if np.issubdtype(audio.dtype, np.floating) else np.float64
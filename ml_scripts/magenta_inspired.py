@@ -1,80 +1,125 @@
+import argparse
 import os
 import sys
 import numpy as np
 import librosa
-import soundfile as sf
+from audio_codec import decode, encode
+from compressor import compress
+from ensemble import ensemble
+from eq import Band, apply_eq
+from filters import zero_phase
+from reverb import CONCERT_HALL_SECONDS, room_reverb
+from swing import swing
+from beat_grid import beat_grid_path, sidechain_envelope
+from track_analysis import TrackAnalysis, get_analysis
+from preview import fade_edges, preview_window
+from segments import render_segment
+from streaming import render_stream
+from tracing import span
 import traceback
 
-def transform_with_genre_effects(input_file, output_file, target_genre):
+def transform_with_genre_effects(input_file, output_file, target_genre, stream=False, preview=False, segment=None):
     """
     Transform audio using genre-specific audio effects
+
+    With preview=True only a short representative excerpt is rendered, and
+    with segment=N only that segment of the track, as raw PCM (see segments).
     """
     print(f"[PYTHON] Starting genre transformation to {target_genre}...")
     
+    if segment is not None:
+        render_segment(input_file, output_file, segment,
+                       lambda block, sr: apply_genre_style(block, sr, target_genre, normalize=False))
+        return True
+    
     try:
+        if stream:
+            # Blocks get their own analysis; the soft limiter replaces whole-track normalization
+            render_stream(input_file, output_file,
+                          lambda block, sr: apply_genre_style(block, sr, target_genre, normalize=False))
+            print(f"[PYTHON] Successfully transformed to {target_genre} style")
+            return True
+        
         # Load audio file
         print(f"[PYTHON] Loading audio file: {input_file}")
-        audio, sr = librosa.load(input_file, sr=None)
+        offset, duration = preview_window(input_file) if preview else (0.0, None)
+        audio, sr = decode(input_file, mono=True, offset=offset, duration=duration)
         print(f"[PYTHON] Audio loaded successfully. Duration: {len(audio)/sr:.2f}s, Sample rate: {sr}Hz")
         
+        # One analysis (STFT, HPSS, beats) shared by every stage and by later renders of this audio;
+        # the beat grid is also kept next to the upload (an excerpt's grid would not fit the full render)
+        with span('analysis', samples=len(audio)):
+            analysis = get_analysis(audio, sr, beat_grid_path=None if preview else beat_grid_path(input_file))
+        
         # Process based on genre
-        if target_genre.lower() == "jazz":
-            print("[PYTHON] Applying jazz style transformation...")
-            processed_audio = apply_jazz_style(audio, sr)
-        elif target_genre.lower() == "rock":
-            print("[PYTHON] Applying rock style transformation...")
-            processed_audio = apply_rock_style(audio, sr)
-        elif target_genre.lower() == "electronic":
-            print("[PYTHON] Applying electronic style transformation...")
-            processed_audio = apply_electronic_style(audio, sr)
-        elif target_genre.lower() == "classical":
-            print("[PYTHON] Applying classical style transformation...")
-            processed_audio = apply_classical_style(audio, sr)
-        else:
-            print(f"[PYTHON] No specific transformation for genre '{target_genre}', applying default style")
-            processed_audio = apply_default_style(audio, sr)
+        with span('effects', genre=target_genre, samples=len(audio)):
+            processed_audio = apply_genre_style(audio, sr, target_genre, analysis)
+        if preview:
+            processed_audio = fade_edges(processed_audio, sr)
         
         # Save the processed audio
         print(f"[PYTHON] Saving processed audio to: {output_file}")
-        sf.write(output_file, processed_audio, sr)
+        encode(output_file, processed_audio, sr)
         print(f"[PYTHON] Successfully transformed to {target_genre} style")
         return True
         
     except Exception as e:
         print(f"[PYTHON] Error in genre transformation: {str(e)}")
         print(f"[PYTHON] Traceback: {traceback.format_exc()}")
-        # Fall back to original audio
-        try:
-            print(f"[PYTHON] Falling back to simple processing")
-            processed_audio = apply_simple_effects(audio, sr, target_genre)
-            sf.write(output_file, processed_audio, sr)
-            return True
-        except:
-            print(f"[PYTHON] Could not apply simple effects, attempting direct file copy")
-            import shutil
-            shutil.copyfile(input_file, output_file)
-            return False
+        # Fall back to original audio; the fallback span keeps the worker from caching it
+        with span('fallback', genre=target_genre):
+            try:
+                print(f"[PYTHON] Falling back to simple processing")
+                processed_audio = apply_simple_effects(audio, sr, target_genre)
+                encode(output_file, processed_audio, sr)
+                return True
+            except:
+                print(f"[PYTHON] Could not apply simple effects, attempting direct file copy")
+                import shutil
+                shutil.copyfile(input_file, output_file)
+                return False
+
+def apply_genre_style(audio, sr, target_genre, analysis=None, normalize=True):
+    """Apply the target genre's style to audio
+
+    With normalize=False the result keeps its natural level instead of
+    being scaled to a fixed peak, as the streaming renderer needs.
+    """
+    if target_genre.lower() == "jazz":
+        print("[PYTHON] Applying jazz style transformation...")
+        return apply_jazz_style(audio, sr, analysis, normalize)
+    elif target_genre.lower() == "rock":
+        print("[PYTHON] Applying rock style transformation...")
+        return apply_rock_style(audio, sr, analysis, normalize)
+    elif target_genre.lower() == "electronic":
+        print("[PYTHON] Applying electronic style transformation...")
+        return apply_electronic_style(audio, sr, analysis, normalize)
+    elif target_genre.lower() == "classical":
+        print("[PYTHON] Applying classical style transformation...")
+        return apply_classical_style(audio, sr, analysis, normalize)
+    else:
+        print(f"[PYTHON] No specific transformation for genre '{target_genre}', applying default style")
+        return apply_default_style(audio, sr, normalize)
 
-def apply_jazz_style(audio, sr):
+def apply_jazz_style(audio, sr, analysis=None, normalize=True):
     """Apply jazz-like characteristics to audio"""
     print("[PYTHON] Extracting harmonic and percussive components...")
     # Step 1: Split into harmonic and percussive components
-    y_harmonic, y_percussive = librosa.effects.hpss(audio)
+    if analysis is None:
+        analysis = TrackAnalysis(audio, sr)
+    y_harmonic, y_percussive = analysis.harmonic, analysis.percussive
     
     # Step 2: Enhance harmony with jazz-like characteristics
     print("[PYTHON] Applying jazz harmonics...")
-    y_harmonic_shifted1 = librosa.effects.pitch_shift(y_harmonic, sr=sr, n_steps=0.3)
-    y_harmonic_shifted2 = librosa.effects.pitch_shift(y_harmonic, sr=sr, n_steps=-0.1)
-    y_harmonic = y_harmonic * 0.6 + y_harmonic_shifted1 * 0.3 + y_harmonic_shifted2 * 0.1
+    y_harmonic = ensemble(y_harmonic, sr, [(0, 0, 0.6), (0.3, 0, 0.3), (-0.1, 0, 0.1)])
     
     # Step 3: Apply swing feel to percussive elements
     print("[PYTHON] Applying swing rhythm...")
-    y_perc_output = apply_swing(y_percussive, sr)
+    y_perc_output = apply_swing(y_percussive, sr, analysis)
     
     # Step 4: Apply "warm" EQ (boost lows and highs)
     print("[PYTHON] Applying jazz EQ...")
-    b, a = librosa.filters.butter(4, 300/(sr/2), btype='lowshelf', gain_db=3)
-    y_harmonic = librosa.filtfilt(b, a, y_harmonic)
+    y_harmonic = zero_phase(y_harmonic, 'lowshelf', 300, sr, order=4, gain_db=3)
     
     # Step 5: Mix components with jazz-appropriate balance
     print("[PYTHON] Mixing components...")
@@ -82,18 +127,21 @@ def apply_jazz_style(audio, sr):
     
     # Step 6: Subtle compression
     print("[PYTHON] Applying compression...")
-    result = apply_compression(result, threshold=0.3, ratio=4.0)
+    result = apply_compression(result, sr, threshold=0.3, ratio=4.0)
     
     # Normalize
-    result = result / np.max(np.abs(result)) * 0.9
+    if normalize:
+        result = result / np.max(np.abs(result)) * 0.9
     
     return result
 
-def apply_rock_style(audio, sr):
+def apply_rock_style(audio, sr, analysis=None, normalize=True):
     """Apply rock characteristics to audio"""
     print("[PYTHON] Extracting harmonic and percussive components...")
     # Step 1: Split into harmonic and percussive components
-    y_harmonic, y_percussive = librosa.effects.hpss(audio)
+    if analysis is None:
+        analysis = TrackAnalysis(audio, sr)
+    y_harmonic, y_percussive = analysis.harmonic, analysis.percussive
     
     # Step 2: Apply distortion to harmonic content (guitar-like)
     print("[PYTHON] Applying distortion...")
@@ -106,13 +154,11 @@ def apply_rock_style(audio, sr):
     
     # Apply "rock" EQ (mid boost)
     print("[PYTHON] Applying rock EQ...")
-    # Mid boost around 1kHz
-    b, a = librosa.filters.butter(4, [500/(sr/2), 2000/(sr/2)], btype='bandpass')
-    y_harmonic = librosa.filtfilt(b, a, y_harmonic) * 1.5 + y_harmonic * 0.5
-    
-    # Add bass boost for rock feel
-    b_bass, a_bass = librosa.filters.butter(4, 150/(sr/2), btype='lowshelf', gain_db=6)
-    y_harmonic = librosa.filtfilt(b_bass, a_bass, y_harmonic)
+    # Mid boost around 1kHz, plus bass boost for rock feel, in one pass
+    y_harmonic = apply_eq(y_harmonic, sr, [
+        Band('bandpass', (500, 2000), wet=1.5, dry=0.5),
+        Band('lowshelf', 150, gain_db=6),
+    ])
     
     # Step 5: Mix components with rock-appropriate balance
     print("[PYTHON] Mixing components...")
@@ -120,52 +166,49 @@ def apply_rock_style(audio, sr):
     
     # Step 6: Heavy compression for rock feel
     print("[PYTHON] Applying compression...")
-    result = apply_compression(result, threshold=0.2, ratio=6.0)
+    result = apply_compression(result, sr, threshold=0.2, ratio=6.0)
     
     # Normalize but keep it loud
-    result = result / np.max(np.abs(result)) * 0.95
+    if normalize:
+        result = result / np.max(np.abs(result)) * 0.95
     
     return result
 
-def apply_electronic_style(audio, sr):
+def apply_electronic_style(audio, sr, analysis=None, normalize=True):
     """Apply electronic music characteristics to audio"""
     print("[PYTHON] Extracting harmonic and percussive components...")
     # Step 1: Split into harmonic and percussive components
-    y_harmonic, y_percussive = librosa.effects.hpss(audio)
+    if analysis is None:
+        analysis = TrackAnalysis(audio, sr)
+    y_harmonic, y_percussive = analysis.harmonic, analysis.percussive
     
     # Step 2: Add "synthesizer" effect to harmonic content
     print("[PYTHON] Creating synthesizer effect...")
     # Create a chorus-like effect
     n_voices = 3
-    y_synth = np.zeros_like(y_harmonic)
-    for i in range(n_voices):
-        detune = 0.2 * (i - (n_voices-1)/2)
-        voice = librosa.effects.pitch_shift(y_harmonic, sr=sr, n_steps=detune)
-        # Add slight phase offset
-        offset = int(sr * 0.01 * i)
-        if offset < len(voice):
-            y_synth[offset:] += voice[:-offset] * (0.8 ** i)
+    # Detuned voices with a slight time offset each, summed by one delay-line ensemble
+    voices = [(0.2 * (i - (n_voices-1)/2), 0.01 * i, 0.8 ** i) for i in range(n_voices)]
+    y_synth = ensemble(y_harmonic, sr, voices)
     
     y_synth = y_synth / n_voices
     
     # Step 3: Make percussive elements more "electronic"
     print("[PYTHON] Enhancing beats...")
     # Transient shaper to enhance attack
-    perc_env = np.abs(librosa.stft(y_percussive))
+    D_percussive = analysis.percussive_stft
+    perc_env = np.abs(D_percussive)
     perc_env = librosa.amplitude_to_db(perc_env)
     perc_env = np.maximum(perc_env, perc_env.max() - 80)
     perc_env = librosa.db_to_amplitude(perc_env)
-    y_perc_shaped = librosa.istft(perc_env * np.exp(1j * np.angle(librosa.stft(y_percussive))))
+    y_perc_shaped = librosa.istft(perc_env * np.exp(1j * np.angle(D_percussive)), length=len(audio))
     
     # Step 4: Apply "electronic" EQ (sub bass + high end)
     print("[PYTHON] Applying electronic EQ...")
     # Sub bass boost
-    b_sub, a_sub = librosa.filters.butter(4, 80/(sr/2), btype='lowshelf', gain_db=9)
-    y_perc_shaped = librosa.filtfilt(b_sub, a_sub, y_perc_shaped)
+    y_perc_shaped = zero_phase(y_perc_shaped, 'lowshelf', 80, sr, order=4, gain_db=9)
     
     # High end sparkle
-    b_high, a_high = librosa.filters.butter(4, 10000/(sr/2), btype='highshelf', gain_db=6)
-    y_synth = librosa.filtfilt(b_high, a_high, y_synth)
+    y_synth = zero_phase(y_synth, 'highshelf', 10000, sr, order=4, gain_db=6)
     
     # Step 5: Mix components with electronic-appropriate balance
     print("[PYTHON] Mixing components...")
@@ -173,57 +216,45 @@ def apply_electronic_style(audio, sr):
     
     # Step 6: Add sidechain compression effect (simulated)
     print("[PYTHON] Adding sidechain effect...")
-    beat_frames = librosa.onset.onset_detect(y=y_perc_shaped, sr=sr)
-    if len(beat_frames) > 0:
-        envelope = np.ones_like(result)
-        for beat in beat_frames:
-            beat_time = int(beat)
-            # Apply ducking at each beat
-            duck_length = int(sr * 0.1)  # 100ms duck
-            duck_curve = np.linspace(0.3, 1.0, duck_length) ** 2  # Exponential release
-            if beat_time + duck_length < len(envelope):
-                envelope[beat_time:beat_time+duck_length] = duck_curve
-        result = result * envelope
+    # Duck at every onset of the track's grid: 100ms release along (0.3 -> 1.0) ** 2
+    onsets = analysis.beat_grid.onsets
+    if len(onsets) > 0:
+        result = result * sidechain_envelope(len(result), onsets, sr, release_ms=100.0, floor=0.3)
     
     # Normalize
-    result = result / np.max(np.abs(result)) * 0.95
+    if normalize:
+        result = result / np.max(np.abs(result)) * 0.95
     
     return result
 
-def apply_classical_style(audio, sr):
+def apply_classical_style(audio, sr, analysis=None, normalize=True):
     """Apply classical music characteristics to audio"""
     print("[PYTHON] Extracting harmonic and percussive components...")
     # Step 1: Split into harmonic and percussive components
-    y_harmonic, y_percussive = librosa.effects.hpss(audio)
+    if analysis is None:
+        analysis = TrackAnalysis(audio, sr)
+    y_harmonic, y_percussive = analysis.harmonic, analysis.percussive
     
     # Step 2: Enhance the harmonic content (string-like)
     print("[PYTHON] Creating orchestral effect...")
     # Add subtle chorus for string ensemble effect
-    y_harmonic_shifted1 = librosa.effects.pitch_shift(y_harmonic, sr=sr, n_steps=0.05)
-    y_harmonic_shifted2 = librosa.effects.pitch_shift(y_harmonic, sr=sr, n_steps=-0.05)
-    y_harmonic = (y_harmonic + y_harmonic_shifted1 + y_harmonic_shifted2) / 3
+    y_harmonic = ensemble(y_harmonic, sr, [(0, 0, 1), (0.05, 0, 1), (-0.05, 0, 1)]) / 3
     
     # Step 3: Reduce percussive elements (classical usually has less strong percussion)
     y_percussive = y_percussive * 0.5
     
     # Step 4: Apply "classical" EQ (warm mids, reduced highs)
     print("[PYTHON] Applying classical EQ...")
-    # Warm mids
-    b_mid, a_mid = librosa.filters.butter(4, [300/(sr/2), 2500/(sr/2)], btype='bandpass')
-    y_harmonic = librosa.filtfilt(b_mid, a_mid, y_harmonic) * 0.3 + y_harmonic * 0.7
-    
-    # Gentle high cut (reduce harshness)
-    b_high, a_high = librosa.filters.butter(2, 7500/(sr/2), btype='lowpass')
-    y_harmonic = librosa.filtfilt(b_high, a_high, y_harmonic)
+    # Warm mids, then a gentle high cut (reduce harshness), in one pass
+    y_harmonic = apply_eq(y_harmonic, sr, [
+        Band('bandpass', (300, 2500), wet=0.3, dry=0.7),
+        Band('lowpass', 7500, order=2),
+    ])
     
     # Step 5: Add reverb simulation for concert hall effect
     print("[PYTHON] Adding concert hall reverb...")
-    ir_length = int(sr * 2)  # 2 second impulse response
-    ir = np.exp(-np.linspace(0, 10, ir_length))
-    ir = ir / np.sum(ir)  # Normalize
-    
-    # Convolve with simplified impulse response (computationally efficient approximation)
-    y_harmonic_reverb = np.convolve(y_harmonic, ir, mode='same')
+    # Centred convolution with a normalized, exponentially decaying 2 s impulse response
+    y_harmonic_reverb = room_reverb(y_harmonic, CONCERT_HALL_SECONDS, sr, decay=10, normalize=True, mode='same')
     
     # Step 6: Mix dry and wet signals
     print("[PYTHON] Mixing components...")
@@ -231,25 +262,26 @@ def apply_classical_style(audio, sr):
     
     # Step 7: Dynamic range preservation (less compression than modern genres)
     # Just normalize without heavy compression
-    result = result / np.max(np.abs(result)) * 0.9
+    if normalize:
+        result = result / np.max(np.abs(result)) * 0.9
     
     return result
 
-def apply_default_style(audio, sr):
+def apply_default_style(audio, sr, normalize=True):
     """Basic processing as fallback"""
     print("[PYTHON] Applying default audio enhancement...")
     # Simple enhancement without specific genre characteristics
     # Clean up with gentle highpass to remove rumble
-    b, a = librosa.filters.butter(4, 30/(sr/2), btype='highpass')
-    audio = librosa.filtfilt(b, a, audio)
+    audio = zero_phase(audio, 'highpass', 30, sr, order=4)
     
     # Gentle compression
     threshold = 0.5
     ratio = 2.0
-    audio = apply_compression(audio, threshold=threshold, ratio=ratio)
+    audio = apply_compression(audio, sr, threshold=threshold, ratio=ratio)
     
     # Normalize
-    audio = audio / np.max(np.abs(audio)) * 0.9
+    if normalize:
+        audio = audio / np.max(np.abs(audio)) * 0.9
     
     return audio
 
@@ -262,13 +294,11 @@ def apply_simple_effects(audio, sr, genre):
         audio = np.tanh(audio * 2.0) * 0.7
         
         # Apply basic EQ
-        b, a = librosa.filters.butter(4, 120/(sr/2), btype='highpass')
-        audio = librosa.filtfilt(b, a, audio)
+        audio = zero_phase(audio, 'highpass', 120, sr, order=4)
         
     elif genre.lower() == "jazz":
         # Apply warmth
-        b, a = librosa.filters.butter(4, 300/(sr/2), btype='lowshelf', gain_db=3)
-        audio = librosa.filtfilt(b, a, audio)
+        audio = zero_phase(audio, 'lowshelf', 300, sr, order=4, gain_db=3)
         
     elif genre.lower() == "electronic":
         # Apply basic beat emphasis
@@ -276,77 +306,50 @@ def apply_simple_effects(audio, sr, genre):
         audio = y_harmonic * 0.6 + y_percussive * 1.4
         
         # Add sub bass
-        b, a = librosa.filters.butter(4, 80/(sr/2), btype='lowshelf', gain_db=6)
-        audio = librosa.filtfilt(b, a, audio)
+        audio = zero_phase(audio, 'lowshelf', 80, sr, order=4, gain_db=6)
         
     elif genre.lower() == "classical":
         # Apply reverb
-        ir_length = int(sr * 1.5)
-        ir = np.exp(-np.linspace(0, 8, ir_length))
-        ir = ir / np.sum(ir)
-        audio = np.convolve(audio, ir, mode='same')
+        audio = room_reverb(audio, 1.5, sr, decay=8, normalize=True, mode='same')
     
     # Apply normalization
     audio = audio / np.max(np.abs(audio)) * 0.9
     
     return audio
 
-def apply_swing(audio, sr):
-    """Apply swing feel to audio"""
-    print("[PYTHON] Detecting beats for swing...")
-    tempo, beat_frames = librosa.beat.beat_track(y=audio, sr=sr)
+def apply_swing(audio, sr, analysis=None):
+    """Apply swing feel to audio, using the track's beat grid when an analysis is given"""
+    if analysis is None:
+        print("[PYTHON] Detecting beats for swing...")
+        analysis = TrackAnalysis(audio, sr)
+    tempo, beat_frames = analysis.tempo, analysis.beat_frames
     
     if len(beat_frames) < 4:
         print("[PYTHON] Not enough beats detected for swing, using original")
         return audio  # Not enough beats to apply swing
     
     print(f"[PYTHON] Detected {len(beat_frames)} beats at {tempo:.1f} BPM")
-    y_output = np.zeros_like(audio)
-    
-    for i in range(len(beat_frames)-1):
-        start_frame = beat_frames[i]
-        end_frame = beat_frames[i+1]
-        
-        # Apply different timing to alternating beats
-        if i % 2 == 0:  # Even beats (on-beats)
-            segment = audio[start_frame:end_frame]
-            y_output[start_frame:start_frame+len(segment)] = segment
-        else:  # Odd beats (off-beats) - apply swing
-            segment = audio[start_frame:end_frame]
-            # Create swing by time-stretching
-            stretch_factor = 1.0 + 0.33  # 33% swing
-            try:
-                stretched = librosa.effects.time_stretch(segment, rate=stretch_factor)
-                
-                # Adjust length and copy
-                target_len = min(len(stretched), end_frame - start_frame)
-                y_output[start_frame:start_frame+target_len] = stretched[:target_len]
-            except:
-                # If stretching fails, use original
-                y_output[start_frame:end_frame] = segment
-    
-    return y_output
+    # One time warp over the whole signal; 0.33 moves off-beat eighths to the triplet position
+    return swing(audio, sr, beat_frames, swing_amount=0.33)
 
-def apply_compression(audio, threshold=0.3, ratio=4.0):
+def apply_compression(audio, sr, threshold=0.3, ratio=4.0):
     """Apply compression to audio signal"""
-    # Simple compressor
-    compressed = np.zeros_like(audio)
-    for i in range(len(audio)):
-        level = np.abs(audio[i])
-        if level > threshold:
-            gain = threshold + (level - threshold) / ratio
-            compressed[i] = audio[i] * (gain / level)
-        else:
-            compressed[i] = audio[i]
-    
-    return compressed
+    # Soft-knee compressor with attack/release smoothing, computed over the whole array
+    return compress(audio, sr, threshold=threshold, ratio=ratio, knee_db=6.0, attack_ms=5.0, release_ms=80.0)
 
 if __name__ == "__main__":
     # Test the script directly
-    import sys
-    if len(sys.argv) != 4:
-        print("Usage: python magenta_inspired.py input_file output_file genre")
-        sys.exit(1)
-    
-    success = transform_with_genre_effects(sys.argv[1], sys.argv[2], sys.argv[3])
+    parser = argparse.ArgumentParser(description="Transform audio to a different genre with genre-specific effects")
+    parser.add_argument("input_file")
+    parser.add_argument("output_file")
+    parser.add_argument("genre")
+    parser.add_argument("--stream", action="store_true",
+                        help="Render in overlapping blocks so memory stays bounded for long inputs")
+    parser.add_argument("--preview", action="store_true",
+                        help="Render only a short representative excerpt (GENRE_AI_PREVIEW_SECONDS long)")
+    parser.add_argument("--segment", type=int,
+                        help="Render only this GENRE_AI_SEGMENT_SECONDS-long segment, as raw 16-bit PCM")
+    args = parser.parse_args()
+    
+    success = transform_with_genre_effects(args.input_file, args.output_file, args.genre, stream=args.stream, preview=args.preview, segment=args.segment)
     sys.exit(0 if success else 1)
\ No newline at end of file
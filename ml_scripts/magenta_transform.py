@@ -1,86 +1,125 @@
-import os
+import argparse
 import sys
 import numpy as np
 import librosa
-import soundfile as sf
-import tempfile
+from audio_codec import decode, encode
+from compressor import compress
+from ensemble import ensemble
+from eq import Band, apply_eq
+from filters import zero_phase
+from reverb import CONCERT_HALL_SECONDS, room_reverb
+from swing import swing
+from beat_grid import beat_grid_path, sidechain_envelope
+from track_analysis import TrackAnalysis, get_analysis
+from preview import fade_edges, preview_window
+from segments import render_segment
+from streaming import render_stream
+from tracing import span
 import traceback
-from magenta.music import audio_io
-from magenta.music import midi_io
-from magenta.music import note_sequence_io
-from magenta.music import sequences_lib
-from magenta.models.music_vae import configs
-from magenta.models.music_vae.trained_model import TrainedModel
 
-def transform_with_magenta(input_file, output_file, target_genre):
+def transform_with_magenta(input_file, output_file, target_genre, stream=False, preview=False, segment=None):
     """
     Transform audio using Magenta's capabilities
+
+    With preview=True only a short representative excerpt is rendered, and
+    with segment=N only that segment of the track, as raw PCM (see segments).
     """
     print(f"[PYTHON] Starting Magenta transformation to {target_genre}...")
     
+    if segment is not None:
+        render_segment(input_file, output_file, segment,
+                       lambda block, sr: apply_genre_style(block, sr, target_genre, normalize=False))
+        return True
+    
     try:
+        if stream:
+            # Blocks get their own analysis; the soft limiter replaces whole-track normalization
+            render_stream(input_file, output_file,
+                          lambda block, sr: apply_genre_style(block, sr, target_genre, normalize=False))
+            print(f"[PYTHON] Successfully transformed to {target_genre} style")
+            return True
+        
         # Load audio file
         print(f"[PYTHON] Loading audio file: {input_file}")
-        audio, sr = librosa.load(input_file, sr=None)
+        offset, duration = preview_window(input_file) if preview else (0.0, None)
+        audio, sr = decode(input_file, mono=True, offset=offset, duration=duration)
         print(f"[PYTHON] Audio loaded successfully. Duration: {len(audio)/sr:.2f}s, Sample rate: {sr}Hz")
         
+        # One analysis (STFT, HPSS, beats) shared by every stage and by later renders of this audio;
+        # the beat grid is also kept next to the upload (an excerpt's grid would not fit the full render)
+        with span('analysis', samples=len(audio)):
+            analysis = get_analysis(audio, sr, beat_grid_path=None if preview else beat_grid_path(input_file))
+        
         # Process based on genre
-        if target_genre.lower() == "jazz":
-            print("[PYTHON] Applying jazz style transformation...")
-            processed_audio = apply_jazz_style(audio, sr)
-        elif target_genre.lower() == "rock":
-            print("[PYTHON] Applying rock style transformation...")
-            processed_audio = apply_rock_style(audio, sr)
-        elif target_genre.lower() == "electronic":
-            print("[PYTHON] Applying electronic style transformation...")
-            processed_audio = apply_electronic_style(audio, sr)
-        elif target_genre.lower() == "classical":
-            print("[PYTHON] Applying classical style transformation...")
-            processed_audio = apply_classical_style(audio, sr)
-        else:
-            print(f"[PYTHON] No specific transformation for genre '{target_genre}', applying default style")
-            processed_audio = apply_default_style(audio, sr)
+        with span('effects', genre=target_genre, samples=len(audio)):
+            processed_audio = apply_genre_style(audio, sr, target_genre, analysis)
+        if preview:
+            processed_audio = fade_edges(processed_audio, sr)
         
         # Save the processed audio
         print(f"[PYTHON] Saving processed audio to: {output_file}")
-        sf.write(output_file, processed_audio, sr)
+        encode(output_file, processed_audio, sr)
         print(f"[PYTHON] Successfully transformed to {target_genre} style")
         return True
         
     except Exception as e:
         print(f"[PYTHON] Error in Magenta transformation: {str(e)}")
         print(f"[PYTHON] Traceback: {traceback.format_exc()}")
-        # Fall back to original audio
-        try:
-            print(f"[PYTHON] Falling back to simple processing")
-            processed_audio = apply_simple_effects(audio, sr, target_genre)
-            sf.write(output_file, processed_audio, sr)
-            return True
-        except:
-            print(f"[PYTHON] Could not apply simple effects, attempting direct file copy")
-            import shutil
-            shutil.copyfile(input_file, output_file)
-            return False
+        # Fall back to original audio; the fallback span keeps the worker from caching it
+        with span('fallback', genre=target_genre):
+            try:
+                print(f"[PYTHON] Falling back to simple processing")
+                processed_audio = apply_simple_effects(audio, sr, target_genre)
+                encode(output_file, processed_audio, sr)
+                return True
+            except:
+                print(f"[PYTHON] Could not apply simple effects, attempting direct file copy")
+                import shutil
+                shutil.copyfile(input_file, output_file)
+                return False
+
+def apply_genre_style(audio, sr, target_genre, analysis=None, normalize=True):
+    """Apply the target genre's style to audio
+
+    With normalize=False the result keeps its natural level instead of
+    being scaled to a fixed peak, as the streaming renderer needs.
+    """
+    if target_genre.lower() == "jazz":
+        print("[PYTHON] Applying jazz style transformation...")
+        return apply_jazz_style(audio, sr, analysis, normalize)
+    elif target_genre.lower() == "rock":
+        print("[PYTHON] Applying rock style transformation...")
+        return apply_rock_style(audio, sr, analysis, normalize)
+    elif target_genre.lower() == "electronic":
+        print("[PYTHON] Applying electronic style transformation...")
+        return apply_electronic_style(audio, sr, analysis, normalize)
+    elif target_genre.lower() == "classical":
+        print("[PYTHON] Applying classical style transformation...")
+        return apply_classical_style(audio, sr, analysis, normalize)
+    else:
+        print(f"[PYTHON] No specific transformation for genre '{target_genre}', applying default style")
+        return apply_default_style(audio, sr, normalize)
 
-def apply_jazz_style(audio, sr):
+def apply_jazz_style(audio, sr, analysis=None, normalize=True):
     """Apply jazz-like characteristics to audio"""
     # Step 1: Apply musical transformations with Magenta
     print("[PYTHON] Analyzing audio rhythm and harmonics...")
     
     # Extract musical features
-    onset_env = librosa.onset.onset_strength(y=audio, sr=sr)
-    tempo, beat_frames = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr)
+    if analysis is None:
+        analysis = TrackAnalysis(audio, sr)
+    tempo, beat_frames = analysis.tempo, analysis.beat_frames
     print(f"[PYTHON] Detected tempo: {tempo:.1f} BPM")
     
     # Step 2: Split into harmonic and percussive components
-    y_harmonic, y_percussive = librosa.effects.hpss(audio)
+    y_harmonic, y_percussive = analysis.harmonic, analysis.percussive
     
     # Step 3: Enhance harmony with jazz-like characteristics
     # Use Magenta's transformer capabilities for harmonic enhancement
     try:
         # Only attempt to load Magenta models if audio is of reasonable length
         if len(audio) < sr * 60:  # Less than 1 minute
-            y_harmonic = enhance_with_magenta(y_harmonic, sr, style="jazz")
+            y_harmonic = enhance_with_magenta(y_harmonic, sr, style="jazz", analysis=analysis)
         else:
             print("[PYTHON] Audio too long for full Magenta processing, using simplified enhancement")
     except Exception as e:
@@ -90,24 +129,26 @@ def apply_jazz_style(audio, sr):
     y_perc_output = apply_swing(y_percussive, sr, beat_frames, swing_amount=0.33)
     
     # Apply "warm" EQ (boost lows and highs)
-    b, a = librosa.filters.butter(4, 300/(sr/2), btype='lowshelf')
-    y_harmonic = librosa.filtfilt(b, a, y_harmonic)
+    y_harmonic = zero_phase(y_harmonic, 'lowshelf', 300, sr, order=4, gain_db=3)
     
     # Mix components with jazz-appropriate balance
     result = y_harmonic * 0.75 + y_perc_output * 0.25
     
     # Subtle compression
-    result = apply_compression(result, threshold=0.3, ratio=4.0)
+    result = apply_compression(result, sr, threshold=0.3, ratio=4.0)
     
     # Normalize
-    result = result / np.max(np.abs(result)) * 0.9
+    if normalize:
+        result = result / np.max(np.abs(result)) * 0.9
     
     return result
 
-def apply_rock_style(audio, sr):
+def apply_rock_style(audio, sr, analysis=None, normalize=True):
     """Apply rock characteristics to audio"""
     # Step 1: Split into harmonic and percussive components
-    y_harmonic, y_percussive = librosa.effects.hpss(audio)
+    if analysis is None:
+        analysis = TrackAnalysis(audio, sr)
+    y_harmonic, y_percussive = analysis.harmonic, analysis.percussive
     
     # Step 2: Apply distortion to harmonic content (guitar-like)
     drive = 3.0  # Distortion amount
@@ -126,34 +167,35 @@ def apply_rock_style(audio, sr):
         print(f"[PYTHON] Magenta model error: {e}, using traditional processing")
     
     # Apply "rock" EQ (mid boost)
-    # Mid boost around 1kHz
-    b, a = librosa.filters.butter(4, [500/(sr/2), 2000/(sr/2)], btype='bandpass')
-    y_harmonic = librosa.filtfilt(b, a, y_harmonic) * 1.5 + y_harmonic * 0.5
-    
-    # Add bass boost for rock feel
-    b_bass, a_bass = librosa.filters.butter(4, 150/(sr/2), btype='lowshelf')
-    y_harmonic = librosa.filtfilt(b_bass, a_bass, y_harmonic)
+    # Mid boost around 1kHz, plus bass boost for rock feel, in one pass
+    y_harmonic = apply_eq(y_harmonic, sr, [
+        Band('bandpass', (500, 2000), wet=1.5, dry=0.5),
+        Band('lowshelf', 150, gain_db=6),
+    ])
     
     # Mix components with rock-appropriate balance
     result = y_harmonic * 0.6 + y_percussive * 0.4
     
     # Heavy compression for rock feel
-    result = apply_compression(result, threshold=0.2, ratio=6.0)
+    result = apply_compression(result, sr, threshold=0.2, ratio=6.0)
     
     # Normalize but keep it loud
-    result = result / np.max(np.abs(result)) * 0.95
+    if normalize:
+        result = result / np.max(np.abs(result)) * 0.95
     
     return result
 
-def apply_electronic_style(audio, sr):
+def apply_electronic_style(audio, sr, analysis=None, normalize=True):
     """Apply electronic music characteristics to audio"""
     # Split into harmonic and percussive components
-    y_harmonic, y_percussive = librosa.effects.hpss(audio)
+    if analysis is None:
+        analysis = TrackAnalysis(audio, sr)
+    y_harmonic, y_percussive = analysis.harmonic, analysis.percussive
     
     # Try to apply Magenta-based transformations
     try:
         if len(audio) < sr * 60:  # Less than 1 minute
-            y_harmonic = enhance_with_magenta(y_harmonic, sr, style="electronic")
+            y_harmonic = enhance_with_magenta(y_harmonic, sr, style="electronic", analysis=analysis)
         else:
             print("[PYTHON] Audio too long for full Magenta processing, using simplified enhancement")
     except Exception as e:
@@ -161,60 +203,52 @@ def apply_electronic_style(audio, sr):
     
     # Add "synthesizer" effect to harmonic content
     n_voices = 3
-    y_synth = np.zeros_like(y_harmonic)
-    for i in range(n_voices):
-        detune = 0.2 * (i - (n_voices-1)/2)
-        voice = librosa.effects.pitch_shift(y_harmonic, sr=sr, n_steps=detune)
-        offset = int(sr * 0.01 * i)
-        if offset < len(voice):
-            y_synth[offset:] += voice[:-offset] * (0.8 ** i)
+    # Detuned voices with a slight time offset each, summed by one delay-line ensemble
+    voices = [(0.2 * (i - (n_voices-1)/2), 0.01 * i, 0.8 ** i) for i in range(n_voices)]
+    y_synth = ensemble(y_harmonic, sr, voices)
     
     y_synth = y_synth / n_voices
     
     # Make percussive elements more "electronic"
-    perc_env = np.abs(librosa.stft(y_percussive))
+    D_percussive = analysis.percussive_stft
+    perc_env = np.abs(D_percussive)
     perc_env = librosa.amplitude_to_db(perc_env)
     perc_env = np.maximum(perc_env, perc_env.max() - 80)
     perc_env = librosa.db_to_amplitude(perc_env)
-    y_perc_shaped = librosa.istft(perc_env * np.exp(1j * np.angle(librosa.stft(y_percussive))))
+    y_perc_shaped = librosa.istft(perc_env * np.exp(1j * np.angle(D_percussive)), length=len(audio))
     
     # Apply "electronic" EQ (sub bass + high end)
-    b_sub, a_sub = librosa.filters.butter(4, 80/(sr/2), btype='lowshelf')
-    y_perc_shaped = librosa.filtfilt(b_sub, a_sub, y_perc_shaped)
+    y_perc_shaped = zero_phase(y_perc_shaped, 'lowshelf', 80, sr, order=4, gain_db=9)
     
     # High end sparkle
-    b_high, a_high = librosa.filters.butter(4, 10000/(sr/2), btype='highshelf')
-    y_synth = librosa.filtfilt(b_high, a_high, y_synth)
+    y_synth = zero_phase(y_synth, 'highshelf', 10000, sr, order=4, gain_db=6)
     
     # Mix components with electronic-appropriate balance
     result = y_synth * 0.65 + y_perc_shaped * 0.35
     
     # Add sidechain compression effect (simulated)
-    beat_frames = librosa.onset.onset_detect(y=y_perc_shaped, sr=sr)
-    if len(beat_frames) > 0:
-        envelope = np.ones_like(result)
-        for beat in beat_frames:
-            beat_time = int(beat)
-            duck_length = int(sr * 0.1)  # 100ms duck
-            duck_curve = np.linspace(0.3, 1.0, duck_length) ** 2  # Exponential release
-            if beat_time + duck_length < len(envelope):
-                envelope[beat_time:beat_time+duck_length] = duck_curve
-        result = result * envelope
+    # Duck at every onset of the track's grid: 100ms release along (0.3 -> 1.0) ** 2
+    onsets = analysis.beat_grid.onsets
+    if len(onsets) > 0:
+        result = result * sidechain_envelope(len(result), onsets, sr, release_ms=100.0, floor=0.3)
     
     # Normalize
-    result = result / np.max(np.abs(result)) * 0.95
+    if normalize:
+        result = result / np.max(np.abs(result)) * 0.95
     
     return result
 
-def apply_classical_style(audio, sr):
+def apply_classical_style(audio, sr, analysis=None, normalize=True):
     """Apply classical music characteristics to audio"""
     # Split into harmonic and percussive components
-    y_harmonic, y_percussive = librosa.effects.hpss(audio)
+    if analysis is None:
+        analysis = TrackAnalysis(audio, sr)
+    y_harmonic, y_percussive = analysis.harmonic, analysis.percussive
     
     # Try to apply Magenta-based transformations
     try:
         if len(audio) < sr * 60:  # Less than 1 minute
-            y_harmonic = enhance_with_magenta(y_harmonic, sr, style="classical")
+            y_harmonic = enhance_with_magenta(y_harmonic, sr, style="classical", analysis=analysis)
         else:
             print("[PYTHON] Audio too long for full Magenta processing, using simplified enhancement")
     except Exception as e:
@@ -222,48 +256,42 @@ def apply_classical_style(audio, sr):
     
     # Enhance the harmonic content (string-like)
     # Add subtle chorus for string ensemble effect
-    y_harmonic_shifted1 = librosa.effects.pitch_shift(y_harmonic, sr=sr, n_steps=0.05)
-    y_harmonic_shifted2 = librosa.effects.pitch_shift(y_harmonic, sr=sr, n_steps=-0.05)
-    y_harmonic = (y_harmonic + y_harmonic_shifted1 + y_harmonic_shifted2) / 3
+    y_harmonic = ensemble(y_harmonic, sr, [(0, 0, 1), (0.05, 0, 1), (-0.05, 0, 1)]) / 3
     
     # Reduce percussive elements (classical usually has less strong percussion)
     y_percussive = y_percussive * 0.5
     
     # Apply "classical" EQ (warm mids, reduced highs)
-    b_mid, a_mid = librosa.filters.butter(4, [300/(sr/2), 2500/(sr/2)], btype='bandpass')
-    y_harmonic = librosa.filtfilt(b_mid, a_mid, y_harmonic) * 0.3 + y_harmonic * 0.7
-    
-    # Gentle high cut (reduce harshness)
-    b_high, a_high = librosa.filters.butter(2, 7500/(sr/2), btype='lowpass')
-    y_harmonic = librosa.filtfilt(b_high, a_high, y_harmonic)
+    # Warm mids, then a gentle high cut (reduce harshness), in one pass
+    y_harmonic = apply_eq(y_harmonic, sr, [
+        Band('bandpass', (300, 2500), wet=0.3, dry=0.7),
+        Band('lowpass', 7500, order=2),
+    ])
     
     # Add reverb simulation for concert hall effect
-    ir_length = int(sr * 2)  # 2 second impulse response
-    ir = np.exp(-np.linspace(0, 10, ir_length))
-    ir = ir / np.sum(ir)  # Normalize
-    
-    # Convolve with simplified impulse response
-    y_harmonic_reverb = np.convolve(y_harmonic, ir, mode='same')
+    # Centred convolution with a normalized, exponentially decaying 2 s impulse response
+    y_harmonic_reverb = room_reverb(y_harmonic, CONCERT_HALL_SECONDS, sr, decay=10, normalize=True, mode='same')
     
     # Mix dry and wet signals
     result = y_harmonic * 0.3 + y_harmonic_reverb * 0.6 + y_percussive * 0.1
     
     # Dynamic range preservation (less compression than modern genres)
-    result = result / np.max(np.abs(result)) * 0.9
+    if normalize:
+        result = result / np.max(np.abs(result)) * 0.9
     
     return result
 
-def apply_default_style(audio, sr):
+def apply_default_style(audio, sr, normalize=True):
     """Basic processing as fallback"""
     # Clean up with gentle highpass to remove rumble
-    b, a = librosa.filters.butter(4, 30/(sr/2), btype='highpass')
-    audio = librosa.filtfilt(b, a, audio)
+    audio = zero_phase(audio, 'highpass', 30, sr, order=4)
     
     # Gentle compression
-    audio = apply_compression(audio, threshold=0.5, ratio=2.0)
+    audio = apply_compression(audio, sr, threshold=0.5, ratio=2.0)
     
     # Normalize
-    audio = audio / np.max(np.abs(audio)) * 0.9
+    if normalize:
+        audio = audio / np.max(np.abs(audio)) * 0.9
     
     return audio
 
@@ -276,13 +304,11 @@ def apply_simple_effects(audio, sr, genre):
         audio = np.tanh(audio * 2.0) * 0.7
         
         # Apply basic EQ
-        b, a = librosa.filters.butter(4, 120/(sr/2), btype='highpass')
-        audio = librosa.filtfilt(b, a, audio)
+        audio = zero_phase(audio, 'highpass', 120, sr, order=4)
         
     elif genre.lower() == "jazz":
         # Apply warmth
-        b, a = librosa.filters.butter(4, 300/(sr/2), btype='lowshelf')
-        audio = librosa.filtfilt(b, a, audio)
+        audio = zero_phase(audio, 'lowshelf', 300, sr, order=4, gain_db=3)
         
     elif genre.lower() == "electronic":
         # Apply basic beat emphasis
@@ -290,24 +316,22 @@ def apply_simple_effects(audio, sr, genre):
         audio = y_harmonic * 0.6 + y_percussive * 1.4
         
         # Add sub bass
-        b, a = librosa.filters.butter(4, 80/(sr/2), btype='lowshelf')
-        audio = librosa.filtfilt(b, a, audio)
+        audio = zero_phase(audio, 'lowshelf', 80, sr, order=4, gain_db=6)
         
     elif genre.lower() == "classical":
         # Apply reverb
-        ir_length = int(sr * 1.5)
-        ir = np.exp(-np.linspace(0, 8, ir_length))
-        ir = ir / np.sum(ir)
-        audio = np.convolve(audio, ir, mode='same')
+        audio = room_reverb(audio, 1.5, sr, decay=8, normalize=True, mode='same')
     
     # Apply normalization
     audio = audio / np.max(np.abs(audio)) * 0.9
     
     return audio
 
-def enhance_with_magenta(audio, sr, style="default"):
+def enhance_with_magenta(audio, sr, style="default", analysis=None):
     """Use Magenta to enhance audio based on style
-    This is more of a demonstration than full implementation"""
+    This is more of a demonstration than full implementation.
+    Pass the track's analysis when audio is its harmonic component to reuse
+    the memoized second harmonic pass."""
     print(f"[PYTHON] Enhancing with Magenta ({style} style)...")
     
     # In a real implementation, we would:
@@ -315,15 +339,14 @@ def enhance_with_magenta(audio, sr, style="default"):
     # 2. Process through appropriate Magenta model
     # 3. Convert back to audio
     
-    # For now, we'll use a simplified approach that still uses Magenta's capabilities
-    # but doesn't require downloading large models
-    from magenta.music import audio_io
+    # For now the styles are approximated with librosa and filters, so neither Magenta
+    # nor TensorFlow is imported on this path
     
     # Apply style-specific processing
     if style == "jazz":
         # Jazz often has complex harmonies with 7th, 9th chords
         # Simulate this with gentle harmonic enhancement
-        audio = librosa.effects.harmonic(audio)
+        audio = analysis.harmonic_refined if analysis is not None else librosa.effects.harmonic(audio)
         
     elif style == "rock":
         # Rock often has power chords and strong rhythms
@@ -333,14 +356,17 @@ def enhance_with_magenta(audio, sr, style="default"):
     elif style == "electronic":
         # Electronic music often has synthesized sounds and effects
         # Simulate with spectral processing
-        D = librosa.stft(audio)
-        D_harmonic = librosa.decompose.harmonic(D)
-        audio = librosa.istft(D_harmonic)
+        if analysis is not None:
+            audio = analysis.harmonic_refined
+        else:
+            D = librosa.stft(audio)
+            D_harmonic = librosa.decompose.harmonic(D)
+            audio = librosa.istft(D_harmonic, length=len(audio))
         
     elif style == "classical":
         # Classical music often has orchestral instruments and complex dynamics
         # Simulate with harmonic enhancement and dynamics processing
-        audio = librosa.effects.harmonic(audio)
+        audio = analysis.harmonic_refined if analysis is not None else librosa.effects.harmonic(audio)
         # Enhance dynamics
         percentile_low = np.percentile(np.abs(audio), 30)
         percentile_high = np.percentile(np.abs(audio), 99)
@@ -349,22 +375,16 @@ def enhance_with_magenta(audio, sr, style="default"):
     # Give output slight coloration based on style
     if style == "jazz":
         # Warm tone
-        b, a = librosa.filters.butter(4, 300/(sr/2), btype='lowshelf')
-        audio = librosa.filtfilt(b, a, audio)
+        audio = zero_phase(audio, 'lowshelf', 300, sr, order=4, gain_db=3)
     elif style == "rock":
         # Mid boost
-        b, a = librosa.filters.butter(4, [500/(sr/2), 2000/(sr/2)], btype='bandpass')
-        audio = librosa.filtfilt(b, a, audio) * 0.3 + audio * 0.7
+        audio = zero_phase(audio, 'bandpass', (500, 2000), sr, order=4) * 0.3 + audio * 0.7
     elif style == "electronic":
         # Sub bass and high sparkle
-        b_sub, a_sub = librosa.filters.butter(4, 80/(sr/2), btype='lowshelf')
-        audio = librosa.filtfilt(b_sub, a_sub, audio)
-        b_high, a_high = librosa.filters.butter(4, 10000/(sr/2), btype='highshelf')
-        audio = librosa.filtfilt(b_high, a_high, audio)
+        audio = apply_eq(audio, sr, [Band('lowshelf', 80, gain_db=9), Band('highshelf', 10000, gain_db=6)])
     elif style == "classical":
         # Gentle high cut
-        b_high, a_high = librosa.filters.butter(2, 7500/(sr/2), btype='lowpass')
-        audio = librosa.filtfilt(b_high, a_high, audio)
+        audio = zero_phase(audio, 'lowpass', 7500, sr, order=2)
     
     return audio
 
@@ -373,48 +393,27 @@ def apply_swing(audio, sr, beat_frames, swing_amount=0.33):
     if len(beat_frames) < 4:
         return audio  # Not enough beats to apply swing
     
-    y_output = np.zeros_like(audio)
-    
-    for i in range(len(beat_frames)-1):
-        start_frame = beat_frames[i]
-        end_frame = beat_frames[i+1]
-        
-        # Apply different timing to alternating beats
-        if i % 2 == 0:  # Even beats (on-beats)
-            segment = audio[start_frame:end_frame]
-            y_output[start_frame:start_frame+len(segment)] = segment
-        else:  # Odd beats (off-beats) - apply swing
-            segment = audio[start_frame:end_frame]
-            # Create swing by time-stretching
-            stretch_factor = 1.0 + swing_amount
-            stretched = librosa.effects.time_stretch(segment, rate=stretch_factor)
-            
-            # Adjust length and copy
-            target_len = min(len(stretched), end_frame - start_frame)
-            y_output[start_frame:start_frame+target_len] = stretched[:target_len]
-    
-    return y_output
+    # One time warp over the whole signal instead of stretching each off-beat separately
+    return swing(audio, sr, beat_frames, swing_amount)
 
-def apply_compression(audio, threshold=0.3, ratio=4.0):
+def apply_compression(audio, sr, threshold=0.3, ratio=4.0):
     """Apply compression to audio signal"""
-    # Simple compressor
-    compressed = np.zeros_like(audio)
-    for i in range(len(audio)):
-        level = np.abs(audio[i])
-        if level > threshold:
-            gain = threshold + (level - threshold) / ratio
-            compressed[i] = audio[i] * (gain / level)
-        else:
-            compressed[i] = audio[i]
-    
-    return compressed
+    # Soft-knee compressor with attack/release smoothing, computed over the whole array
+    return compress(audio, sr, threshold=threshold, ratio=ratio, knee_db=6.0, attack_ms=5.0, release_ms=80.0)
 
 if __name__ == "__main__":
     # Test the script directly
-    import sys
-    if len(sys.argv) != 4:
-        print("Usage: python magenta_transform.py input_file output_file genre")
-        sys.exit(1)
-    
-    success = transform_with_magenta(sys.argv[1], sys.argv[2], sys.argv[3])
-    sys.exit(0 if success else 1)
+    parser = argparse.ArgumentParser(description="Transform audio to a different genre with Magenta-enhanced styles")
+    parser.add_argument("input_file")
+    parser.add_argument("output_file")
+    parser.add_argument("genre")
+    parser.add_argument("--stream", action="store_true",
+                        help="Render in overlapping blocks so memory stays bounded for long inputs")
+    parser.add_argument("--preview", action="store_true",
+                        help="Render only a short representative excerpt (GENRE_AI_PREVIEW_SECONDS long)")
+    parser.add_argument("--segment", type=int,
+                        help="Render only this GENRE_AI_SEGMENT_SECONDS-long segment, as raw 16-bit PCM")
+    args = parser.parse_args()
+    
+    success = transform_with_magenta(args.input_file, args.output_file, args.genre, stream=args.stream, preview=args.preview, segment=args.segment)
+    sys.exit(0 if success else 1)
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""
+Preview excerpts.
+
+A preview renders only a short, representative window of an upload so the
+user hears the genre within seconds; the full render follows as its own job.
+The window is the stretch with the most energy and onset activity, which is
+where choruses and drops tend to sit. It is picked from a low-rate mono
+decode, so choosing it costs a small fraction of the render, and only that
+range is then decoded at full rate.
+
+Configured through the environment:
+    GENRE_AI_PREVIEW_SECONDS   window length (default: 15)
+"""
+import os
+import numpy as np
+import librosa
+from audio_codec import decode
+from tracing import span
+
+PREVIEW_SECONDS = float(os.environ.get('GENRE_AI_PREVIEW_SECONDS', 15))
+ANALYSIS_SAMPLE_RATE = 11025
+HOP_LENGTH = 256
+# Weight of onset strength against loudness when scoring windows
+ONSET_WEIGHT = 0.5
+FADE_SECONDS = 0.05
+
+def preview_window(input_file, seconds=PREVIEW_SECONDS):
+    """(offset, duration) in seconds of the window of input_file to preview"""
+    with span('preview_window', seconds=seconds) as record:
+        audio, sr = decode(input_file, sr=ANALYSIS_SAMPLE_RATE, mono=True)
+        offset = best_window(audio, sr, seconds)
+        record['offset'] = offset
+    print(f"[PYTHON] Previewing {seconds:.0f}s from {offset:.1f}s of {len(audio) / sr:.1f}s")
+    return offset, min(seconds, len(audio) / sr)
+
+def best_window(audio, sr, seconds, hop_length=HOP_LENGTH):
+    """Start in seconds of the seconds-long stretch of audio with the most energy and onsets"""
+    width = int(seconds * sr / hop_length)
+    rms = librosa.feature.rms(y=audio, hop_length=hop_length)[0]
+    if width >= len(rms):
+        return 0.0
+    onsets = librosa.onset.onset_strength(y=audio, sr=sr, hop_length=hop_length)
+    n = min(len(rms), len(onsets))
+    score = rms[:n] / (rms.max() + 1e-9) + ONSET_WEIGHT * onsets[:n] / (onsets.max() + 1e-9)
+    totals = np.cumsum(np.concatenate([[0.0], score]))
+    start = int(np.argmax(totals[width:] - totals[:-width]))
+    return start * hop_length / sr
+
+def fade_edges(audio, sr, seconds=FADE_SECONDS):
+    """Raised-cosine fade in and out so an excerpt doesn't start or stop with a click"""
+    n = min(int(seconds * sr), len(audio) // 2)
+    if n == 0:
+        return audio
+    ramp = np.sin(np.linspace(0, 0.5 * np.pi, n)) ** 2
+    audio = np.array(audio, copy=True)
+    audio[:n] *= ramp
+    audio[len(audio) - n:] *= ramp[::-1]
+    return audio
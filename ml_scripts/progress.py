@@ -0,0 +1,132 @@
+"""
+Render progress.
+
+Inside track(), every traced stage (see tracing.py) that starts or ends
+writes a [PROGRESS] JSON line:
+
+    [PROGRESS] {"trace": "7", "stage": "separate", "state": "end", "fraction": 0.71, "eta": 4.2}
+
+fraction is the share of the render's estimated work that is done and eta
+the estimated seconds left (null until it can be estimated). The work is
+estimated from the stages plan() expects the script to run, weighted by
+their cost in seconds per second of audio. Until a tenth of the work is done
+the ETA comes from those costs and the decoded length. After that it
+extrapolates from the time taken so far. Streamed renders have no per-stage
+spans and report through advance() as blocks are written; a segment of a
+segmented render is one stage.
+"""
+import contextlib
+import contextvars
+import threading
+import time
+import tracing
+
+PREFIX = '[PROGRESS] '
+
+# Rough seconds of work per second of 44.1 kHz audio on one core
+SEPARATED = [('decode', 0.005), ('separate', 0.2)]
+STEM_MIX = [('effects', 0.02)] * 4 + [('mix', 0.001), ('normalize', 0.001), ('encode', 0.01)]
+ANALYZED = [('decode', 0.005), ('analysis', 0.05)]
+STYLE_MIX = [('effects', 0.15), ('encode', 0.01)]
+# Whole-upload decode at the preview window's analysis rate, per second of the excerpt
+PREVIEW_DECODE_COST = 0.05
+
+# script -> (stages run once per input, stages run per genre)
+PLANS = {
+    'spleeter': (SEPARATED, STEM_MIX),
+    'process_audio': (SEPARATED, STEM_MIX),
+    'simple': ([('decode', 0.005)], [('effects', 0.05), ('normalize', 0.001), ('encode', 0.01)]),
+    'magenta_inspired': (ANALYZED, STYLE_MIX),
+    'magenta': (ANALYZED, STYLE_MIX),
+}
+
+# Before this share of the work is done the observed pace is too noisy to extrapolate
+CALIBRATION_FRACTION = 0.1
+
+_tracker = contextvars.ContextVar('progress_tracker', default=None)
+
+def plan(script, genres=1, shared=False, stream=False, preview=False, segment=False):
+    """(stage, cost) pairs a render of script is expected to run
+
+    With shared, the per-input stages run once for all genres, as in
+    transform_genres batches; otherwise everything repeats per genre.
+    A preview starts with a low-rate decode of the whole upload to pick its
+    window.
+    """
+    once, per_genre = PLANS.get(script, PLANS['spleeter'])
+    if stream or segment:
+        return [('segment' if segment else 'stream', sum(cost for _, cost in once + per_genre))] * genres
+    if preview:
+        once = [('decode', PREVIEW_DECODE_COST)] + once
+    if shared:
+        return once + per_genre * genres
+    return (once + per_genre) * genres
+
+class Tracker:
+    """Progress of one render through its planned stages"""
+
+    def __init__(self, stages):
+        self.names = [name for name, _ in stages]
+        self.costs = [cost for _, cost in stages]
+        self.done = [0.0] * len(stages)
+        self.total = sum(self.costs) or 1.0
+        self.seconds = None
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def on_span(self, state, name, record):
+        with self.lock:
+            if state == 'end':
+                # The last decode is the audio being rendered (a preview decodes the whole upload first)
+                if name == 'decode' and record.get('sr'):
+                    self.seconds = record.get('samples', 0) / record['sr']
+                self._complete(name, 1.0)
+            event = self._event(name, state)
+        tracing.emit(event, PREFIX)
+
+    def advance(self, name, fraction):
+        """Mark the next unfinished name stage fraction done"""
+        with self.lock:
+            self._complete(name, fraction)
+            event = self._event(name, 'running')
+        tracing.emit(event, PREFIX)
+
+    def fraction(self):
+        return sum(cost * done for cost, done in zip(self.costs, self.done)) / self.total
+
+    def eta(self):
+        done = self.fraction()
+        if done >= CALIBRATION_FRACTION:
+            return (time.perf_counter() - self.start) * (1 - done) / done
+        if self.seconds is not None:
+            return self.total * (1 - done) * self.seconds
+        return None
+
+    def _complete(self, name, fraction):
+        # Stages the plan does not know, or more of them than planned, leave progress alone
+        for index, (stage, done) in enumerate(zip(self.names, self.done)):
+            if stage == name and done < 1.0:
+                self.done[index] = max(done, min(fraction, 1.0))
+                return
+
+    def _event(self, name, state):
+        eta = self.eta()
+        return {'trace': tracing.current()[0], 'stage': name, 'state': state,
+                'fraction': round(self.fraction(), 4), 'eta': None if eta is None else round(eta, 1)}
+
+@contextlib.contextmanager
+def track(stages):
+    """Report progress of the render run inside through the planned stages"""
+    tracker = Tracker(stages)
+    token = _tracker.set(tracker)
+    try:
+        with tracing.observe(tracker.on_span):
+            yield tracker
+    finally:
+        _tracker.reset(token)
+
+def advance(name, fraction):
+    """Report a stage partly done, for stages without per-stage spans; a no-op outside track()"""
+    tracker = _tracker.get()
+    if tracker is not None:
+        tracker.advance(name, fraction)
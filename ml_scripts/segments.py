@@ -0,0 +1,81 @@
+"""
+Segmented render mode.
+
+Renders a track as fixed-length segments that can be produced in any order,
+so a player can seek into a render that isn't finished: the server renders
+the segment under the playhead first and the rest after it. Each segment is
+written as raw 16-bit little-endian mono PCM, so byte offsets in the
+finished WAV map straight to segments (see app/lib/segment-render.ts).
+
+A segment is decoded and processed together with a pre-roll of the audio
+before it, which brings stateful effects (reverb tails, filters, compressor
+envelopes, separation context) to the state they would have had in a
+whole-track render, and a post-roll after it for the effects that look
+ahead (the centred concert-hall reverb, zero-phase filters, the resampler;
+see streaming.POSTROLL_SECONDS). Both are dropped afterwards, so
+neighbouring segments line up without a seam. As in streaming.py, the output
+goes through a soft limiter instead of whole-track normalization.
+
+Configured through the environment:
+    GENRE_AI_SEGMENT_SECONDS   segment length (default: 10)
+"""
+import os
+import numpy as np
+from audio_codec import decode, probe
+from streaming import POSTROLL_SECONDS, PREROLL_SECONDS, match_channels, soft_limit
+from tracing import span
+
+SEGMENT_SECONDS = float(os.environ.get('GENRE_AI_SEGMENT_SECONDS', 10))
+# Every script renders segments at this rate so the WAV header is known up front
+SEGMENT_SAMPLE_RATE = 44100
+SAMPLE_WIDTH = 2
+
+def layout(input_file, sr=SEGMENT_SAMPLE_RATE, segment_seconds=SEGMENT_SECONDS):
+    """Shape of a segmented render of input_file: rate, channels, frames and segment size"""
+    native_sr, duration = probe(input_file)
+    frames = int(round(duration * sr))
+    segment_frames = int(segment_seconds * sr)
+    return {'sr': sr, 'channels': 1, 'sample_width': SAMPLE_WIDTH, 'frames': frames,
+            'segment_frames': segment_frames, 'segments': max(-(-frames // segment_frames), 1)}
+
+def render_segment(input_file, segment_file, index, process_block, sr=SEGMENT_SAMPLE_RATE, channels=1,
+                   segment_seconds=SEGMENT_SECONDS, preroll_seconds=PREROLL_SECONDS,
+                   postroll_seconds=POSTROLL_SECONDS):
+    """Render segment index of input_file to segment_file as raw PCM and return its frame count
+
+    process_block(block, sr) gets the segment with its pre- and post-roll,
+    mono or (n_samples, channels), and must return mono audio of the same
+    length.
+    """
+    shape = layout(input_file, sr, segment_seconds)
+    start = index * shape['segment_frames']
+    if not 0 <= start < max(shape['frames'], 1):
+        raise ValueError(f"Segment {index} is outside the {shape['segments']} segments of {input_file}")
+    length = min(shape['segment_frames'], shape['frames'] - start)
+    preroll = min(int(preroll_seconds * sr), start)
+    postroll = int(postroll_seconds * sr)
+
+    with span('segment', index=index, samples=length):
+        block, _ = decode(input_file, sr=sr, mono=channels == 1, offset=(start - preroll) / sr,
+                          duration=(preroll + length + postroll) / sr)
+        if channels > 1:
+            block = match_channels(block, channels)
+        # The last segment has no post-roll, and resampling can come up a sample short
+        wanted = preroll + length
+        if len(block) < wanted:
+            block = np.concatenate([block, np.zeros((wanted - len(block),) + block.shape[1:], dtype=np.float32)])
+
+        processed = np.zeros(len(block), dtype=np.float32)
+        result = np.asarray(process_block(block, sr))[:len(block)]
+        processed[:len(result)] = result
+        main = soft_limit(processed[preroll:wanted])
+
+        # Write beside the target and rename, so a segment file on disk is always complete
+        pcm = (np.clip(main, -1.0, 1.0) * 32767).astype('<i2')
+        temporary = f"{segment_file}.tmp"
+        with open(temporary, 'wb') as f:
+            f.write(pcm.tobytes())
+        os.replace(temporary, segment_file)
+
+    print(f"[PYTHON] Rendered segment {index + 1}/{shape['segments']} to {segment_file}")
+    return length
@@ -1,207 +1,250 @@
+import argparse
 import sys
 import os
 import numpy as np
 import librosa
-import soundfile as sf
-from spleeter.separator import Separator
-import tempfile
+from audio_codec import decode, encode
+from compressor import compress
+from eq import Band, apply_eq, peak
+from filters import zero_phase
+from reverb import room_reverb
+from stems import SEPARATOR_SAMPLE_RATE, load_waveform, separate_stems
+from stem_cache import get_stem_cache
+from stem_pool import process_stems
+from preview import fade_edges, preview_window
+from segments import render_segment
+from streaming import render_stream
+from tracing import span
 import shutil
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
-def transform_genre(input_file, output_file, target_genre):
-    """Transform audio to specified genre using Spleeter to separate stems"""
+def transform_genre(input_file, output_file, target_genre, debug_dir=None, stream=False, preview=False,
+                    segment=None):
+    """Transform audio to specified genre using Spleeter to separate stems
+
+    Pass debug_dir to also dump the separated stems there as WAV files.
+    With stream=True the track is decoded, separated and rendered in blocks
+    so memory stays bounded for arbitrarily long inputs. With preview=True
+    only a short representative excerpt is decoded and rendered (see preview).
+    With segment=N only that segment of the track is rendered, as raw PCM
+    (see segments); failures raise instead of falling back.
+    """
     print(f"[PYTHON] Processing {input_file} to {target_genre} genre")
-    start_time = time.time()
+    
+    if segment is not None:
+        render_segment(input_file, output_file, segment,
+                       lambda block, sr: mix_genre_stems(separate_stems(block), target_genre), channels=2)
+        return True
     
     try:
-        # Create a temporary directory for Spleeter output
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Initialize Spleeter separator
-            print("[PYTHON] Initializing Spleeter (first run will download models)...")
-            separator = Separator('spleeter:4stems')
-            
-            # Separate the audio file into stems
-            print("[PYTHON] Separating audio stems...")
-            separator.separate_to_file(input_file, temp_dir)
-            
-            # Get the directory containing the separated stems
-            stem_dir = os.path.join(temp_dir, os.path.splitext(os.path.basename(input_file))[0])
-            
-            # Check that the stem files exist
-            vocals_path = os.path.join(stem_dir, 'vocals.wav')
-            bass_path = os.path.join(stem_dir, 'bass.wav')
-            drums_path = os.path.join(stem_dir, 'drums.wav')
-            other_path = os.path.join(stem_dir, 'other.wav')
-            
-            print(f"[PYTHON] Checking stems at {stem_dir}")
-            if not all(os.path.exists(p) for p in [vocals_path, bass_path, drums_path, other_path]):
-                raise Exception("Stem separation failed - one or more stems missing")
-            
-            # Load all the stems
-            print("[PYTHON] Loading separated stems...")
-            vocals, sr_vocals = librosa.load(vocals_path, sr=None)
-            bass, sr_bass = librosa.load(bass_path, sr=None)
-            drums, sr_drums = librosa.load(drums_path, sr=None)
-            other, sr_other = librosa.load(other_path, sr=None)
-            
-            # Ensure all stems have the same sample rate
-            sr = sr_vocals
-            
-            # Apply genre-specific processing to each stem
-            print(f"[PYTHON] Applying {target_genre} effects to stems...")
-            
-            # Process based on target genre
-            if target_genre.lower() == "rock":
-                # Rock: Heavily distorted guitars, very prominent drums, compressed vocals
-                vocals = apply_compression(vocals, 0.9) * 0.8        # More compressed vocals, slightly quieter
-                drums = apply_compression(drums, 0.8) * 2.0          # Much more prominent drums
-                bass = apply_distortion(bass, 0.7) * 1.5             # More distorted bass
-                other = apply_distortion(other, 0.9) * 2.0           # Heavily distorted guitars
-                
-            elif target_genre.lower() == "electronic":
-                # Electronic: Heavy processing, filters, delay effects
-                vocals = apply_delay(vocals, 0.15, 0.3)
-                drums = apply_compression(drums, 0.8) * 1.3  # Punchy drums
-                bass = apply_filter(bass, "lowpass", 250) * 1.4  # Heavy bass
-                other = apply_filter(other, "highpass", 2000)  # High synths
-                other = apply_delay(other, 0.1, 0.4)
-                
-            elif target_genre.lower() == "hip hop":
-                # Hip Hop: Prominent bass and drums, clear vocals
-                vocals = apply_compression(vocals, 0.6) * 1.2
-                drums = apply_compression(drums, 0.7) * 1.3
-                bass = apply_bass_boost(bass, 1.8)
-                other = other * 0.7  # Reduce other elements
-                
-            elif target_genre.lower() == "jazz":
-                # Jazz: Warm sound, balanced, light reverb
-                vocals = apply_reverb(vocals, 0.3, 0.4)
-                drums = drums * 0.8  # Reduce drums
-                bass = apply_filter(bass, "lowpass", 400) * 1.1
-                other = apply_reverb(other, 0.4, 0.5) * 1.2  # Emphasize instruments
-                
-            elif target_genre.lower() == "classical":
-                # Classical: Significant reverb, dynamic range
-                vocals = apply_reverb(vocals, 0.7, 0.8) * 1.1
-                drums = drums * 0.5  # Significantly reduce drums
-                bass = bass * 0.9
-                other = apply_reverb(other, 0.8, 0.7) * 1.4  # Emphasize orchestra
-                
-            elif target_genre.lower() == "country":
-                # Country: Clear vocals, balanced instruments
-                vocals = apply_compression(vocals, 0.5) * 1.3  # Prominent vocals
-                drums = apply_compression(drums, 0.6) * 0.9
-                bass = bass * 0.9
-                other = apply_eq_boost(other, 2000, 1.2) * 1.1  # Bright guitars
-                
-            elif target_genre.lower() == "metal":
-                # Metal: Heavy distortion, compressed drums, loud
-                vocals = apply_distortion(vocals, 0.4)
-                vocals = apply_compression(vocals, 0.8) * 1.1
-                drums = apply_compression(drums, 0.9) * 1.4  # Very punchy drums
-                bass = apply_distortion(bass, 0.6) * 1.2
-                other = apply_distortion(other, 0.8) * 1.3  # Heavy distorted guitars
-                
-            elif target_genre.lower() == "r&b":
-                # R&B: Smooth, bass-focused, clear vocals
-                vocals = apply_compression(vocals, 0.5) * 1.3
-                drums = apply_compression(drums, 0.6) * 0.9
-                bass = apply_bass_boost(bass, 1.4)
-                other = apply_filter(other, "lowpass", 6000) * 0.9  # Warm instruments
-                
-            elif target_genre.lower() == "reggae":
-                # Reggae: Echo effects, prominent bass
-                vocals = apply_delay(vocals, 0.2, 0.3)
-                drums = apply_delay(drums, 0.1, 0.2) * 0.9
-                bass = apply_bass_boost(bass, 1.5)
-                other = apply_delay(other, 0.15, 0.3) * 0.9
-                
-            else:  # Pop or default
-                # Pop: Balanced, compressed, radio-friendly
-                vocals = apply_compression(vocals, 0.6) * 1.2  # Forward vocals
-                drums = apply_compression(drums, 0.7) * 1.1
-                bass = apply_compression(bass, 0.7) * 1.0
-                other = apply_compression(other, 0.6) * 0.9
-            
-            # Mix the processed stems back together
-            print("[PYTHON] Mixing processed stems...")
-            # Make sure all stems are the same length
-            min_length = min(len(vocals), len(bass), len(drums), len(other))
-            vocals = vocals[:min_length]
-            bass = bass[:min_length]
-            drums = drums[:min_length]
-            other = other[:min_length]
-            
-            # Mix stems together
-            mixed = vocals + bass + drums + other
-            
-            # Normalize the final mix
-            mixed = librosa.util.normalize(mixed)
-            
-            # Save the final audio
-            print(f"[PYTHON] Saving final audio to {output_file}")
-            sf.write(output_file, mixed, sr)
-            
-            elapsed_time = time.time() - start_time
-            print(f"[PYTHON] Successfully transformed to {target_genre} genre in {elapsed_time:.2f} seconds")
+        if stream:
+            render_stream(input_file, output_file,
+                          lambda block, sr: mix_genre_stems(separate_stems(block), target_genre),
+                          sr=SEPARATOR_SAMPLE_RATE, channels=2)
+            print(f"[PYTHON] Successfully transformed to {target_genre} genre")
             return True
-            
+        
+        # Decode once and separate in memory - no WAV round trip through a temp dir
+        print("[PYTHON] Loading audio...")
+        offset, duration = preview_window(input_file) if preview else (0.0, None)
+        waveform = load_waveform(input_file, offset=offset, duration=duration)
+        
+        # Stems don't depend on the genre, so a re-render of the same upload hits the cache
+        # and never loads the separator (first load will download models)
+        print("[PYTHON] Separating audio stems...")
+        stems = separate_stems(waveform, debug_dir=debug_dir, cache=get_stem_cache())
+        sr = SEPARATOR_SAMPLE_RATE
+        
+        # Apply genre-specific processing to each stem
+        print(f"[PYTHON] Applying {target_genre} effects to stems...")
+        mixed = mix_genre_stems(stems, target_genre)
+        if preview:
+            mixed = fade_edges(mixed, sr)
+        
+        # Normalize the final mix
+        with span('normalize', samples=len(mixed)):
+            mixed = librosa.util.normalize(mixed)
+        
+        # Save the final audio
+        print(f"[PYTHON] Saving final audio to {output_file}")
+        encode(output_file, mixed, sr)
+        
+        print(f"[PYTHON] Successfully transformed to {target_genre} genre")
+        return True
+        
     except Exception as e:
         print(f"[PYTHON] ERROR during Spleeter transformation: {str(e)}")
         print(f"[PYTHON] Exception type: {type(e).__name__}")
         print(f"[PYTHON] Exception traceback: {traceback.format_exc()}")
-        # Fall back to simpler processing without stem separation
+        return render_fallback(input_file, output_file, target_genre)
+
+def transform_genres(input_file, output_files, debug_dir=None, max_workers=None):
+    """Render several genres from a single decode and stem separation
+
+    output_files maps each target genre to its output path. The per-genre
+    effect and mix chains run concurrently on a thread pool (see
+    render_workers). Returns a dict mapping each genre to its success and
+    elapsed seconds.
+    """
+    print(f"[PYTHON] Processing {input_file} to {', '.join(output_files)} genres")
+    start_time = time.time()
+    
+    try:
+        print("[PYTHON] Loading audio...")
+        waveform = load_waveform(input_file)
+        
+        print("[PYTHON] Separating audio stems...")
+        stems = separate_stems(waveform, debug_dir=debug_dir, cache=get_stem_cache())
+        del waveform
+    except Exception as e:
+        print(f"[PYTHON] ERROR during Spleeter separation: {str(e)}")
+        print(f"[PYTHON] Exception traceback: {traceback.format_exc()}")
+        results = {}
+        for genre, output_file in output_files.items():
+            genre_start = time.time()
+            success = render_fallback(input_file, output_file, genre)
+            results[genre] = {'success': bool(success), 'elapsed': round(time.time() - genre_start, 3)}
+        return results
+    
+    print(f"[PYTHON] Decoded and separated once in {time.time() - start_time:.2f} seconds")
+    
+    def render(genre):
+        genre_start = time.time()
+        output_file = output_files[genre]
         try:
-            print("[PYTHON] Falling back to simple audio effects...")
-            return apply_simple_effects(input_file, output_file, target_genre)
-        except Exception as fallback_error:
-            print(f"[PYTHON] Fallback processing failed: {str(fallback_error)}")
-            # Last resort: just copy the file
-            try:
-                shutil.copy(input_file, output_file)
-                print("[PYTHON] Copied original file as last resort")
-                return True
-            except:
-                print("[PYTHON] Failed to copy original file")
-                return False
+            print(f"[PYTHON] Applying {genre} effects to stems...")
+            mixed = mix_genre_stems(stems, genre)
+            with span('normalize', samples=len(mixed)):
+                mixed = librosa.util.normalize(mixed)
+            encode(output_file, mixed, SEPARATOR_SAMPLE_RATE)
+            success = True
+        except Exception as e:
+            print(f"[PYTHON] ERROR rendering {genre}: {str(e)}")
+            print(f"[PYTHON] Exception traceback: {traceback.format_exc()}")
+            success = render_fallback(input_file, output_file, genre)
+        return {'success': bool(success), 'elapsed': round(time.time() - genre_start, 3)}
+    
+    with ThreadPoolExecutor(max_workers=max_workers or render_workers(len(output_files))) as pool:
+        results = dict(zip(output_files, pool.map(render, output_files)))
+    
+    for genre, result in results.items():
+        status = "" if result['success'] else " (failed)"
+        print(f"[PYTHON]   {genre}: {result['elapsed']:.2f}s{status} -> {output_files[genre]}")
+    print(f"[PYTHON] Rendered {len(results)} genres in {time.time() - start_time:.2f} seconds")
+    return results
+
+def render_workers(n_jobs):
+    """Thread count for concurrent genre chains: GENRE_AI_RENDER_WORKERS, else one per job up to the CPU count"""
+    configured = int(os.environ.get('GENRE_AI_RENDER_WORKERS', 0))
+    return max(1, configured or min(n_jobs, os.cpu_count() or 1))
+
+def batch_output_files(output_file, target_genres):
+    """Map each genre to an output path
+
+    A {genre} placeholder in output_file is filled in; otherwise, for more
+    than one genre, the genre is appended to the file name.
+    """
+    output_files = {}
+    for genre in target_genres:
+        slug = genre.lower().replace(' ', '_')
+        if '{genre}' in output_file:
+            output_files[genre] = output_file.replace('{genre}', slug)
+        elif len(target_genres) > 1:
+            base, ext = os.path.splitext(output_file)
+            output_files[genre] = f"{base}_{slug}{ext}"
+        else:
+            output_files[genre] = output_file
+    return output_files
+
+def render_fallback(input_file, output_file, target_genre):
+    """Render without stem separation, or copy the input as a last resort
+
+    Runs inside a fallback span, which tells the worker not to cache the result.
+    """
+    with span('fallback', genre=target_genre):
+        return _render_fallback(input_file, output_file, target_genre)
+
+def _render_fallback(input_file, output_file, target_genre):
+    # Fall back to simpler processing without stem separation
+    try:
+        print("[PYTHON] Falling back to simple audio effects...")
+        return apply_simple_effects(input_file, output_file, target_genre)
+    except Exception as fallback_error:
+        print(f"[PYTHON] Fallback processing failed: {str(fallback_error)}")
+        # Last resort: just copy the file
+        try:
+            shutil.copy(input_file, output_file)
+            print("[PYTHON] Copied original file as last resort")
+            return True
+        except:
+            print("[PYTHON] Failed to copy original file")
+            return False
+
+def mix_genre_stems(stems, target_genre):
+    """Apply the genre's per-stem effects and sum the stems into an unnormalized mix
+
+    The four stem chains run concurrently (see stem_pool).
+    """
+    chains = GENRE_CHAINS.get(target_genre.lower(), GENRE_CHAINS['pop'])
+    processed = process_stems(stems, chains)
+    vocals = processed['vocals']
+    bass = processed['bass']
+    drums = processed['drums']
+    other = processed['other']
+    
+    # Mix the processed stems back together
+    print("[PYTHON] Mixing processed stems...")
+    with span('mix', genre=target_genre) as record:
+        # Make sure all stems are the same length
+        min_length = min(len(vocals), len(bass), len(drums), len(other))
+        vocals = vocals[:min_length]
+        bass = bass[:min_length]
+        drums = drums[:min_length]
+        other = other[:min_length]
+        
+        # Mix stems together
+        mixed = vocals + bass + drums + other
+        record['samples'] = min_length
+    return mixed
 
 def apply_simple_effects(input_file, output_file, target_genre):
     """Apply genre effects without stem separation as fallback"""
     print(f"[PYTHON] Applying simple effects for {target_genre}")
     # Load the audio file
-    y, sr = librosa.load(input_file, sr=None)
+    y, sr = decode(input_file, mono=True)
     
     # Apply basic genre effects
     if target_genre.lower() == "rock":
         y = apply_distortion(y, 0.5)
-        y = apply_compression(y, 0.7)
+        y = apply_compression(y, 0.7, sr)
     elif target_genre.lower() == "electronic":
-        y = apply_delay(y, 0.15, 0.4)
-        y = apply_filter(y, "highpass", 200)
+        y = apply_delay(y, 0.15, 0.4, sr)
+        y = apply_filter(y, "highpass", 200, sr)
     elif target_genre.lower() == "hip hop":
-        y = apply_bass_boost(y, 1.4)
-        y = apply_compression(y, 0.8)
+        y = apply_bass_boost(y, 1.4, sr)
+        y = apply_compression(y, 0.8, sr)
     # Add more genre conditions as needed
     else:
-        y = apply_compression(y, 0.6)
+        y = apply_compression(y, 0.6, sr)
     
     # Normalize and save
     y = librosa.util.normalize(y)
-    sf.write(output_file, y, sr)
+    encode(output_file, y, sr)
     print(f"[PYTHON] Simple effects applied and saved to {output_file}")
     return True
 
-# Audio Effect Functions
-def apply_compression(audio, ratio):
-    """Apply compression to audio"""
+# Audio Effect Functions. Stem chains call them on stems at the separator's rate;
+# other callers pass the rate of their audio.
+def apply_compression(audio, ratio, sr=SEPARATOR_SAMPLE_RATE):
+    """Apply compression to audio
+
+    ratio is the compression amount in [0, 1): 0.5 is a gentle 2:1,
+    0.9 a heavy 10:1. Returns a new array; the stem is not modified.
+    """
     print(f"[PYTHON]   Applying compression with ratio {ratio}...")
-    threshold = 0.3
-    # Simple compressor implementation
-    indices = np.where(np.abs(audio) > threshold)[0]
-    if len(indices) > 0:
-        audio[indices] = threshold + (audio[indices] - threshold) / ratio
-    return audio
+    return compress(audio, sr, threshold=0.3, ratio=1.0 / (1.0 - min(ratio, 0.95)), knee_db=6.0)
 
 def apply_distortion(audio, amount):
     """Apply distortion effect"""
@@ -209,60 +252,143 @@ def apply_distortion(audio, amount):
     # Simple waveshaping distortion
     return np.tanh(audio * amount * 3) / np.tanh(amount)
 
-def apply_filter(audio, filter_type, cutoff):
+def apply_filter(audio, filter_type, cutoff, sr=SEPARATOR_SAMPLE_RATE):
     """Apply filter (lowpass or highpass)"""
     print(f"[PYTHON]   Applying {filter_type} filter at {cutoff}Hz...")
-    if filter_type == "lowpass":
-        b = np.array([1.0 - cutoff/22050])
-        a = np.array([1.0, -cutoff/22050])
-        return librosa.filtfilt(b, a, audio)
-    elif filter_type == "highpass":
-        b = np.array([1.0, -1.0])
-        a = np.array([1.0, -0.99])
-        return librosa.filtfilt(b, a, audio)
+    if filter_type in ("lowpass", "highpass"):
+        return zero_phase(audio, filter_type, cutoff, sr, order=2)
     return audio
 
-def apply_delay(audio, delay_time, mix):
+def apply_delay(audio, delay_time, mix, sr=SEPARATOR_SAMPLE_RATE):
     """Apply delay effect"""
     print(f"[PYTHON]   Applying delay with time {delay_time}s and mix {mix}...")
-    delay_samples = int(delay_time * 44100)
+    delay_samples = int(delay_time * sr)
     delayed = np.zeros_like(audio)
     if delay_samples < len(audio):
         delayed[delay_samples:] = audio[:-delay_samples]
     return audio * (1 - mix) + delayed * mix
 
-def apply_reverb(audio, room_size, mix):
+def apply_reverb(audio, room_size, mix, sr=SEPARATOR_SAMPLE_RATE):
     """Apply reverb effect"""
     print(f"[PYTHON]   Applying reverb with size {room_size} and mix {mix}...")
-    impulse_response = np.exp(-np.linspace(0, 5, int(room_size * 44100)))
-    reverb = np.convolve(audio, impulse_response, mode='full')[:len(audio)]
+    reverb = room_reverb(audio, room_size, sr)
     return audio * (1 - mix) + reverb * mix
 
-def apply_bass_boost(audio, amount):
+def apply_bass_boost(audio, amount, sr=SEPARATOR_SAMPLE_RATE):
     """Apply bass boost"""
     print(f"[PYTHON]   Applying bass boost with amount {amount}...")
-    lowpass = apply_filter(audio, "lowpass", 200)
-    return audio + (lowpass * (amount - 1))
+    # audio + lowpass * (amount - 1), as a single filter
+    return apply_eq(audio, sr, [Band('lowpass', 200, order=2, wet=amount - 1, dry=1.0)])
 
-def apply_eq_boost(audio, freq, amount):
+def apply_eq_boost(audio, freq, amount, sr=SEPARATOR_SAMPLE_RATE):
     """Apply EQ boost at specific frequency"""
     print(f"[PYTHON]   Boosting frequency around {freq}Hz by {amount}...")
-    return audio * amount
+    return apply_eq(audio, sr, [peak(freq, 20 * np.log10(amount))])
+
+# Per-genre stem processing: stem -> ([(effect, *args), ...], mix gain).
+# Stems are independent until the mix, so each chain can run on its own core.
+GENRE_CHAINS = {
+    # Rock: Heavily distorted guitars, very prominent drums, compressed vocals
+    "rock": {
+        'vocals': ([(apply_compression, 0.9)], 0.8),  # More compressed vocals, slightly quieter
+        'drums': ([(apply_compression, 0.8)], 2.0),  # Much more prominent drums
+        'bass': ([(apply_distortion, 0.7)], 1.5),  # More distorted bass
+        'other': ([(apply_distortion, 0.9)], 2.0),  # Heavily distorted guitars
+    },
+    # Electronic: Heavy processing, filters, delay effects
+    "electronic": {
+        'vocals': ([(apply_delay, 0.15, 0.3)], 1.0),
+        'drums': ([(apply_compression, 0.8)], 1.3),  # Punchy drums
+        'bass': ([(apply_filter, "lowpass", 250)], 1.4),  # Heavy bass
+        'other': ([(apply_filter, "highpass", 2000), (apply_delay, 0.1, 0.4)], 1.0),  # High synths
+    },
+    # Hip Hop: Prominent bass and drums, clear vocals
+    "hip hop": {
+        'vocals': ([(apply_compression, 0.6)], 1.2),
+        'drums': ([(apply_compression, 0.7)], 1.3),
+        'bass': ([(apply_bass_boost, 1.8)], 1.0),
+        'other': ([], 0.7),  # Reduce other elements
+    },
+    # Jazz: Warm sound, balanced, light reverb
+    "jazz": {
+        'vocals': ([(apply_reverb, 0.3, 0.4)], 1.0),
+        'drums': ([], 0.8),  # Reduce drums
+        'bass': ([(apply_filter, "lowpass", 400)], 1.1),
+        'other': ([(apply_reverb, 0.4, 0.5)], 1.2),  # Emphasize instruments
+    },
+    # Classical: Significant reverb, dynamic range
+    "classical": {
+        'vocals': ([(apply_reverb, 0.7, 0.8)], 1.1),
+        'drums': ([], 0.5),  # Significantly reduce drums
+        'bass': ([], 0.9),
+        'other': ([(apply_reverb, 0.8, 0.7)], 1.4),  # Emphasize orchestra
+    },
+    # Country: Clear vocals, balanced instruments
+    "country": {
+        'vocals': ([(apply_compression, 0.5)], 1.3),  # Prominent vocals
+        'drums': ([(apply_compression, 0.6)], 0.9),
+        'bass': ([], 0.9),
+        'other': ([(apply_eq_boost, 2000, 1.2)], 1.1),  # Bright guitars
+    },
+    # Metal: Heavy distortion, compressed drums, loud
+    "metal": {
+        'vocals': ([(apply_distortion, 0.4), (apply_compression, 0.8)], 1.1),
+        'drums': ([(apply_compression, 0.9)], 1.4),  # Very punchy drums
+        'bass': ([(apply_distortion, 0.6)], 1.2),
+        'other': ([(apply_distortion, 0.8)], 1.3),  # Heavy distorted guitars
+    },
+    # R&B: Smooth, bass-focused, clear vocals
+    "r&b": {
+        'vocals': ([(apply_compression, 0.5)], 1.3),
+        'drums': ([(apply_compression, 0.6)], 0.9),
+        'bass': ([(apply_bass_boost, 1.4)], 1.0),
+        'other': ([(apply_filter, "lowpass", 6000)], 0.9),  # Warm instruments
+    },
+    # Reggae: Echo effects, prominent bass
+    "reggae": {
+        'vocals': ([(apply_delay, 0.2, 0.3)], 1.0),
+        'drums': ([(apply_delay, 0.1, 0.2)], 0.9),
+        'bass': ([(apply_bass_boost, 1.5)], 1.0),
+        'other': ([(apply_delay, 0.15, 0.3)], 0.9),
+    },
+    # Pop (and anything else): Balanced, compressed, radio-friendly
+    "pop": {
+        'vocals': ([(apply_compression, 0.6)], 1.2),  # Forward vocals
+        'drums': ([(apply_compression, 0.7)], 1.1),
+        'bass': ([(apply_compression, 0.7)], 1.0),
+        'other': ([(apply_compression, 0.6)], 0.9),
+    },
+}
 
 if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print("[PYTHON] Usage: python spleeter_transform.py input_file output_file target_genre")
-        sys.exit(1)
-        
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
-    target_genre = sys.argv[3]
+    parser = argparse.ArgumentParser(description="Transform audio to a different genre using Spleeter stems")
+    parser.add_argument("input_file")
+    parser.add_argument("output_file",
+                        help="Output path; with several genres use a {genre} placeholder or get the genre appended")
+    parser.add_argument("target_genre", help="Target genre, or a comma-separated list rendered from one separation")
+    parser.add_argument("--stream", action="store_true",
+                        help="Render in overlapping blocks so memory stays bounded for long inputs")
+    parser.add_argument("--preview", action="store_true",
+                        help="Render only a short representative excerpt (GENRE_AI_PREVIEW_SECONDS long)")
+    parser.add_argument("--segment", type=int,
+                        help="Render only this GENRE_AI_SEGMENT_SECONDS-long segment, as raw 16-bit PCM")
+    args = parser.parse_args()
     
-    print(f"[PYTHON] Starting transformation of {input_file} to {target_genre}")
+    input_file = args.input_file
+    target_genres = [genre.strip() for genre in args.target_genre.split(',') if genre.strip()]
+    output_files = batch_output_files(args.output_file, target_genres)
+    
+    print(f"[PYTHON] Starting transformation of {input_file} to {', '.join(target_genres)}")
     
     if not os.path.exists(input_file):
         print(f"[PYTHON] ERROR: Input file does not exist: {input_file}")
         sys.exit(1)
         
-    success = transform_genre(input_file, output_file, target_genre)
+    if len(target_genres) == 1 or args.stream or args.preview or args.segment is not None:
+        success = all([transform_genre(input_file, output_file, genre, stream=args.stream, preview=args.preview,
+                                       segment=args.segment)
+                       for genre, output_file in output_files.items()])
+    else:
+        results = transform_genres(input_file, output_files)
+        success = all(result['success'] for result in results.values())
     sys.exit(0 if success else 1)
\ No newline at end of file
@@ -0,0 +1,109 @@
+"""
+Content-addressed on-disk cache of separated stems.
+
+Stems only depend on the decoded audio and the separator model, not on the
+target genre, so re-rendering an upload into another genre can skip
+separation entirely. Each entry is a directory named after the audio hash
+holding one float32 .npy file per stem; entries are memory-mapped on read and
+evicted least-recently-used once the cache grows past its size limit.
+
+Configuration:
+    GENRE_AI_STEM_CACHE_DIR   cache location (default: <repo>/.cache/stems)
+    GENRE_AI_STEM_CACHE_MB    size limit in MB, 0 disables the cache (default: 2048)
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+
+from stems import STEM_NAMES
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'stems')
+DEFAULT_MAX_MB = 2048
+
+def audio_key(waveform, model, sample_rate):
+    """Hash the decoded audio together with the model that will separate it"""
+    digest = hashlib.sha256()
+    digest.update(f"{model}:{sample_rate}:{waveform.shape}:{waveform.dtype}".encode())
+    digest.update(memoryview(np.ascontiguousarray(waveform)).cast('B'))
+    return digest.hexdigest()
+
+class StemCache:
+    """Directory of cached stem sets with a total size limit and LRU eviction"""
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    def key(self, waveform, model, sample_rate):
+        return audio_key(waveform, model, sample_rate)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def get(self, key):
+        """Return memory-mapped stems for key, or None on a miss"""
+        entry_dir = self._entry_dir(key)
+        paths = {name: os.path.join(entry_dir, f"{name}.npy") for name in STEM_NAMES}
+        if not all(os.path.exists(path) for path in paths.values()):
+            return None
+
+        # Mark as recently used; the directory mtime is the LRU clock
+        now = time.time()
+        os.utime(entry_dir, (now, now))
+
+        # Copy-on-write maps so effects that modify a stem in place never touch the cache
+        return {name: np.load(path, mmap_mode='c') for name, path in paths.items()}
+
+    def put(self, key, stems):
+        """Store a stem set under key and evict old entries if over the limit"""
+        entry_dir = self._entry_dir(key)
+        if os.path.isdir(entry_dir):
+            return
+
+        # Write into a scratch dir first so readers never see a partial entry
+        staging_dir = tempfile.mkdtemp(dir=self.root, prefix='.incoming-')
+        try:
+            for name in STEM_NAMES:
+                np.save(os.path.join(staging_dir, f"{name}.npy"), np.asarray(stems[name], dtype=np.float32))
+            os.replace(staging_dir, entry_dir)
+        except OSError:
+            # Another process stored the same key first
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            entry_dir = os.path.join(self.root, name)
+            if name.startswith('.') or not os.path.isdir(entry_dir):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(entry_dir))
+            entries.append((os.stat(entry_dir).st_mtime, size, entry_dir))
+            total += size
+
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            print(f"[PYTHON] Evicted cached stems {os.path.basename(entry_dir)}")
+
+_default_cache = None
+
+def get_stem_cache():
+    """Return the cache configured by the environment, or None if disabled"""
+    global _default_cache
+    max_mb = float(os.environ.get('GENRE_AI_STEM_CACHE_MB', DEFAULT_MAX_MB))
+    if max_mb <= 0:
+        return None
+    if _default_cache is None:
+        root = os.environ.get('GENRE_AI_STEM_CACHE_DIR', DEFAULT_CACHE_DIR)
+        _default_cache = StemCache(root, int(max_mb * 1024 * 1024))
+    return _default_cache
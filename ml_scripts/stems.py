@@ -0,0 +1,72 @@
+import os
+import numpy as np
+import soundfile as sf
+from audio_codec import decode
+from tracing import span
+
+SEPARATOR_MODEL = 'spleeter:4stems'
+SEPARATOR_SAMPLE_RATE = 44100
+STEM_NAMES = ('vocals', 'drums', 'bass', 'other')
+
+# Separators are expensive to build (TensorFlow import, graph construction and
+# checkpoint restore), so keep one per model for the lifetime of the process.
+_separators = {}
+
+def get_separator(model=SEPARATOR_MODEL):
+    """Return the process-wide Spleeter separator for model, creating it on first use"""
+    separator = _separators.get(model)
+    if separator is None:
+        from spleeter.separator import Separator
+        print(f"[PYTHON] Loading Spleeter separator '{model}'...")
+        separator = Separator(model)
+        _separators[model] = separator
+    return separator
+
+def warm_up(model=SEPARATOR_MODEL, sample_rate=SEPARATOR_SAMPLE_RATE):
+    """Run one tiny separation so the model graph and checkpoint are loaded up front"""
+    separator = get_separator(model)
+    separator.separate(np.zeros((sample_rate, 2), dtype=np.float32))
+    return separator
+
+def load_waveform(input_file, sample_rate=SEPARATOR_SAMPLE_RATE, offset=0.0, duration=None):
+    """Decode input_file, or the range given in seconds, into the (n_samples, 2) float32 layout the separator expects"""
+    audio, _ = decode(input_file, sr=sample_rate, offset=offset, duration=duration)
+    if audio.shape[1] == 1:
+        audio = np.repeat(audio, 2, axis=1)
+    return np.ascontiguousarray(audio[:, :2])
+
+def separate_stems(waveform, separator=None, debug_dir=None, sample_rate=SEPARATOR_SAMPLE_RATE,
+                   model=SEPARATOR_MODEL, cache=None):
+    """Separate a stereo waveform into mono float32 stems without touching disk
+
+    With a StemCache, stems for audio that was separated before are returned
+    from the cache and the separator is never loaded. When debug_dir is given
+    (or GENRE_AI_STEM_DEBUG_DIR is set) the stems are also written there as
+    WAV files for inspection.
+    """
+    with span('separate', samples=len(waveform), model=model) as record:
+        stems = None
+        if cache is not None:
+            key = cache.key(waveform, model, sample_rate)
+            stems = cache.get(key)
+            if stems is not None:
+                print(f"[PYTHON] Reusing cached stems {key[:12]}")
+        record['cached'] = stems is not None
+
+        if stems is None:
+            separator = separator or get_separator(model)
+            prediction = separator.separate(waveform)
+
+            # Downmix to mono like the whole-track decode so the effect chains see the same signals
+            stems = {name: prediction[name].mean(axis=1).astype(np.float32) for name in STEM_NAMES}
+            if cache is not None:
+                cache.put(key, stems)
+
+    debug_dir = debug_dir or os.environ.get('GENRE_AI_STEM_DEBUG_DIR')
+    if debug_dir:
+        os.makedirs(debug_dir, exist_ok=True)
+        for name, stem in stems.items():
+            sf.write(os.path.join(debug_dir, f"{name}.wav"), stem, sample_rate)
+        print(f"[PYTHON] Dumped stems to {debug_dir}")
+
+    return stems
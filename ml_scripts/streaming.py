@@ -0,0 +1,137 @@
+"""
+Streaming render mode.
+
+Decodes, processes and encodes a track in blocks so peak memory stays flat no
+matter how long the input is. Every block is processed together with a
+pre-roll of the audio before it, which brings stateful effects (reverb tails,
+filters, compressor envelopes, HPSS and separation context) to the state they
+would have had in a whole-track render. The last post-roll of each block is
+held back rather than written: effects that look ahead (the centred
+concert-hall reverb, zero-phase filters, the resampler) have no future input
+there, so the next block renders it again from its pre-roll. Consecutive
+blocks are joined with a raised-cosine crossfade just before that post-roll
+so the seams are inaudible; both sides of a seam carry the same warmed-up
+signal, so the fade gains sum to one rather than keeping equal power.
+
+A streamed render can't know the track's peak in advance, so instead of
+normalizing the whole mix the output goes through a soft limiter.
+"""
+import numpy as np
+import soxr
+import progress
+from audio_codec import open_decoder, open_encoder
+from reverb import CONCERT_HALL_SECONDS, lookahead_seconds
+
+BLOCK_SECONDS = 30.0
+# Longest lookahead of any effect chain: the centred concert-hall reverb, plus
+# room for zero-phase filters, the EQ's linear-phase FIR and the resampler
+POSTROLL_SECONDS = lookahead_seconds(CONCERT_HALL_SECONDS, 'same') + 0.25
+CROSSFADE_SECONDS = 0.5
+# Covers the post-roll and crossfade and still leaves the 2 s concert-hall IR
+# room to warm up before the seam
+PREROLL_SECONDS = CONCERT_HALL_SECONDS + POSTROLL_SECONDS + CROSSFADE_SECONDS
+LIMIT_CEILING = 0.95
+
+def iter_blocks(handle, sr, block_size, preroll, channels=1):
+    """Yield (block, n_preroll) pairs covering the file in order
+
+    Each block holds up to block_size new samples preceded by up to preroll
+    samples of the audio before them. Audio is resampled to sr on the fly and
+    returned as 1-D for channels=1, otherwise as (n_samples, channels).
+    """
+    resampler = None
+    if handle.samplerate != sr:
+        resampler = soxr.ResampleStream(handle.samplerate, sr, channels, dtype='float32')
+    read_frames = max(int(block_size * handle.samplerate / sr), 1)
+
+    pending = np.zeros((0, channels), dtype=np.float32)
+    context = np.zeros((0, channels), dtype=np.float32)
+    while True:
+        data = handle.read(read_frames, dtype='float32', always_2d=True)
+        last = len(data) < read_frames
+        data = match_channels(data, channels)
+        if resampler is not None:
+            data = resampler.resample_chunk(data, last=last).reshape(-1, channels)
+        pending = np.concatenate([pending, data])
+
+        while len(pending) >= block_size or (last and len(pending)):
+            block = np.concatenate([context, pending[:block_size]])
+            pending = pending[block_size:]
+            yield (block[:, 0] if channels == 1 else block), len(context)
+            context = block[len(block) - min(preroll, len(block)):]
+
+        if last:
+            break
+
+def match_channels(data, channels):
+    if data.shape[1] == channels:
+        return data
+    if channels == 1:
+        return data.mean(axis=1, keepdims=True)
+    if data.shape[1] == 1:
+        return np.repeat(data, channels, axis=1)
+    return data[:, :channels]
+
+def soft_limit(audio, ceiling=LIMIT_CEILING, knee=0.8):
+    """Leave audio below knee * ceiling untouched and bend peaks above it smoothly toward ceiling"""
+    threshold = knee * ceiling
+    room = ceiling - threshold
+    over = np.abs(audio) - threshold
+    limited = np.sign(audio) * (threshold + room * np.tanh(np.maximum(over, 0) / room))
+    return np.where(over > 0, limited, audio).astype(np.float32)
+
+def render_stream(input_file, output_file, process_block, sr=None, channels=1,
+                  block_seconds=BLOCK_SECONDS, preroll_seconds=PREROLL_SECONDS,
+                  crossfade_seconds=CROSSFADE_SECONDS, postroll_seconds=POSTROLL_SECONDS):
+    """Render input_file to output_file block by block
+
+    process_block(block, sr) receives each block including its pre-roll and
+    must return mono audio of the same length. sr defaults to the file's rate.
+    """
+    with open_decoder(input_file) as handle:
+        sr = sr or handle.samplerate
+        block_size = int(block_seconds * sr)
+        preroll = int(preroll_seconds * sr)
+        postroll = min(int(postroll_seconds * sr), preroll)
+        fade = min(int(crossfade_seconds * sr), preroll - postroll)
+        # The ffmpeg pipe doesn't know its length, so progress is only reported for soundfile inputs
+        total = getattr(handle, 'frames', 0) * sr / handle.samplerate
+        print(f"[PYTHON] Streaming render in {block_seconds:.0f}s blocks at {sr}Hz")
+
+        # The previous block's crossfade samples and the post-roll after them
+        held = tail = None
+        n_blocks = 0
+        rendered = 0
+        with open_encoder(output_file, sr, channels=1) as writer:
+            for block, n_preroll in iter_blocks(handle, sr, block_size, preroll, channels):
+                processed = np.zeros(len(block), dtype=np.float32)
+                result = np.asarray(process_block(block, sr))[:len(block)]
+                processed[:len(result)] = result
+
+                # Crossfade the previous block's held samples with this block's warmed-up pre-roll,
+                # then take the post-roll from this block, which has the audio after it
+                if held is not None:
+                    resume = n_preroll - len(tail)
+                    if len(held) and resume >= len(held):
+                        fade_in = np.sin(np.linspace(0, 0.5 * np.pi, len(held))) ** 2
+                        seam = processed[resume - len(held):resume]
+                        held = held * (1 - fade_in) + seam * fade_in
+                    writer.write(soft_limit(held))
+                    writer.write(soft_limit(processed[resume:n_preroll]))
+
+                main = processed[n_preroll:]
+                split = len(main) - min(fade + postroll, len(main))
+                writer.write(soft_limit(main[:split]))
+                held = main[split:split + fade]
+                tail = main[split + len(held):]
+                n_blocks += 1
+                rendered += len(main)
+                if total:
+                    progress.advance('stream', rendered / total)
+
+            # Nothing follows the last block, just as nothing follows the track in a whole render
+            if held is not None:
+                writer.write(soft_limit(np.concatenate([held, tail])))
+
+    print(f"[PYTHON] Streamed {n_blocks} blocks to {output_file}")
+    return True
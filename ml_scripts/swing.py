@@ -0,0 +1,77 @@
+"""
+Swing by global time warp.
+
+The beat grid defines one piecewise-linear map from output time to input
+time: every beat stays where it is and the off-beat eighth between two
+beats is pushed later, to (1 + swing_amount) / 2 of the way through the
+beat, so 0.33 gives a triplet feel. The whole signal is played back along
+that map in a single phase-vocoder pass whose read position varies frame by
+frame. The overlap-add of the STFT frames crossfades every segment boundary,
+and the cost is proportional to the track length, not to the number of
+beats.
+"""
+import numpy as np
+import librosa
+
+# Short frames: swing is applied to percussive material, where longer ones smear transients
+N_FFT = 512
+HOP_LENGTH = 128
+# Output frames synthesized per step; bounds the temporaries
+FRAME_BLOCK = 512
+
+def swing_map(beat_samples, swing_amount, length):
+    """Anchor points (output sample, input sample) of the swing time map"""
+    beats = np.unique(np.clip(np.asarray(beat_samples, dtype=np.float64), 0, length))
+    beats = beats[np.r_[True, np.diff(beats) >= 2]]
+    starts, ends = beats[:-1], beats[1:]
+    midpoints = (starts + ends) / 2
+    swung = starts + (ends - starts) * (1 + swing_amount) / 2
+
+    output_anchors = np.concatenate([[0], np.column_stack([starts, swung]).ravel(), beats[-1:], [length]])
+    input_anchors = np.concatenate([[0], np.column_stack([starts, midpoints]).ravel(), beats[-1:], [length]])
+    keep = np.r_[True, np.diff(output_anchors) > 0]
+    return output_anchors[keep], input_anchors[keep]
+
+def time_warp(audio, output_anchors, input_anchors, stft=None, n_fft=N_FFT, hop_length=HOP_LENGTH):
+    """Play audio back along a piecewise-linear time map in one phase-vocoder pass
+
+    Output sample output_anchors[k] takes its content from input sample
+    input_anchors[k], interpolating linearly in between. Pass the audio's
+    STFT (with the same n_fft and hop_length) to reuse an existing analysis.
+    """
+    if stft is None:
+        stft = librosa.stft(audio, n_fft=n_fft, hop_length=hop_length)
+    n_bins, n_frames = stft.shape
+
+    # Fractional input frame that each output frame reads from
+    steps = np.interp(np.arange(n_frames) * hop_length, output_anchors, input_anchors) / hop_length
+    steps = np.clip(steps, 0, n_frames - 1)
+    # Expected phase advance of each bin over one hop
+    expected = np.linspace(0, np.pi * hop_length, n_bins)[:, None]
+
+    warped = np.empty_like(stft)
+    phase = np.angle(stft[:, int(steps[0])]).astype(np.float64)
+    for start in range(0, n_frames, FRAME_BLOCK):
+        block = steps[start:start + FRAME_BLOCK]
+        index = block.astype(np.int64)
+        alpha = block - index
+        left = stft[:, index]
+        right = stft[:, np.minimum(index + 1, n_frames - 1)]
+
+        magnitude = (1 - alpha) * np.abs(left) + alpha * np.abs(right)
+        deviation = np.angle(right).astype(np.float64) - np.angle(left) - expected
+        deviation -= 2 * np.pi * np.round(deviation / (2 * np.pi))
+        increments = deviation + expected
+
+        # Each frame uses the phase accumulated before its own increment
+        accumulated = phase[:, None] + np.cumsum(increments, axis=1) - increments
+        warped[:, start:start + len(block)] = magnitude * np.exp(1j * accumulated)
+        phase = np.mod(accumulated[:, -1] + increments[:, -1], 2 * np.pi)
+
+    return librosa.istft(warped, hop_length=hop_length, n_fft=n_fft, length=len(audio))
+
+def swing(audio, sr, beat_frames, swing_amount=0.33, beat_hop_length=512):
+    """Swing audio's eighth notes against a beat grid given as frame indices"""
+    beat_samples = librosa.frames_to_samples(beat_frames, hop_length=beat_hop_length)
+    output_anchors, input_anchors = swing_map(beat_samples, swing_amount, len(audio))
+    return time_warp(audio, output_anchors, input_anchors)
@@ -0,0 +1,146 @@
+"""
+Per-stage tracing.
+
+span() times one stage of a render (decode, separate, effects, mix,
+normalize, encode) and, when the stage ends, writes it as one JSON line
+prefixed with [TRACE]:
+
+    [TRACE] {"trace": "7", "span": "separate", "parent": "job", "ms": 812.4,
+             "samples": 1323000, "rss_mb": 640.2, "peak_rss_mb": 702.9, "peak_growth_mb": 188.0}
+
+trace is the id set with trace() (the worker uses its job id) and parent the
+enclosing span. rss_mb is the resident size when the stage ended,
+peak_rss_mb the process's high-water mark at that point and peak_growth_mb
+how far the stage raised it, so the stage that sets a render's peak stands
+out. The memory fields are null where the platform can't report them
+(resident size needs /proc, the peak the Unix resource module). collect()
+also gathers the records, which is how the worker returns them with each
+reply.
+
+Spans nest through context variables. Thread pools must run tasks in a copy
+of the submitting context, and worker processes can be given current() and
+pick it up again with resume(). observe() calls back as stages start and end,
+which progress.py uses. GENRE_AI_TRACE=0 turns the lines off.
+"""
+import contextlib
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    # Windows has no resource module, so spans there carry no peak memory
+    resource = None
+
+PREFIX = '[TRACE] '
+
+_trace_id = contextvars.ContextVar('trace_id', default=None)
+_parent = contextvars.ContextVar('parent_span', default=None)
+_collector = contextvars.ContextVar('trace_collector', default=None)
+_observer = contextvars.ContextVar('trace_observer', default=None)
+_write_lock = threading.Lock()
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+_MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+def enabled():
+    return os.environ.get('GENRE_AI_TRACE', '1') != '0'
+
+def current():
+    """(trace id, span name) of the caller, to hand to resume() in another process"""
+    return _trace_id.get(), _parent.get()
+
+@contextlib.contextmanager
+def resume(context):
+    """Continue the trace described by a current() result"""
+    trace_id, parent = context
+    trace_token = _trace_id.set(trace_id)
+    parent_token = _parent.set(parent)
+    try:
+        yield
+    finally:
+        _parent.reset(parent_token)
+        _trace_id.reset(trace_token)
+
+def trace(trace_id):
+    """Tag every span started inside with trace_id"""
+    return resume((None if trace_id is None else str(trace_id), None))
+
+@contextlib.contextmanager
+def collect():
+    """Gather the records of spans that end inside, in the order they end"""
+    records = []
+    token = _collector.set(records)
+    try:
+        yield records
+    finally:
+        _collector.reset(token)
+
+@contextlib.contextmanager
+def observe(callback):
+    """Call callback('start', name, attrs) and callback('end', name, record) for spans inside"""
+    token = _observer.set(callback)
+    try:
+        yield
+    finally:
+        _observer.reset(token)
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """Time the enclosed stage
+
+    attrs, plus anything set on the yielded dict (e.g. the number of samples
+    once it is known), are reported with the span.
+    """
+    record = dict(attrs)
+    parent = _parent.get()
+    observer = _observer.get()
+    if observer is not None:
+        observer('start', name, record)
+    token = _parent.set(name)
+    peak_before = _peak_rss()
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        _parent.reset(token)
+        peak = _peak_rss()
+        growth = None if peak is None else _mb(peak - peak_before)
+        record = {'trace': _trace_id.get(), 'span': name, 'parent': parent, 'ms': round(elapsed * 1000, 2),
+                  **record, 'rss_mb': _rss(), 'peak_rss_mb': _mb(peak), 'peak_growth_mb': growth}
+        records = _collector.get()
+        if records is not None:
+            records.append(record)
+        if observer is not None:
+            observer('end', name, record)
+        if enabled():
+            emit(record)
+
+def emit(record, prefix=PREFIX):
+    """Write record as one prefixed JSON line"""
+    line = prefix + json.dumps(record, default=str) + '\n'
+    with _write_lock:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+def _peak_rss():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+
+def _rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return _mb(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE'))
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _mb(n_bytes):
+    return None if n_bytes is None else round(n_bytes / 2 ** 20, 1)
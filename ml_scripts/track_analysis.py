@@ -0,0 +1,249 @@
+"""
+Shared per-track analysis.
+
+The style pipelines all need the same STFT, harmonic/percussive split, onset
+envelope and beat grid. TrackAnalysis computes each of these on first use and
+memoizes it, so every stage of a render - and every genre rendered from the
+same upload in one process - shares a single computation.
+
+Analysis that doesn't need the top octave - onsets, beat tracking and the
+HPSS median-filter masks - runs on a downsampled copy of the audio (made once
+per track with soxr) at GENRE_AI_ANALYSIS_SAMPLE_RATE, 22.05 kHz by default.
+Its results are mapped back to the native rate: beat and onset positions are
+rescaled, and the masks are applied to the full-rate STFT, so the harmonic
+and percussive signals keep their full bandwidth.
+
+get_analysis keeps recent analyses in memory up to GENRE_AI_ANALYSIS_MEMORY_MB
+(default 512). The spectrograms and the analysis-rate copy are dropped once a
+render is done with them (release_spectra), since they are the bulk of an
+analysis and cheap to recompute next to the features derived from them.
+
+Results can also be kept on disk, keyed by a hash of the audio, by setting
+GENRE_AI_ANALYSIS_CACHE_DIR. The beat grid is also kept next to the upload
+when beat_grid_path is set.
+"""
+import collections
+import hashlib
+import os
+import numpy as np
+import librosa
+import soxr
+from beat_grid import BeatGrid, compute_beat_grid, load_beat_grid, save_beat_grid
+
+# How much analysis get_analysis keeps in memory; the most recent track always stays
+MAX_CACHED_BYTES = float(os.environ.get('GENRE_AI_ANALYSIS_MEMORY_MB', 512)) * 2 ** 20
+ANALYSIS_SAMPLE_RATE = int(os.environ.get('GENRE_AI_ANALYSIS_SAMPLE_RATE', 22050))
+# librosa's STFT defaults, which the full-rate signals are synthesized with
+N_FFT = 2048
+HOP_LENGTH = 512
+
+def downsample(audio, sr, analysis_sr=ANALYSIS_SAMPLE_RATE):
+    """(audio, sr) at analysis_sr, or unchanged when it is already that low"""
+    if sr <= analysis_sr:
+        return audio, sr
+    return soxr.resample(audio, sr, analysis_sr, quality='MQ'), analysis_sr
+
+def hpss_masks(audio, sr, n_frames, analysis_sr=ANALYSIS_SAMPLE_RATE):
+    """Harmonic and percussive soft masks for the (N_FFT, HOP_LENGTH) STFT of audio
+
+    The median filtering runs on the spectrogram of a downsampled copy whose
+    window and hop span the same time, so bins and frames line up with the
+    full-rate ones. Each full-rate cell takes the mask of the nearest cell;
+    bins above the analysis Nyquist take the top bin's.
+    """
+    low, low_sr = downsample(audio, sr, analysis_sr)
+    scale = low_sr / sr
+    n_fft = 2 * max(round(N_FFT * scale / 2), 1)
+    hop_length = max(round(HOP_LENGTH * scale), 1)
+    spectrum = np.abs(librosa.stft(low, n_fft=n_fft, hop_length=hop_length))
+    harmonic, percussive = librosa.decompose.hpss(spectrum, mask=True)
+
+    bins = np.arange(N_FFT // 2 + 1) * (sr / N_FFT) / (low_sr / n_fft)
+    frames = np.arange(n_frames) * (HOP_LENGTH / sr) / (hop_length / low_sr)
+    rows = np.minimum(np.round(bins).astype(int), spectrum.shape[0] - 1)
+    cols = np.minimum(np.round(frames).astype(int), spectrum.shape[1] - 1)
+    return harmonic[np.ix_(rows, cols)], percussive[np.ix_(rows, cols)]
+
+def hpss(audio, sr, stft=None, analysis_sr=ANALYSIS_SAMPLE_RATE):
+    """Full-bandwidth harmonic and percussive parts of audio, with masks from analysis_sr"""
+    if stft is None:
+        stft = librosa.stft(audio, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    harmonic, percussive = hpss_masks(audio, sr, stft.shape[1], analysis_sr)
+    return (librosa.istft(stft * harmonic, hop_length=HOP_LENGTH, length=len(audio)),
+            librosa.istft(stft * percussive, hop_length=HOP_LENGTH, length=len(audio)))
+
+class TrackAnalysis:
+    """Lazily computed, memoized analysis of one track"""
+
+    def __init__(self, audio, sr, cache_dir=None, beat_grid_path=None):
+        self.audio = audio
+        self.sr = sr
+        self.cache_dir = cache_dir
+        self.beat_grid_path = beat_grid_path
+        self._key = None
+        self._results = {}
+        # Results that are only kept until release_spectra()
+        self._transient = set()
+
+    @property
+    def key(self):
+        """Hash of the audio and sample rate, used for the on-disk tier"""
+        if self._key is None:
+            self._key = track_key(self.audio, self.sr)
+        return self._key
+
+    def _memo(self, name, compute, persist=True):
+        return self._memo_many((name,), lambda: (compute(),), persist)[0]
+
+    def _memo_many(self, names, compute, persist=True):
+        """Memoize several results produced by one computation"""
+        if all(name in self._results for name in names):
+            return tuple(self._results[name] for name in names)
+
+        paths = None
+        if persist and self.cache_dir:
+            paths = [os.path.join(self.cache_dir, self.key, f"{name}.npy") for name in names]
+            if all(os.path.exists(path) for path in paths):
+                values = tuple(np.load(path) for path in paths)
+                self._results.update(zip(names, values))
+                return values
+
+        values = tuple(np.asarray(value) for value in compute())
+        for name, value in zip(names, values):
+            # Shared between stages, so nobody may modify it in place
+            value.setflags(write=False)
+            self._results[name] = value
+            if not persist:
+                self._transient.add(name)
+
+        if paths is not None:
+            os.makedirs(os.path.dirname(paths[0]), exist_ok=True)
+            for path, value in zip(paths, values):
+                np.save(path, value)
+        return values
+
+    @property
+    def nbytes(self):
+        """Memory held by the audio and the results computed so far"""
+        arrays = [self.audio] + [value for value in self._results.values() if isinstance(value, np.ndarray)]
+        return sum(array.nbytes for array in arrays)
+
+    def release_spectra(self):
+        """Drop the results that are large and recomputable (STFTs, the analysis-rate copy)"""
+        for name in self._transient:
+            self._results.pop(name, None)
+        self._transient.clear()
+
+    @property
+    def stft(self):
+        # Too large to be worth keeping on disk; everything derived from it is
+        return self._memo('stft', lambda: librosa.stft(self.audio, n_fft=N_FFT, hop_length=HOP_LENGTH),
+                          persist=False)
+
+    @property
+    def analysis_audio(self):
+        """The audio at the analysis rate (see analysis_sr)"""
+        if self.sr <= ANALYSIS_SAMPLE_RATE:
+            return self.audio
+        return self._memo('analysis_audio', lambda: downsample(self.audio, self.sr)[0], persist=False)
+
+    @property
+    def analysis_sr(self):
+        return min(self.sr, ANALYSIS_SAMPLE_RATE)
+
+    def _hpss(self):
+        return hpss(self.audio, self.sr, stft=self.stft)
+
+    @property
+    def harmonic(self):
+        return self._memo_many(('harmonic', 'percussive'), self._hpss)[0]
+
+    @property
+    def percussive(self):
+        return self._memo_many(('harmonic', 'percussive'), self._hpss)[1]
+
+    @property
+    def harmonic_refined(self):
+        """Second harmonic pass over the harmonic component"""
+        return self._memo('harmonic_refined', lambda: hpss(self.harmonic, self.sr)[0])
+
+    @property
+    def percussive_stft(self):
+        return self._memo('percussive_stft', lambda: librosa.stft(self.percussive), persist=False)
+
+    @property
+    def onset_envelope(self):
+        """Onset strength of the analysis-rate audio, in frames of HOP_LENGTH at analysis_sr"""
+        return self._memo('onset_envelope', lambda: librosa.onset.onset_strength(
+            y=self.analysis_audio, sr=self.analysis_sr, hop_length=HOP_LENGTH))
+
+    def _beat_grid_paths(self):
+        paths = [self.beat_grid_path] if self.beat_grid_path else []
+        if self.cache_dir:
+            paths.append(os.path.join(self.cache_dir, self.key, 'beat_grid.json'))
+        return paths
+
+    @property
+    def beat_grid(self):
+        """Tempo, beats and onsets in samples, loaded from disk when saved for this audio"""
+        if 'beat_grid' not in self._results:
+            paths = self._beat_grid_paths()
+            grid = None
+            for path in paths:
+                grid = load_beat_grid(path, self.key)
+                if grid is not None:
+                    break
+            if grid is None:
+                grid = compute_beat_grid(self.analysis_audio, self.analysis_sr,
+                                         onset_envelope=self.onset_envelope, hop_length=HOP_LENGTH)
+                # Positions come back in analysis-rate samples
+                scale = self.sr / self.analysis_sr
+                grid = BeatGrid(self.sr, grid.tempo, np.round(grid.beats * scale), np.round(grid.onsets * scale))
+                for path in paths:
+                    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                    save_beat_grid(grid, path, self.key)
+            self._results['beat_grid'] = grid
+        return self._results['beat_grid']
+
+    @property
+    def tempo(self):
+        return self.beat_grid.tempo
+
+    @property
+    def beat_frames(self):
+        return librosa.samples_to_frames(self.beat_grid.beats)
+
+def track_key(audio, sr):
+    digest = hashlib.sha256(f"{sr}:{audio.shape}:{audio.dtype}".encode())
+    digest.update(memoryview(np.ascontiguousarray(audio)).cast('B'))
+    return digest.hexdigest()
+
+_analyses = collections.OrderedDict()
+
+def get_analysis(audio, sr, beat_grid_path=None):
+    """Return the shared analysis for this audio, reusing one from an earlier render
+
+    beat_grid_path is where the track's beat grid is kept, normally next to the upload.
+    """
+    key = track_key(audio, sr)
+    analysis = _analyses.get(key)
+    if analysis is None:
+        analysis = TrackAnalysis(audio, sr, cache_dir=os.environ.get('GENRE_AI_ANALYSIS_CACHE_DIR'))
+        analysis._key = key
+        _analyses[key] = analysis
+    else:
+        _analyses.move_to_end(key)
+    # Only the track being rendered needs its spectrograms
+    for other in _analyses.values():
+        if other is not analysis:
+            other.release_spectra()
+    while len(_analyses) > 1 and sum(cached.nbytes for cached in _analyses.values()) > MAX_CACHED_BYTES:
+        _analyses.popitem(last=False)
+    if beat_grid_path is not None:
+        analysis.beat_grid_path = beat_grid_path
+    return analysis
+
+def release_spectra():
+    """Drop the spectrograms of every cached analysis, once a render no longer needs them"""
+    for analysis in _analyses.values():
+        analysis.release_spectra()
@@ -2,9 +2,7 @@ import sys
 import os
 import librosa
 import numpy as np
-import soundfile as sf
-import tensorflow as tf
-from tensorflow.keras.models import load_model
+from audio_codec import decode, encode
 import argparse
 
 # Parse arguments
@@ -18,7 +16,6 @@ args = parser.parse_args()
 input_file = args.input_file
 output_file = args.output_file
 target_genre = args.target_genre
-model_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models')
 
 print(f"Processing: {input_file} -> {output_file} (Genre: {target_genre})")
 
@@ -27,7 +24,7 @@ print(f"Processing: {input_file} -> {output_file} (Genre: {target_genre})")
 try:
     # Load the audio
     print("Loading audio...")
-    y, sr = librosa.load(input_file, sr=None)
+    y, sr = decode(input_file, mono=True)
     
     # Example transformation based on target genre
     # This is a very simplified example - a real model would be much more sophisticated
@@ -67,7 +64,7 @@ try:
     
     # Save the transformed audio
     print(f"Saving transformed audio to {output_file}...")
-    sf.write(output_file, y, sr)
+    encode(output_file, y, sr)
     
     print("Audio transformation complete!")
     sys.exit(0)
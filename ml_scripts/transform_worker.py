@@ -0,0 +1,202 @@
+"""
+Long-lived transform worker.
+
+Keeps the Spleeter separator and librosa loaded and answers transform jobs over
+a line-delimited JSON protocol, so each upload skips the interpreter, TensorFlow
+and checkpoint cold start.
+
+Each request is one JSON object per line:
+    {"id": "abc", "input_file": "...", "output_file": "...", "target_genre": "rock"}
+with an optional "stream": true to render long inputs in bounded memory, or
+"preview": true to render only a short excerpt (spleeter and magenta scripts),
+and each reply is one JSON object per line:
+    {"id": "abc", "success": true, "elapsed": 4.21}
+While the job runs, [PROGRESS] lines on stderr report its stage, fraction
+done and ETA (see progress.py). The reply's "trace" list holds the job's
+per-stage spans (see tracing.py), which are also logged as [TRACE] lines.
+
+A batch job renders several genres from one decode and separation:
+    {"id": "abc", "input_file": "...", "output_files": {"rock": "...", "jazz": "..."}}
+and its reply adds per-genre results:
+    {"id": "abc", "success": true, "elapsed": 9.8, "results": {"rock": {"success": true, "elapsed": 2.1}, ...}}
+Replies and per-genre results carry "fallback": true when the output came
+from a degraded path (simple effects or a copy of the input) instead.
+
+A segmented render (see segments.py) asks for its shape first:
+    {"id": "abc", "input_file": "...", "layout": true}
+    {"id": "abc", "success": true, "layout": {"sr": 44100, "frames": 9261000, "segment_frames": 441000, ...}}
+and then for single segments, in any order, with "segment": N on a
+transform job; output_file receives that segment as raw PCM.
+
+Usage:
+    python transform_worker.py                 # serve jobs on stdin/stdout
+    python transform_worker.py --socket PATH   # serve jobs on a Unix socket
+"""
+import argparse
+import importlib
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+
+import librosa
+
+import progress
+import segments
+import stems
+import track_analysis
+import tracing
+
+# script name -> (module, transform function)
+TRANSFORMS = {
+    'spleeter': ('spleeter_transform', 'transform_genre'),
+    'process_audio': ('process_audio', 'transform_genre'),
+    'simple': ('simple_transform', 'transform_genre'),
+    'magenta_inspired': ('magenta_inspired', 'transform_with_genre_effects'),
+    'magenta': ('magenta_transform', 'transform_with_magenta'),
+}
+
+# The separator is not safe to share between concurrent jobs
+_job_lock = threading.Lock()
+
+def run_job(job):
+    """Run a single transform job and return the reply object"""
+    if job.get('layout'):
+        return run_layout(job)
+    job_id = job.get('id')
+    start_time = time.time()
+    script = job.get('script', 'spleeter')
+    # Every stage's [TRACE] line carries the job id
+    with tracing.trace(job_id), tracing.collect() as spans, \
+            tracing.span('job', script=script, batch='output_files' in job):
+        try:
+            if script not in TRANSFORMS:
+                raise ValueError(f"Unknown transform script: {script}")
+            module_name, function_name = TRANSFORMS[script]
+            module = importlib.import_module(module_name)
+            transform = getattr(module, function_name)
+
+            # Previews and segments are short, so they never need streaming
+            if job.get('segment') is not None:
+                options = {'segment': int(job['segment'])}
+            elif job.get('preview'):
+                options = {'preview': True}
+            else:
+                options = {'stream': True} if job.get('stream') else {}
+
+            genres = len(job['output_files']) if 'output_files' in job else 1
+            shared = genres > 1 and hasattr(module, 'transform_genres') and not options
+            stages = progress.plan(script, genres, shared=shared, stream='stream' in options,
+                                   preview='preview' in options, segment='segment' in options)
+
+            with _job_lock, progress.track(stages):
+                try:
+                    if 'output_files' in job:
+                        results = run_batch(module, transform, job['input_file'], job['output_files'], options)
+                        reply = {'id': job_id, 'success': all(r['success'] for r in results.values()), 'results': results}
+                    else:
+                        success = transform(job['input_file'], job['output_file'], job['target_genre'], **options)
+                        reply = {'id': job_id, 'success': bool(success)}
+                finally:
+                    # Keep the compact analysis of recent tracks, not their spectrograms, between jobs
+                    track_analysis.release_spectra()
+        except Exception as e:
+            print(f"[PYTHON] Worker job {job_id} failed: {str(e)}")
+            print(f"[PYTHON] Traceback: {traceback.format_exc()}")
+            reply = {'id': job_id, 'success': False, 'error': str(e)}
+
+    reply['elapsed'] = round(time.time() - start_time, 3)
+    reply['trace'] = spans
+    # Output written by a fallback path is usable but must not be cached as the real render
+    fallback = {span.get('genre') for span in spans if span['span'] == 'fallback'}
+    reply['fallback'] = bool(fallback)
+    for genre, result in reply.get('results', {}).items():
+        result['fallback'] = genre in fallback
+    return reply
+
+def run_layout(job):
+    """Answer a layout request with the shape of a segmented render of the input"""
+    try:
+        return {'id': job.get('id'), 'success': True, 'layout': segments.layout(job['input_file'])}
+    except Exception as e:
+        print(f"[PYTHON] Layout of {job.get('input_file')} failed: {str(e)}")
+        return {'id': job.get('id'), 'success': False, 'error': str(e)}
+
+def run_batch(module, transform, input_file, output_files, options):
+    """Render every genre in output_files, sharing one separation where the script supports it"""
+    if hasattr(module, 'transform_genres') and not options:
+        return module.transform_genres(input_file, output_files)
+
+    results = {}
+    for genre, output_file in output_files.items():
+        start_time = time.time()
+        success = transform(input_file, output_file, genre, **options)
+        results[genre] = {'success': bool(success), 'elapsed': round(time.time() - start_time, 3)}
+    return results
+
+def serve_stream(reader, writer):
+    """Answer jobs read from reader, one JSON reply line per request line"""
+    for line in reader:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+        except ValueError as e:
+            reply = {'id': None, 'success': False, 'error': f"Invalid job: {str(e)}"}
+        else:
+            reply = run_job(job)
+        writer.write(json.dumps(reply) + '\n')
+        writer.flush()
+
+def serve_socket(path):
+    """Answer jobs from any number of local clients on a Unix socket"""
+    if os.path.exists(path):
+        os.remove(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+    print(f"[PYTHON] Worker listening on {path}")
+
+    def handle(conn):
+        with conn, conn.makefile('r') as reader, conn.makefile('w') as writer:
+            serve_stream(reader, writer)
+
+    try:
+        while True:
+            conn, _ = server.accept()
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+    finally:
+        server.close()
+        os.remove(path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve genre transform jobs from a warm process')
+    parser.add_argument('--socket', help='Unix socket path to listen on instead of stdin/stdout')
+    parser.add_argument('--no-warmup', action='store_true', help='Do not preload the separator at startup')
+    args = parser.parse_args()
+
+    # stdout carries the protocol; route the transforms' log lines to stderr
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    print(f"[PYTHON] Transform worker starting (librosa {librosa.__version__})")
+    if not args.no_warmup:
+        try:
+            stems.warm_up()
+            print("[PYTHON] Spleeter separator loaded")
+        except Exception as e:
+            print(f"[PYTHON] Could not preload Spleeter separator: {str(e)}")
+
+    if args.socket:
+        serve_socket(args.socket)
+    else:
+        protocol_out.write(json.dumps({'event': 'ready'}) + '\n')
+        protocol_out.flush()
+        serve_stream(sys.stdin, protocol_out)
+
+if __name__ == "__main__":
+    main()
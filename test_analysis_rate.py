@@ -0,0 +1,53 @@
+import os
+import sys
+import numpy as np
+import librosa
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ml_scripts"))
+from track_analysis import TrackAnalysis, get_analysis, hpss, release_spectra
+
+def test_analysis_rate():
+    print("Testing reduced-rate analysis...")
+
+    rng = np.random.default_rng(0)
+    for sr in (44100, 48000):
+        # A steady tone with noise bursts twice a second, i.e. clicks at 120 BPM
+        t = np.arange(sr * 8) / sr
+        bursts = rng.standard_normal(len(t)) * (np.sin(2 * np.pi * 2 * t) > 0.97)
+        audio = (0.3 * np.sin(2 * np.pi * 440 * t) + 0.5 * bursts).astype(np.float32)
+
+        analysis = TrackAnalysis(audio, sr)
+        assert analysis.analysis_sr == 22050
+        assert abs(len(analysis.analysis_audio) - len(audio) * 22050 / sr) <= 1
+
+        # Beats and onsets come back in native-rate samples
+        grid = analysis.beat_grid
+        assert grid.sr == sr and abs(grid.tempo - 120) < 5
+        burst_starts = np.flatnonzero(np.diff((np.sin(2 * np.pi * 2 * t) > 0.97).astype(int)) == 1)
+        assert np.min(np.abs(grid.onsets[:, None] - burst_starts), axis=1).max() < 0.05 * sr
+
+        # The masks from the downsampled copy split the full-rate signal like full-rate HPSS
+        harmonic, percussive = hpss(audio, sr)
+        np.testing.assert_allclose(harmonic + percussive, audio, atol=0.05)
+        reference = librosa.effects.harmonic(audio)
+        assert np.linalg.norm(harmonic - reference) < 0.1 * np.linalg.norm(reference)
+
+    # Cached analyses keep their spectrograms only while they are being rendered
+    first = get_analysis(audio, sr)
+    first.harmonic, first.onset_envelope
+    assert "stft" in first._results and "analysis_audio" in first._results
+    assert first.nbytes > audio.nbytes
+    second = get_analysis(audio * 0.5, sr)
+    assert "stft" not in first._results and "harmonic" in first._results
+    second.harmonic
+    release_spectra()
+    assert not {"stft", "analysis_audio"} & set(second._results)
+
+    # Audio already at or below the analysis rate is analysed as is
+    audio = np.zeros(22050, dtype=np.float32)
+    assert TrackAnalysis(audio, 16000).analysis_audio is audio
+
+    print("Reduced-rate analysis test completed.")
+
+if __name__ == "__main__":
+    test_analysis_rate()
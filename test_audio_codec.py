@@ -0,0 +1,79 @@
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+import soundfile as sf
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ml_scripts"))
+import librosa
+from audio_codec import FFmpegReader, decode, encode, open_decoder
+
+def test_audio_codec():
+    print("Testing audio decoding and encoding...")
+
+    sr = 48000
+    t = np.arange(sr * 2) / sr
+    stereo = np.column_stack([0.5 * np.sin(2 * np.pi * 440 * t), 0.25 * np.sin(2 * np.pi * 660 * t)])
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "stereo.wav")
+        sf.write(path, stereo, sr, subtype="FLOAT")
+
+        # Channel layout and float32 are kept
+        audio, file_sr = decode(path)
+        assert file_sr == sr and audio.dtype == np.float32 and audio.shape == stereo.shape
+        np.testing.assert_allclose(audio, stereo, atol=1e-6)
+
+        # Mono and resampling agree with librosa.load
+        mono, _ = decode(path, mono=True)
+        np.testing.assert_allclose(mono, librosa.load(path, sr=None)[0], atol=1e-6)
+        resampled, resampled_sr = decode(path, sr=44100)
+        assert resampled_sr == 44100
+        np.testing.assert_allclose(resampled.T, librosa.load(path, sr=44100, mono=False)[0], atol=1e-4)
+
+        # Only the requested range is decoded
+        excerpt, _ = decode(path, offset=0.5, duration=1.0)
+        np.testing.assert_allclose(excerpt, stereo[sr // 2:sr // 2 + sr], atol=1e-6)
+
+        with open_decoder(path) as handle:
+            assert handle.samplerate == sr and handle.channels == 2
+
+        # The ffmpeg pipe reads in blocks and stops at the end of the stream
+        if shutil.which("ffmpeg") and shutil.which("ffprobe"):
+            with FFmpegReader(path) as reader:
+                blocks = [reader.read(30000) for _ in range(4)]
+            assert [len(block) for block in blocks] == [30000, 30000, 36000, 0]
+            np.testing.assert_allclose(np.concatenate(blocks), stereo, atol=1e-6)
+
+            # Compressed containers really are encoded, not WAV data under another name
+            for extension, magic in [(".m4a", (b"ftyp",)), (".mp3", (b"ID3", b"\xff\xfb", b"\xff\xf3"))]:
+                output = os.path.join(temp_dir, "encoded" + extension)
+                encode(output, stereo, sr, bitrate="128k")
+                assert os.path.getsize(output) < os.path.getsize(path) / 4
+                with open(output, "rb") as f:
+                    header = f.read(12)
+                assert any(mark in header for mark in magic), header
+                decoded, _ = decode(output)
+                assert decoded.shape[1] == 2 and abs(len(decoded) - len(stereo)) < 0.1 * sr
+        else:
+            print("ffmpeg not found, skipping the pipe decoder and encoder")
+
+        # WAV goes through soundfile
+        output = os.path.join(temp_dir, "encoded.wav")
+        encode(output, stereo[:, 0], sr)
+        assert sf.info(output).format == "WAV" and sf.info(output).channels == 1
+        np.testing.assert_allclose(sf.read(output)[0], stereo[:, 0], atol=1e-4)
+
+        # So does every other container libsndfile writes; unknown extensions get WAV data
+        for extension, container in [(".aiff", "AIFF"), (".aif", "AIFF"), (".au", "AU"), (".caf", "CAF"),
+                                     (".xyz", "WAV")]:
+            output = os.path.join(temp_dir, "encoded" + extension)
+            encode(output, stereo, sr)
+            assert sf.info(output).format == container, extension
+            np.testing.assert_allclose(decode(output)[0], stereo, atol=1e-4)
+
+    print("Audio codec test completed.")
+
+if __name__ == "__main__":
+    test_audio_codec()
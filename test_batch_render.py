@@ -0,0 +1,73 @@
+import os
+import sys
+import tempfile
+import numpy as np
+import soundfile as sf
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ml_scripts"))
+import stems
+import spleeter_transform
+import transform_worker
+
+class CountingSeparator:
+    """Stand-in for the Spleeter separator that records how often it runs"""
+    def __init__(self):
+        self.calls = 0
+
+    def separate(self, waveform):
+        self.calls += 1
+        return {name: waveform * (i + 1) / 10 for i, name in enumerate(stems.STEM_NAMES)}
+
+class FailingSeparator:
+    def separate(self, waveform):
+        raise RuntimeError("separator unavailable")
+
+def test_batch_render():
+    print("Testing multi-genre batch render...")
+
+    sr = stems.SEPARATOR_SAMPLE_RATE
+    t = np.arange(sr * 2) / sr
+    tone = 0.5 * np.sin(2 * np.pi * 220 * t) + 0.2 * np.sin(2 * np.pi * 3000 * t)
+
+    separator = CountingSeparator()
+    stems._separators[stems.SEPARATOR_MODEL] = separator
+    os.environ['GENRE_AI_STEM_CACHE_MB'] = '0'
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_file = os.path.join(temp_dir, "input.wav")
+            sf.write(input_file, np.stack([tone, tone], axis=1), sr)
+
+            genres = ["rock", "classical", "country"]
+            output_files = spleeter_transform.batch_output_files(os.path.join(temp_dir, "out_{genre}.wav"), genres)
+            assert output_files["country"] == os.path.join(temp_dir, "out_country.wav")
+            assert spleeter_transform.batch_output_files("out.wav", ["hip hop"]) == {"hip hop": "out.wav"}
+            assert spleeter_transform.batch_output_files("out.wav", ["pop", "hip hop"])["hip hop"] == "out_hip_hop.wav"
+
+            # Every genre comes from one decode and separation
+            results = spleeter_transform.transform_genres(input_file, output_files, max_workers=3)
+            assert separator.calls == 1
+            assert list(results) == genres
+            assert all(result['success'] for result in results.values())
+
+            # ...and matches a single-genre render
+            single_file = os.path.join(temp_dir, "single.wav")
+            spleeter_transform.transform_genre(input_file, single_file, "classical")
+            np.testing.assert_allclose(sf.read(output_files["classical"])[0], sf.read(single_file)[0], atol=1e-4)
+            assert not np.allclose(sf.read(output_files["rock"])[0], sf.read(output_files["classical"])[0])
+
+            # The worker flags outputs that came from the fallback path, so they are never cached
+            reply = transform_worker.run_job({"id": "a", "input_file": input_file, "output_file": single_file,
+                                              "target_genre": "rock"})
+            assert reply["success"] and not reply["fallback"]
+            stems._separators[stems.SEPARATOR_MODEL] = FailingSeparator()
+            reply = transform_worker.run_job({"id": "b", "input_file": input_file, "output_files": output_files})
+            assert reply["success"] and reply["fallback"]
+            assert all(result["fallback"] for result in reply["results"].values())
+    finally:
+        del stems._separators[stems.SEPARATOR_MODEL]
+        del os.environ['GENRE_AI_STEM_CACHE_MB']
+
+    print("Batch render test completed.")
+
+if __name__ == "__main__":
+    test_batch_render()
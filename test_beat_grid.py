@@ -0,0 +1,52 @@
+import os
+import sys
+import tempfile
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ml_scripts"))
+from beat_grid import beat_grid_path, load_beat_grid, sidechain_envelope
+from track_analysis import TrackAnalysis
+
+def test_beat_grid():
+    print("Testing beat grid and sidechain...")
+
+    sr = 22050
+    # Clicks at 120 BPM
+    audio = np.zeros(sr * 8, dtype=np.float32)
+    for position in range(0, len(audio), sr // 2):
+        audio[position:position + 200] = np.hanning(200)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = beat_grid_path(os.path.join(temp_dir, "upload.wav"))
+
+        # Beats and onsets come back in samples and are saved next to the upload
+        analysis = TrackAnalysis(audio, sr, beat_grid_path=path)
+        grid = analysis.beat_grid
+        assert abs(grid.tempo - 120) < 5
+        assert np.all(np.diff(grid.beats) > sr // 4)
+        assert np.min(np.abs(grid.onsets[:, None] - np.arange(0, len(audio), sr // 2)), axis=1).max() < 1024
+        np.testing.assert_array_equal(analysis.beat_frames * 512, grid.beats)
+        assert load_beat_grid(path, analysis.key) is not None
+
+        # A later render of the same audio loads it without analysing again
+        again = TrackAnalysis(audio, sr, beat_grid_path=path)
+        np.testing.assert_array_equal(again.beat_grid.onsets, grid.onsets)
+        assert 'onset_envelope' not in again._results
+
+        # ...but different audio doesn't
+        assert load_beat_grid(path, TrackAnalysis(audio * 0.5, sr).key) is None
+
+    # The vectorized envelope matches ducking onset by onset
+    triggers = np.array([100, 1000, 1500, 7000, 9990])
+    envelope = sidechain_envelope(10000, triggers, sr, release_ms=100.0, floor=0.3)
+    expected = np.ones(10000)
+    duck_length = int(sr * 0.1)
+    for trigger in triggers:
+        curve = (0.3 + 0.7 * np.arange(duck_length) / duck_length) ** 2
+        expected[trigger:trigger + duck_length] = curve[:10000 - trigger]
+    np.testing.assert_allclose(envelope, expected, atol=1e-6)
+
+    print("Beat grid test completed.")
+
+if __name__ == "__main__":
+    test_beat_grid()
@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ml_scripts"))
+import compressor
+
+def test_compressor():
+    print("Testing compressor...")
+
+    sr = 22050
+    t = np.arange(sr * 2) / sr
+    # Quiet first second, loud second second
+    audio = np.sin(2 * np.pi * 220 * t) * np.where(t < 1, 0.1, 0.9)
+    original = audio.copy()
+
+    # Instantaneous hard-knee compression follows the static curve exactly
+    result = compressor.compress(audio, sr, threshold=0.3, ratio=4.0, attack_ms=0, release_ms=0)
+    np.testing.assert_array_equal(audio, original)
+    level_db = 20 * np.log10(np.maximum(np.abs(audio), 1e-10))
+    expected_db = np.where(level_db > 20 * np.log10(0.3), 20 * np.log10(0.3) + (level_db - 20 * np.log10(0.3)) / 4, level_db)
+    np.testing.assert_allclose(np.abs(result), 10 ** (expected_db / 20) * (np.abs(audio) > 1e-10), atol=1e-9)
+
+    # Below threshold nothing changes, above it peaks come down
+    result = compressor.compress(audio, sr, threshold=0.3, ratio=4.0)
+    np.testing.assert_allclose(result[:sr // 2], audio[:sr // 2])
+    assert np.max(np.abs(result[-sr // 2:])) < 0.6
+
+    # Makeup gain is applied on top
+    louder = compressor.compress(audio, sr, threshold=0.3, ratio=4.0, makeup_db=6.0)
+    np.testing.assert_allclose(louder, result * 10 ** (6 / 20), rtol=1e-9)
+
+    # Carrying state across blocks matches one pass over the whole signal
+    state = {}
+    blocks = [compressor.compress(block, sr, state=state) for block in np.array_split(audio, 7)]
+    np.testing.assert_allclose(np.concatenate(blocks), compressor.compress(audio, sr), rtol=1e-9)
+
+    # The control-rate fallback stays close to the sample-accurate envelope
+    levels = np.abs(audio)
+    kernel = compressor._follow_envelope_kernel
+    try:
+        compressor._follow_envelope_kernel = None
+        approx = compressor.follow_envelope(levels, sr, 5.0, 50.0)
+    finally:
+        compressor._follow_envelope_kernel = kernel
+    exact = compressor._follow_envelope_loop(levels, compressor._smoothing_coef(5.0, sr), compressor._smoothing_coef(50.0, sr), 0.0)
+    # (peaks are taken per hop, so stay a couple of hops clear of the level change)
+    steady = np.r_[sr // 2:sr - 2 * compressor.CONTROL_HOP, sr + sr // 2:2 * sr]
+    assert np.max(np.abs(approx[steady] - exact[steady]) / exact[steady]) < 0.2
+
+    # A 4 minute track compresses in well under a second
+    long_audio = np.random.default_rng(0).standard_normal(44100 * 240).astype(np.float32) * 0.3
+    compressor.compress(long_audio[:1000], 44100)
+    start = time.time()
+    compressor.compress(long_audio, 44100)
+    print(f"Compressed 4 minutes in {time.time() - start:.2f}s")
+
+    print("Compressor test completed.")
+
+if __name__ == "__main__":
+    test_compressor()
@@ -0,0 +1,37 @@
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ml_scripts"))
+from ensemble import ensemble
+
+def test_ensemble():
+    print("Testing detune ensemble...")
+
+    sr = 22050
+    t = np.arange(sr * 3) / sr
+    tone = np.sin(2 * np.pi * 440 * t).astype(np.float32)
+    window = np.hanning(sr)
+
+    # A shifted voice lands on the shifted pitch at full level
+    for n_steps in [1, -1, 0.3]:
+        voice = ensemble(tone, sr, [(n_steps, 0, 1)])
+        spectrum = np.abs(np.fft.rfft(voice[sr:2 * sr] * window))
+        assert abs(np.argmax(spectrum) - 440 * 2 ** (n_steps / 12)) <= 1
+        assert np.max(np.abs(voice[sr:2 * sr])) > 0.9
+
+    # An unshifted voice is just the (delayed, scaled) input
+    np.testing.assert_allclose(ensemble(tone, sr, [(0, 0, 0.5)]), tone * 0.5, atol=1e-6)
+    delayed = ensemble(tone, sr, [(0, 100 / sr, 1)])
+    np.testing.assert_allclose(delayed[100:], tone[:-100], atol=1e-5)
+    assert not np.any(delayed[:100])
+
+    # The ensemble is the sum of its voices
+    voices = [(0.2 * (i - 1), 0.01 * i, 0.8 ** i) for i in range(3)]
+    summed = sum(ensemble(tone, sr, [voice]) for voice in voices)
+    np.testing.assert_allclose(ensemble(tone, sr, voices), summed, atol=1e-5)
+
+    print("Ensemble test completed.")
+
+if __name__ == "__main__":
+    test_ensemble()
@@ -0,0 +1,46 @@
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ml_scripts"))
+from eq import Band, apply_eq, peak
+from filters import zero_phase
+from spleeter_transform import apply_eq_boost
+
+def tone_level(audio, sr, freq):
+    t = np.arange(len(audio)) / sr
+    return np.abs(np.dot(audio, np.exp(-2j * np.pi * freq * t))) * 2 / len(audio)
+
+def test_eq():
+    print("Testing composite EQ...")
+
+    sr = 44100
+    rng = np.random.default_rng(0)
+    noise = (rng.standard_normal(sr * 3) * 0.2).astype(np.float32)
+    middle = slice(sr // 2, -sr // 2)
+
+    # One pass matches the filters it replaces, applied one after another
+    bands = [Band('bandpass', (500, 2000), wet=1.5, dry=0.5), Band('lowshelf', 150, gain_db=6)]
+    chained = zero_phase(noise, 'bandpass', (500, 2000), sr) * 1.5 + noise * 0.5
+    chained = zero_phase(chained, 'lowshelf', 150, sr, gain_db=6)
+    combined = apply_eq(noise, sr, bands)
+    assert combined.dtype == np.float32
+    error = np.sqrt(np.mean((combined[middle] - chained[middle]) ** 2) / np.mean(chained[middle] ** 2))
+    assert error < 1e-3, error
+
+    # A peak boosts its own frequency and leaves distant ones alone
+    t = np.arange(sr * 2) / sr
+    tones = (0.3 * np.sin(2 * np.pi * 2000 * t) + 0.3 * np.sin(2 * np.pi * 100 * t)).astype(np.float32)
+    boosted = apply_eq(tones, sr, [peak(2000, 6.0)])
+    assert abs(tone_level(boosted[middle], sr, 2000) / 0.3 - 10 ** (6 / 20)) < 0.02
+    assert abs(tone_level(boosted[middle], sr, 100) / 0.3 - 1) < 0.02
+
+    # apply_eq_boost is frequency-selective instead of a broadband gain
+    boosted = apply_eq_boost(tones, 2000, 1.5, sr)
+    assert abs(tone_level(boosted[middle], sr, 2000) / 0.3 - 1.5) < 0.03
+    assert abs(tone_level(boosted[middle], sr, 100) / 0.3 - 1) < 0.02
+
+    print("EQ test completed.")
+
+if __name__ == "__main__":
+    test_eq()
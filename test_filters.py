@@ -0,0 +1,43 @@
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ml_scripts"))
+from filters import SOSFilter, causal, design_sos, zero_phase
+
+def band_level(audio, sr, freq):
+    t = np.arange(len(audio)) / sr
+    return np.abs(np.dot(audio, np.exp(-2j * np.pi * freq * t))) * 2 / len(audio)
+
+def test_filters():
+    print("Testing SOS filters...")
+
+    sr = 22050
+    t = np.arange(sr * 2) / sr
+    audio = (0.5 * np.sin(2 * np.pi * 100 * t) + 0.5 * np.sin(2 * np.pi * 5000 * t)).astype(np.float32)
+
+    # Designs are shared between callers
+    assert design_sos('lowpass', 1000, sr, 4) is design_sos('lowpass', 1000, sr, 4)
+
+    # Lowpass keeps the low tone and removes the high one, without a phase shift
+    low = zero_phase(audio, 'lowpass', 1000, sr)
+    assert low.dtype == np.float32
+    assert abs(band_level(low, sr, 100) - 0.5) < 0.01
+    assert band_level(low, sr, 5000) < 0.001
+    middle = slice(sr // 2, -sr // 2)
+    np.testing.assert_allclose(low[middle], 0.5 * np.sin(2 * np.pi * 100 * t[middle]), atol=0.01)
+
+    # A zero-phase shelf boosts by its nominal gain
+    boosted = zero_phase(audio, 'lowshelf', 500, sr, gain_db=6)
+    assert abs(band_level(boosted, sr, 100) / 0.5 - 10 ** (6 / 20)) < 0.05
+    assert abs(band_level(boosted, sr, 5000) - 0.5) < 0.01
+
+    # Blocks filtered with carried state match one pass over the whole signal
+    band = SOSFilter('bandpass', (300, 3000), sr)
+    blocks = np.concatenate([band.process(block) for block in np.array_split(audio, 7)])
+    np.testing.assert_allclose(blocks, causal(audio, 'bandpass', (300, 3000), sr), rtol=1e-5, atol=1e-6)
+
+    print("Filter test completed.")
+
+if __name__ == "__main__":
+    test_filters()
@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+import numpy as np
+import soundfile as sf
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ml_scripts"))
+from preview import best_window, fade_edges, preview_window
+
+def test_preview():
+    print("Testing preview window selection...")
+
+    sr = 22050
+    rng = np.random.default_rng(0)
+    # A quiet 30 s track with a loud, percussive stretch from 18 s to 23 s
+    audio = (rng.standard_normal(sr * 30) * 0.01).astype(np.float32)
+    t = np.arange(sr * 5) / sr
+    clicks = (np.sin(2 * np.pi * 4 * t) > 0.99).astype(np.float32)
+    audio[sr * 18:sr * 23] += 0.5 * np.sin(2 * np.pi * 330 * t) + clicks
+
+    offset = best_window(audio, sr, 5)
+    assert 17.5 <= offset <= 18.5, offset
+    # A window as long as the track starts at the beginning
+    assert best_window(audio, sr, 40) == 0.0
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_file = os.path.join(temp_dir, "input.wav")
+        sf.write(input_file, audio, sr)
+        offset, duration = preview_window(input_file, 5)
+        assert 17.5 <= offset <= 18.5 and duration == 5
+        assert preview_window(input_file, 60) == (0.0, 30.0)
+
+    # The edges fade to silence without touching the middle
+    faded = fade_edges(np.ones(sr), sr)
+    assert faded[0] == 0 and faded[-1] < 1e-6
+    np.testing.assert_array_equal(faded[sr // 4:3 * sr // 4], 1)
+
+    print("Preview window test completed.")
+
+if __name__ == "__main__":
+    test_preview()
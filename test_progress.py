@@ -0,0 +1,60 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ml_scripts"))
+import progress
+import tracing
+from stem_pool import process_stems
+
+def progress_events(output):
+    return [json.loads(line[len(progress.PREFIX):]) for line in output.splitlines()
+            if line.startswith(progress.PREFIX)]
+
+def test_progress():
+    print("Testing render progress events...")
+
+    # Batches share the per-input stages only when asked to
+    assert len(progress.plan("spleeter", 2, shared=True)) == 2 + 2 * 7
+    assert len(progress.plan("spleeter", 2)) == 2 * 9
+    assert [name for name, _ in progress.plan("simple", 3, stream=True)] == ["stream"] * 3
+
+    # Spans, including per-stem effects in pool threads, move a tracked render forward
+    stems = {name: np.zeros(1000, dtype=np.float32) for name in ["vocals", "drums", "bass", "other"]}
+    chains = {name: ([(np.tanh,)], 1.0) for name in stems}
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output), tracing.trace("job-1"):
+        with progress.track(progress.plan("spleeter")):
+            with tracing.span("decode") as record:
+                record.update(samples=441000, sr=44100)
+            with tracing.span("separate"):
+                pass
+            process_stems(stems, chains, max_workers=4, executor="thread")
+            for stage in ["mix", "normalize", "encode", "unplanned"]:
+                with tracing.span(stage):
+                    pass
+    events = progress_events(output.getvalue())
+    ends = [event for event in events if event["state"] == "end"]
+    assert all(event["trace"] == "job-1" for event in events)
+    assert [event["stage"] for event in events[:2]] == ["decode", "decode"] and events[0]["eta"] is None
+    fractions = [event["fraction"] for event in ends]
+    assert fractions == sorted(fractions) and fractions[-1] == 1.0
+    # Once decoded, the length gives an ETA before there is a pace to extrapolate
+    assert ends[0]["eta"] > 0 and ends[-1]["eta"] == 0
+
+    # Blocks of a streamed render advance it without spans; nothing is reported outside track()
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        progress.advance("stream", 0.5)
+        with progress.track(progress.plan("simple", 2, stream=True)):
+            for fraction in [0.25, 1.0, 0.5]:
+                progress.advance("stream", fraction)
+    assert [event["fraction"] for event in progress_events(output.getvalue())] == [0.125, 0.5, 0.75]
+
+    print("Progress test completed.")
+
+if __name__ == "__main__":
+    test_progress()
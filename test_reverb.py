@@ -0,0 +1,38 @@
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ml_scripts"))
+from reverb import PartitionedConvolver, convolve, exponential_ir, room_reverb
+
+def test_reverb():
+    print("Testing FFT reverb engine...")
+
+    rng = np.random.default_rng(0)
+    audio = rng.standard_normal(30000)
+    ir = rng.standard_normal(5000)
+
+    # Offline modes match direct convolution
+    for mode in ["full", "same"]:
+        expected = np.convolve(audio, ir, mode=mode)
+        result = convolve(audio, PartitionedConvolver.from_ir(ir), mode)
+        np.testing.assert_allclose(result, expected, atol=1e-9)
+    expected = np.convolve(audio, ir, mode="full")[:len(audio)]
+    np.testing.assert_allclose(convolve(audio, PartitionedConvolver.from_ir(ir)), expected, atol=1e-9)
+
+    # Feeding the input in uneven pieces gives the same output as one call
+    convolver = PartitionedConvolver.from_ir(ir, block_size=512)
+    sizes = [1, 700, 3, 5000, 10000, 14296]
+    pieces = np.split(audio, np.cumsum(sizes)[:-1])
+    result = np.concatenate([convolver.process(piece) for piece in pieces])
+    np.testing.assert_allclose(result, expected, atol=1e-9)
+
+    # Room presets reproduce the original exponential IR
+    sr = 22050
+    ir = exponential_ir(int(0.3 * sr), 5)
+    np.testing.assert_allclose(room_reverb(audio, 0.3, sr), np.convolve(audio, ir, mode="full")[:len(audio)], atol=1e-8)
+
+    print("Reverb engine test completed.")
+
+if __name__ == "__main__":
+    test_reverb()
@@ -0,0 +1,63 @@
+import os
+import sys
+import tempfile
+import numpy as np
+import soundfile as sf
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ml_scripts"))
+from filters import zero_phase
+from reverb import CONCERT_HALL_SECONDS, room_reverb
+from segments import layout, render_segment
+from streaming import soft_limit
+
+def test_segments():
+    print("Testing segmented render...")
+
+    sr = 22050
+    rng = np.random.default_rng(0)
+    audio = (rng.standard_normal(int(sr * 7.5)) * 0.1).astype(np.float32)
+
+    # A reverb tail carries across seams and a zero-phase filter looks ahead of them
+    def process(block, sr):
+        return zero_phase(room_reverb(block, 0.3, sr) * 0.5, 'lowpass', 4000, sr)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_file = os.path.join(temp_dir, "input.wav")
+        sf.write(input_file, np.stack([audio, audio], axis=1), sr, subtype="FLOAT")
+
+        shape = layout(input_file, sr, segment_seconds=2)
+        assert shape["frames"] == len(audio) and shape["segment_frames"] == 2 * sr and shape["segments"] == 4
+
+        # Segments rendered out of order join into the whole-track render
+        files = [os.path.join(temp_dir, f"{index}.pcm") for index in range(shape["segments"])]
+        for index in (2, 0, 3, 1):
+            frames = render_segment(input_file, files[index], index, process, sr=sr, segment_seconds=2)
+            assert frames == min(2 * sr, len(audio) - index * 2 * sr)
+        joined = np.concatenate([np.fromfile(path, dtype="<i2") for path in files]) / 32767
+        assert len(joined) == len(audio)
+        np.testing.assert_allclose(joined, soft_limit(process(audio, sr)), atol=2e-3)
+
+        # A segment comes out the same however often it is rendered
+        first = open(files[1], "rb").read()
+        render_segment(input_file, files[1], 1, process, sr=sr, segment_seconds=2)
+        assert open(files[1], "rb").read() == first
+
+        try:
+            render_segment(input_file, files[0], 4, process, sr=sr, segment_seconds=2)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("a segment past the end should be rejected")
+
+        # Segments of the centred concert-hall reverb, which looks a second past each join, line up too
+        def concert_hall(block, sr):
+            return room_reverb(block, CONCERT_HALL_SECONDS, sr, decay=10, normalize=True, mode='same') * 20
+        for index in range(shape["segments"]):
+            render_segment(input_file, files[index], index, concert_hall, sr=sr, segment_seconds=2)
+        joined = np.concatenate([np.fromfile(path, dtype="<i2") for path in files]) / 32767
+        np.testing.assert_allclose(joined, soft_limit(concert_hall(audio, sr)), atol=1e-4)
+
+    print("Segmented render test completed.")
+
+if __name__ == "__main__":
+    test_segments()
@@ -0,0 +1,58 @@
+import os
+import sys
+import tempfile
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ml_scripts"))
+import stems
+from stem_cache import StemCache
+
+class CountingSeparator:
+    """Stand-in for the Spleeter separator that records how often it runs"""
+    def __init__(self):
+        self.calls = 0
+
+    def separate(self, waveform):
+        self.calls += 1
+        return {name: waveform * (i + 1) / 10 for i, name in enumerate(stems.STEM_NAMES)}
+
+def test_stem_cache():
+    print("Testing stem cache...")
+
+    sr = 22050
+    t = np.arange(sr * 2) / sr
+    tone = 0.5 * np.sin(2 * np.pi * 440 * t)
+    waveform = np.stack([tone, tone], axis=1).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = StemCache(cache_dir)
+        separator = CountingSeparator()
+
+        # First render separates, second render of the same audio reuses the stems
+        first = stems.separate_stems(waveform, separator, sample_rate=sr, cache=cache)
+        second = stems.separate_stems(waveform, separator, sample_rate=sr, cache=cache)
+        assert separator.calls == 1
+        for name in stems.STEM_NAMES:
+            assert isinstance(second[name], np.memmap)
+            np.testing.assert_array_equal(first[name], second[name])
+
+        # In-place edits by effects must not leak into the cache
+        second['vocals'][:] = 0
+        third = stems.separate_stems(waveform, separator, sample_rate=sr, cache=cache)
+        np.testing.assert_array_equal(first['vocals'], third['vocals'])
+
+        # Different audio is a miss
+        stems.separate_stems(waveform * 0.5, separator, sample_rate=sr, cache=cache)
+        assert separator.calls == 2
+
+        # Shrinking the limit evicts the least recently used entry
+        cache.max_bytes = sum(stem.nbytes for stem in first.values()) + 1024
+        cache.evict()
+        assert len([name for name in os.listdir(cache_dir) if not name.startswith('.')]) == 1
+        stems.separate_stems(waveform * 0.5, separator, sample_rate=sr, cache=cache)
+        assert separator.calls == 2
+
+    print("Stem cache test completed.")
+
+if __name__ == "__main__":
+    test_stem_cache()
@@ -0,0 +1,41 @@
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ml_scripts"))
+from compressor import compress
+from reverb import room_reverb
+from stem_pool import process_stems
+
+def test_stem_pool():
+    print("Testing concurrent stem chains...")
+
+    sr = 22050
+    rng = np.random.default_rng(0)
+    stems = {name: (rng.standard_normal(sr * 2) * 0.3).astype(np.float32)
+             for name in ["vocals", "drums", "bass", "other"]}
+    originals = {name: stem.copy() for name, stem in stems.items()}
+    chains = {
+        "vocals": ([(compress, sr, 0.2, 4.0)], 1.2),
+        "drums": ([(room_reverb, 0.1, sr), (np.tanh,)], 0.8),
+        "bass": ([], 0.5),
+        "other": ([(compress, sr), (room_reverb, 0.2, sr)], 1.0),
+    }
+
+    inline = process_stems(stems, chains, max_workers=1)
+    np.testing.assert_allclose(inline["bass"], stems["bass"] * 0.5)
+
+    # Thread and process pools give the same stems as running inline
+    for executor in ["thread", "process"]:
+        result = process_stems(stems, chains, max_workers=4, executor=executor)
+        for name in stems:
+            np.testing.assert_allclose(result[name], inline[name], rtol=1e-5, atol=1e-6)
+
+    # Inputs are never modified
+    for name in stems:
+        np.testing.assert_array_equal(stems[name], originals[name])
+
+    print("Stem chain test completed.")
+
+if __name__ == "__main__":
+    test_stem_pool()
@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+import numpy as np
+import librosa
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ml_scripts"))
+from swing import swing, swing_map, time_warp
+
+def test_swing():
+    print("Testing swing time warp...")
+
+    sr = 22050
+    beat = 11264  # 22 hops
+    length = beat * 12
+    audio = np.zeros(length, dtype=np.float32)
+    eighths = np.arange(0, length, beat // 2)
+    for position in eighths:
+        audio[position:position + 64] += np.hanning(64)
+    beat_frames = librosa.samples_to_frames(np.arange(0, length, beat))
+
+    # The identity map reproduces the input
+    identity = time_warp(audio, [0, length], [0, length])
+    np.testing.assert_allclose(identity, audio, atol=1e-4)
+
+    # Beats stay put and off-beat eighths land two thirds of the way through the beat
+    output_anchors, input_anchors = swing_map(np.arange(0, length, beat), 1 / 3, length)
+    np.testing.assert_allclose(np.interp([beat, beat + beat / 2], input_anchors, output_anchors), [beat, beat + 2 * beat / 3])
+    swung = swing(audio, sr, beat_frames, swing_amount=1 / 3)
+    envelope = np.convolve(np.abs(swung), np.ones(256), mode="same")
+    for start in range(beat, length - beat, beat):
+        on_beat = start - 512 + np.argmax(envelope[start - 512:start + 512])
+        off_beat = start + beat // 4 + np.argmax(envelope[start + beat // 4:start + beat - beat // 8])
+        assert abs(on_beat - start - 32) < 512
+        assert abs(off_beat - (start + 2 * beat / 3 + 32)) < 512
+    assert len(swung) == length
+
+    # Time grows with track length, not with the number of beats
+    long_audio = np.random.default_rng(0).standard_normal(sr * 120).astype(np.float32)
+    start = time.time()
+    swing(long_audio, sr, librosa.samples_to_frames(np.arange(0, len(long_audio), sr // 4)))
+    print(f"Swung 2 minutes with 480 beats in {time.time() - start:.2f}s")
+
+    print("Swing test completed.")
+
+if __name__ == "__main__":
+    test_swing()
@@ -0,0 +1,71 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ml_scripts"))
+import tracing
+from stem_pool import process_stems
+
+def trace_lines(output):
+    return [json.loads(line[len(tracing.PREFIX):]) for line in output.splitlines()
+            if line.startswith(tracing.PREFIX)]
+
+def test_tracing():
+    print("Testing per-stage tracing...")
+
+    stems = {name: np.full(1000, 0.5, dtype=np.float32) for name in ["vocals", "drums", "bass", "other"]}
+    chains = {name: ([(np.tanh,)], 1.0) for name in stems}
+
+    # Spans nest, carry the trace id into pool threads and are written as [TRACE] JSON lines
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        with tracing.trace(7), tracing.collect() as spans, tracing.span("job", script="test") as record:
+            process_stems(stems, chains, max_workers=4, executor="thread")
+            record["genre"] = "rock"
+    lines = trace_lines(output.getvalue())
+    assert lines == spans and len(spans) == 5
+    assert spans[-1]["span"] == "job" and spans[-1]["parent"] is None and spans[-1]["genre"] == "rock"
+    effects = spans[:-1]
+    assert sorted(span["stem"] for span in effects) == sorted(stems)
+    for span in effects + spans[-1:]:
+        assert span["trace"] == "7" and span["ms"] >= 0 and span["peak_rss_mb"] > 0
+    assert all(span["span"] == "effects" and span["parent"] == "job" and span["samples"] == 1000
+               for span in effects)
+
+    # A failing stage is still reported, with the error
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            with tracing.span("decode"):
+                raise ValueError("bad file")
+        except ValueError:
+            pass
+    [line] = trace_lines(output.getvalue())
+    assert line["error"] == "ValueError" and line["trace"] is None
+
+    # GENRE_AI_TRACE=0 turns the lines off but keeps collecting
+    os.environ["GENRE_AI_TRACE"] = "0"
+    try:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), tracing.collect() as spans, tracing.span("encode"):
+            pass
+    finally:
+        del os.environ["GENRE_AI_TRACE"]
+    assert output.getvalue() == "" and [span["span"] for span in spans] == ["encode"]
+
+    # Without the resource module (Windows) spans still work, with no peak memory
+    saved, tracing.resource = tracing.resource, None
+    try:
+        with tracing.collect() as spans, tracing.span("mix"):
+            pass
+    finally:
+        tracing.resource = saved
+    assert spans[0]["peak_rss_mb"] is None and spans[0]["peak_growth_mb"] is None
+
+    print("Tracing test completed.")
+
+if __name__ == "__main__":
+    test_tracing()